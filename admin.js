@@ -1,100 +1,348 @@
 document.addEventListener('DOMContentLoaded', () => {
     const alertList = document.getElementById('alertList');
     const reportBox = document.querySelector('.report-box');
+    const reportList = document.getElementById('reportList');
     const modal = document.getElementById('alertModal');
     const closeBtn = document.querySelector('.close-btn');
     const alertDetails = document.getElementById('alertDetails');
+    let incidentSocket = null;
 
-    let alertsData = [];
-
-    closeBtn.addEventListener('click', () => {
+    function closeModal() {
         modal.style.display = 'none';
-    });
+        if (incidentSocket) {
+            incidentSocket.close();
+            incidentSocket = null;
+        }
+    }
+
+    closeBtn.addEventListener('click', closeModal);
 
     window.addEventListener('click', (e) => {
         if (e.target == modal) {
-            modal.style.display = 'none';
+            closeModal();
+        }
+    });
+
+    // Live channel for an open incident: shows the tourist's streamed
+    // location and lets the dispatcher send an acknowledgement back.
+    function watchIncident(incidentId) {
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        incidentSocket = new WebSocket(`${scheme}://${window.location.host}/ws/incident/${encodeURIComponent(incidentId)}?role=dispatcher`);
+        const liveLocation = document.getElementById('liveLocation');
+        const ackLog = document.getElementById('ackLog');
+
+        incidentSocket.addEventListener('message', (e) => {
+            const message = JSON.parse(e.data);
+            if (message.t === 'loc') {
+                liveLocation.textContent = `${message.la}, ${message.lo} (${new Date(message.ts * 1000).toLocaleTimeString()})`;
+            } else if (message.t === 'ack') {
+                const entry = document.createElement('p');
+                entry.textContent = `Acknowledged: ${message.msg}`;
+                ackLog.appendChild(entry);
+            }
+        });
+
+        document.getElementById('ackBtn').addEventListener('click', () => {
+            const input = document.getElementById('ackMessage');
+            if (incidentSocket && incidentSocket.readyState === WebSocket.OPEN) {
+                incidentSocket.send(JSON.stringify({ t: 'ack', msg: input.value || 'Help is on the way.' }));
+                input.value = '';
+            }
+        });
+    }
+
+    // Renders only the rows in and near the scrolled viewport, absolutely
+    // positioned inside a list sized for all of them. Rows are keyed, so a
+    // refresh rebuilds only the rows whose content changed.
+    class VirtualList {
+        constructor(viewport, list, { rowHeight, key, signature, render, overscan = 6 }) {
+            this.viewport = viewport;
+            this.list = list;
+            this.rowHeight = rowHeight;
+            this.key = key;
+            this.signature = signature;
+            this.render = render;
+            this.overscan = overscan;
+            this.items = [];
+            this.byKey = new Map();
+            this.rows = new Map();
+            this.pending = false;
+            this.list.classList.add('virtual-list');
+            viewport.addEventListener('scroll', () => this.scheduleUpdate(), { passive: true });
+            window.addEventListener('resize', () => this.scheduleUpdate());
+        }
+
+        setItems(items) {
+            this.items = items;
+            this.byKey = new Map(items.map(item => [this.key(item), item]));
+            this.list.style.height = `${items.length * this.rowHeight}px`;
+            this.update();
+        }
+
+        get(key) {
+            return this.byKey.get(key);
+        }
+
+        showMessage(element) {
+            this.items = [];
+            this.byKey.clear();
+            this.rows.clear();
+            this.list.style.height = '';
+            this.list.replaceChildren(element);
+        }
+
+        scheduleUpdate() {
+            if (!this.pending) {
+                this.pending = true;
+                requestAnimationFrame(() => {
+                    this.pending = false;
+                    this.update();
+                });
+            }
+        }
+
+        update() {
+            const top = this.viewport.scrollTop - this.list.offsetTop;
+            const first = Math.max(0, Math.floor(top / this.rowHeight) - this.overscan);
+            const last = Math.min(this.items.length,
+                Math.ceil((top + this.viewport.clientHeight) / this.rowHeight) + this.overscan);
+            const visible = new Map();
+
+            for (let index = first; index < last; index++) {
+                const item = this.items[index];
+                const key = this.key(item);
+                const signature = this.signature(item);
+                let row = this.rows.get(key);
+                if (!row || row.signature !== signature) {
+                    const element = this.render(item);
+                    element.dataset.key = key;
+                    if (row) {
+                        row.element.replaceWith(element);
+                    } else {
+                        this.list.appendChild(element);
+                    }
+                    row = { element, signature };
+                }
+                row.element.style.transform = `translateY(${index * this.rowHeight}px)`;
+                visible.set(key, row);
+            }
+            for (const [key, row] of this.rows) {
+                if (!visible.has(key)) {
+                    row.element.remove();
+                }
+            }
+            // Drop anything else, e.g. the placeholder from showMessage().
+            for (const child of Array.from(this.list.children)) {
+                if (!child.dataset.key) {
+                    child.remove();
+                }
+            }
+            this.rows = visible;
+        }
+    }
+
+    function messageElement(tagName, text) {
+        const element = document.createElement(tagName);
+        element.textContent = text;
+        return element;
+    }
+
+    function alertKey(alert) {
+        return alert.id || `${alert.timestamp}|${alert.phoneNumber}`;
+    }
+
+    const alertRows = new VirtualList(alertList.parentElement, alertList, {
+        rowHeight: 44,
+        key: alertKey,
+        signature: alert => `${alert.phoneNumber}|${alert.timestamp}`,
+        render: alert => messageElement('li', `SOS from ${alert.phoneNumber} at ${new Date(alert.timestamp).toLocaleString()}`)
+    });
+
+    const reportRows = new VirtualList(reportBox, reportList, {
+        rowHeight: 210,
+        key: report => report.id,
+        signature: report => `${report.status}|${report.reason}|${report.image_path}`,
+        render: report => {
+            const reportElement = document.createElement('div');
+            reportElement.classList.add('report-item');
+            reportElement.innerHTML = `
+                <div class="report-content">
+                    <div class="report-image">
+                        <img loading="lazy" decoding="async" width="200" height="150" alt="Anomaly Report Image">
+                    </div>
+                    <div class="report-details">
+                        <p><strong>Reason:</strong> <span class="reason"></span></p>
+                        <p><strong>User:</strong> <span class="user"></span></p>
+                        <p><strong>Location:</strong> <span class="location"></span></p>
+                        <p><strong>Status:</strong> <span class="status"></span></p>
+                    </div>
+                </div>
+                <div class="report-actions">
+                    <button class="accept-btn">Accept</button>
+                    <button class="reject-btn">Reject</button>
+                </div>
+            `;
+            const location = report.location || {};
+            reportElement.querySelector('img').src = report.image_path;
+            reportElement.querySelector('.reason').textContent = report.reason;
+            reportElement.querySelector('.user').textContent = (report.user || {}).mobile;
+            reportElement.querySelector('.location').textContent = `${location.latitude}, ${location.longitude}`;
+            reportElement.querySelector('.status').textContent = report.status;
+            reportElement.querySelectorAll('button').forEach(button => { button.dataset.id = report.id; });
+            return reportElement;
         }
     });
 
     alertList.addEventListener('click', (e) => {
-        if (e.target.tagName === 'LI') {
-            const alertIndex = e.target.dataset.index;
-            const alert = alertsData[alertIndex];
-            
+        const alert = e.target.tagName === 'LI' && alertRows.get(e.target.dataset.key);
+        if (alert) {
+            // Alert fields are user input, so they are only ever set as text.
             alertDetails.innerHTML = `
-                <p><strong>Blockchain ID:</strong> ${alert.blockchainId}</p>
-                <p><strong>Phone Number:</strong> ${alert.phoneNumber}</p>
-                <p><strong>KYC:</strong> ${alert.kycId}</p>
-                <p><strong>Emergency Contact:</strong> ${alert.emergencyContact}</p>
-                <p><strong>Location:</strong> ${alert.location.latitude}, ${alert.location.longitude}</p>
-                <p><strong>Timestamp:</strong> ${new Date(alert.timestamp).toLocaleString()}</p>
+                <p><strong>Blockchain ID:</strong> <span class="blockchain-id"></span></p>
+                <p><strong>Phone Number:</strong> <span class="phone"></span></p>
+                <p><strong>KYC:</strong> <span class="kyc"></span></p>
+                <p><strong>Emergency Contact:</strong> <span class="contact"></span></p>
+                <p><strong>Location:</strong> <span class="location"></span></p>
+                <p><strong>Timestamp:</strong> <span class="timestamp"></span></p>
             `;
+            const location = alert.location || {};
+            alertDetails.querySelector('.blockchain-id').textContent = alert.blockchainId;
+            alertDetails.querySelector('.phone').textContent = alert.phoneNumber;
+            alertDetails.querySelector('.kyc').textContent = alert.kycId;
+            alertDetails.querySelector('.contact').textContent = alert.emergencyContact;
+            alertDetails.querySelector('.location').textContent = `${location.latitude}, ${location.longitude}`;
+            alertDetails.querySelector('.timestamp').textContent = new Date(alert.timestamp).toLocaleString();
+            if (alert.id) {
+                alertDetails.insertAdjacentHTML('beforeend', `
+                    <p><strong>Live Location:</strong> <span id="liveLocation">Waiting for updates...</span></p>
+                    <input id="ackMessage" type="text" placeholder="Message to tourist">
+                    <button id="ackBtn" class="accept-btn">Acknowledge</button>
+                    <div id="ackLog"></div>
+                `);
+                watchIncident(alert.id);
+            }
             modal.style.display = 'block';
         }
     });
 
+    // The server answers 304 while a list is unchanged, so an idle refresh
+    // costs neither a download nor a re-render.
+    const etags = {};
+
+    async function fetchChanged(url) {
+        const headers = etags[url] ? { 'If-None-Match': etags[url] } : {};
+        const response = await fetch(url, { headers, cache: 'no-store' });
+        if (response.status === 304) {
+            return null;
+        }
+        if (!response.ok) {
+            throw new Error(`${url} returned ${response.status}`);
+        }
+        const data = await response.json();
+        etags[url] = response.headers.get('ETag');
+        return data;
+    }
+
+    // With a filter set, the lists show ranked /search results instead of
+    // the full alert and report files.
+    const alertSearch = document.getElementById('alertSearch');
+    const reportSearch = document.getElementById('reportSearch');
+    const reportStatus = document.getElementById('reportStatus');
+
+    function searchUrl(params) {
+        const query = new URLSearchParams({ limit: 500 });
+        Object.entries(params).forEach(([name, value]) => {
+            if (value) {
+                query.set(name, value);
+            }
+        });
+        return `/search?${query}`;
+    }
+
+    function alertsUrl() {
+        const filter = alertSearch.value.trim();
+        if (!filter) {
+            return '/sos_alerts';
+        }
+        const field = /^[0-9a-f]{64}$/i.test(filter) ? 'blockchainId' : 'phone';
+        return searchUrl({ type: 'sos', [field]: filter });
+    }
+
+    function reportsUrl() {
+        const text = reportSearch.value.trim();
+        if (!text && !reportStatus.value) {
+            return '/get_reports';
+        }
+        const field = /^\+?\d+$/.test(text) ? 'user' : 'q';
+        return searchUrl({ type: 'report', status: reportStatus.value, [field]: text });
+    }
+
+    async function fetchList(url, currentUrl) {
+        const data = await fetchChanged(url);
+        // Ignore responses for a filter that has changed since.
+        if (data === null || url !== currentUrl()) {
+            return null;
+        }
+        return url.startsWith('/search') ? data.results : data;
+    }
+
     // Fetch and display emergency alerts
     async function fetchAlerts() {
         try {
-            const response = await fetch('/sos_alerts');
-            const alerts = await response.json();
-            alertsData = alerts;
-            alertList.innerHTML = '';
+            const alerts = await fetchList(alertsUrl(), alertsUrl);
+            if (alerts === null) {
+                return;
+            }
             if (alerts.length === 0) {
-                alertList.innerHTML = '<li>No active alerts</li>';
+                alertRows.showMessage(messageElement('li', alertSearch.value.trim() ? 'No matching alerts' : 'No active alerts'));
             } else {
-                alerts.forEach((alert, index) => {
-                    const li = document.createElement('li');
-                    li.textContent = `SOS from ${alert.phoneNumber} at ${new Date(alert.timestamp).toLocaleString()}`;
-                    li.dataset.index = index;
-                    alertList.appendChild(li);
-                });
+                alertRows.setItems(alerts);
             }
         } catch (error) {
             console.error('Error fetching alerts:', error);
-            alertList.innerHTML = '<li>Error fetching alerts</li>';
+            if (alertRows.items.length === 0) {
+                alertRows.showMessage(messageElement('li', 'Error fetching alerts'));
+            }
         }
     }
 
     // Fetch and display user anomaly reports
     async function fetchReports() {
         try {
-            const response = await fetch('/get_reports');
-            const reports = await response.json();
-            reportBox.innerHTML = ''; 
+            const url = reportsUrl();
+            const reports = await fetchList(url, reportsUrl);
+            if (reports === null) {
+                return;
+            }
             if (reports.length === 0) {
-                reportBox.innerHTML = '<p>No pending reports</p>';
+                reportRows.showMessage(messageElement('p', url === '/get_reports' ? 'No pending reports' : 'No matching reports'));
             } else {
-                reports.forEach(report => {
-                    const reportElement = document.createElement('div');
-                    reportElement.classList.add('report-item');
-                    reportElement.innerHTML = `
-                        <div class="report-content">
-                            <div class="report-image">
-                                <img src="${report.image_path}" alt="Anomaly Report Image">
-                            </div>
-                            <div class="report-details">
-                                <p><strong>Reason:</strong> ${report.reason}</p>
-                                <p><strong>User:</strong> ${report.user.mobile}</p>
-                                <p><strong>Location:</strong> ${report.location.latitude}, ${report.location.longitude}</p>
-                                <p><strong>Status:</strong> ${report.status}</p>
-                            </div>
-                        </div>
-                        <div class="report-actions">
-                            <button class="accept-btn" data-id="${report.id}">Accept</button>
-                            <button class="reject-btn" data-id="${report.id}">Reject</button>
-                        </div>
-                    `;
-                    reportBox.appendChild(reportElement);
-                });
+                reportRows.setItems(reports);
             }
         } catch (error) {
             console.error('Error fetching reports:', error);
-            reportBox.innerHTML = '<p>Error fetching reports</p>';
+            if (reportRows.items.length === 0) {
+                reportRows.showMessage(messageElement('p', 'Error fetching reports'));
+            }
         }
     }
 
+    function onFilterChange(baseUrl, refresh) {
+        let timer = null;
+        return () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => {
+                // The unfiltered list must be re-rendered even if it hasn't changed.
+                delete etags[baseUrl];
+                refresh();
+            }, 250);
+        };
+    }
+
+    alertSearch.addEventListener('input', onFilterChange('/sos_alerts', fetchAlerts));
+    reportSearch.addEventListener('input', onFilterChange('/get_reports', fetchReports));
+    reportStatus.addEventListener('change', onFilterChange('/get_reports', fetchReports));
+
     // Handle report actions (accept/reject)
     reportBox.addEventListener('click', async (e) => {
         if (e.target.classList.contains('accept-btn')) {
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from collections import deque
+
+from flask import g, jsonify, request
+
+# Worker threads per process (gunicorn --threads). Non-critical classes are
+# sized so that, even when all of them are saturated and their queues are
+# full, RESERVED_THREADS threads stay free for SOS traffic.
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", "32"))
+RESERVED_THREADS = int(os.environ.get("RESERVED_THREADS", "8"))
+LATENCY_SAMPLES = 2048
+
+
+class PriorityClass:
+    """A concurrency limit with a bounded, time-limited wait queue."""
+
+    def __init__(self, name, limit, queue_size, queue_timeout, retry_after=1):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def acquire(self):
+        with self.condition:
+            if self.active < self.limit:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.queue_size:
+                self.shed += 1
+                return False
+
+            self.waiting += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed += 1
+                        return False
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self, duration):
+        with self.condition:
+            self.active -= 1
+            self.latencies.append(duration)
+            self.condition.notify()
+
+    def percentile(self, samples, fraction):
+        if not samples:
+            return None
+        return round(samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000, 2)
+
+    def stats(self):
+        with self.condition:
+            samples = sorted(self.latencies)
+            return {
+                "limit": self.limit,
+                "queue_size": self.queue_size,
+                "active": self.active,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "shed": self.shed,
+                "p50_ms": self.percentile(samples, 0.50),
+                "p99_ms": self.percentile(samples, 0.99),
+            }
+
+
+def default_classes():
+    # Each non-critical class gets a fifth of the shared threads, counting
+    # requests parked in its queue, so together they can never take the
+    # reserved ones.
+    budget = max(2, (WORKER_THREADS - RESERVED_THREADS) // 5)
+    limit = max(1, budget * 2 // 3)
+    queue_size = budget - limit
+    return {
+        # SOS ingest may use every thread, including the reserved ones.
+        "critical": PriorityClass("critical", WORKER_THREADS, WORKER_THREADS, 10),
+        # Periodic pings from every tracked tourist; a shed one is superseded
+        # by the next, so it never waits long.
+        "location": PriorityClass("location", limit, queue_size, 0.5, retry_after=5),
+        "upload": PriorityClass("upload", limit, queue_size, 2, retry_after=5),
+        "listing": PriorityClass("listing", limit, queue_size, 1, retry_after=2),
+        "default": PriorityClass("default", limit, queue_size, 1),
+        # A websocket holds its thread for the whole incident, so streams get
+        # the entire share as connections and nothing waits for a slot.
+        "stream": PriorityClass("stream", budget, 0, 0, retry_after=5),
+    }
+
+
+# Flask endpoint name -> priority class. Unlisted endpoints use "default".
+ROUTE_CLASSES = {
+    "sos": "critical",
+    "ingest_location": "location",
+    "report": "upload",
+    "report_upload_init": "upload",
+    "report_upload_chunk": "upload",
+    "report_upload_complete": "upload",
+    "register_batch": "upload",
+    "get_reports": "listing",
+    "get_sos_alerts": "listing",
+    "location_trail": "listing",
+    "analytics": "listing",
+    "alert_feed": "listing",
+    "search": "listing",
+    "itinerary_risk_profile": "listing",
+    "incident_channel": "stream",
+}
+
+# The metrics endpoint itself bypasses admission.
+EXEMPT_ENDPOINTS = {"admission_metrics"}
+
+
+class AdmissionController:
+    def __init__(self, classes=None, route_classes=None):
+        self.classes = classes or default_classes()
+        self.route_classes = route_classes or ROUTE_CLASSES
+        self.enabled = os.environ.get("ADMISSION_CONTROL", "1") != "0"
+
+    def init_app(self, app):
+        # Registered before any other hook so that shed requests are refused
+        # before their bodies are read.
+        app.before_request(self.admit)
+        app.teardown_request(self.release)
+        app.add_url_rule("/metrics/admission", "admission_metrics", self.metrics)
+
+    def admit(self):
+        if not self.enabled or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        priority = self.classes[self.route_classes.get(request.endpoint, "default")]
+        if not priority.acquire():
+            response = jsonify({"status": "error", "message": "Server busy, retry later"})
+            response.status_code = 503
+            response.headers["Retry-After"] = str(priority.retry_after)
+            # Don't make the worker drain the rest of a large request body.
+            response.headers["Connection"] = "close"
+            return response
+        g.admission_class = priority
+        g.admission_start = time.perf_counter()
+        return None
+
+    def release(self, exc=None):
+        priority = g.pop("admission_class", None)
+        if priority is not None:
+            priority.release(time.perf_counter() - g.pop("admission_start"))
+
+    def metrics(self):
+        return jsonify({
+            "enabled": self.enabled,
+            "classes": {name: priority.stats() for name, priority in self.classes.items()}
+        })
@@ -1,37 +1,75 @@
-import hashlib
 import json
 import os
 import random
-import requests
+import time
+from contextlib import contextmanager
 from threading import Thread
 
+_PROCESS_START = time.perf_counter()
+
 from kivy.animation import Animation
 from kivy.clock import Clock
 from kivy.lang import Builder
 from kivy.metrics import dp
-from kivy.properties import NumericProperty, ObjectProperty, StringProperty, ListProperty
+from kivy.properties import NumericProperty, ObjectProperty
 from kivy.uix.behaviors.button import ButtonBehavior
-from kivy.uix.button import Button
-from kivy.uix.dropdown import DropDown
-from kivy.uix.image import Image
-from kivy.uix.label import Label
-from kivy.uix.screenmanager import ScreenManager, Screen
+from kivy.uix.screenmanager import ScreenManager
 from kivy.utils import platform
 
 from kivymd.app import MDApp
 from kivymd.uix.boxlayout import MDBoxLayout
-from kivymd.uix.button import MDRaisedButton, MDFlatButton
-from kivymd.uix.card import MDCard
-from kivymd.uix.card.card import MDSeparator
-from kivymd.uix.dialog import MDDialog
 from kivymd.uix.label import MDLabel
 from kivymd.uix.screen import MDScreen
-from kivymd.uix.textfield import MDTextField
-from kivy_garden.mapview.geojson import GeoJsonMapLayer
 
-from plyer import accelerometer, camera
-from utils import get_location
+# Heavy modules (requests, plyer, mapview's GeoJSON layer, dialogs, cards)
+# are imported inside the methods that use them so that the splash screen
+# is not held back by code the user hasn't reached yet.
 BASE_URL = "https://emergency-response-system-app.onrender.com"
+# How often the home screen re-fetches broadcast alerts for its location.
+ALERT_REFRESH_INTERVAL = 5 * 60
+
+# Set ERS_STARTUP_TIMING=1 to print per-phase startup timings.
+STARTUP_TIMING = os.environ.get("ERS_STARTUP_TIMING", "") not in ("", "0")
+
+
+class StartupTimer:
+    """Records how long each startup phase takes when STARTUP_TIMING is on."""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.phases = []
+        self.reported = False
+        self._last_mark = _PROCESS_START
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                self.phases.append((name, time.perf_counter() - start))
+
+    def mark(self, name):
+        """Closes a sequential phase that started at the previous mark."""
+        now = time.perf_counter()
+        if self.enabled:
+            self.phases.append((name, now - self._last_mark))
+        self._last_mark = now
+
+    def report(self):
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        total = time.perf_counter() - _PROCESS_START
+        print("[STARTUP] Phase timings:")
+        for name, seconds in self.phases:
+            print(f"[STARTUP]   {name:<32} {seconds * 1000:8.1f} ms")
+        print(f"[STARTUP]   {'total (time-to-splash)':<32} {total * 1000:8.1f} ms")
+
+
+startup_timer = StartupTimer(STARTUP_TIMING)
+startup_timer.mark("module imports")
 
 
 # --- Custom Widgets ---
@@ -91,6 +129,7 @@ class RegistrationScreen(MDScreen):
             "emergency_contact": emergency_contact
         }
 
+        import requests
         try:
             response = requests.post(f"{BASE_URL}/register", json=payload)
             if response.status_code == 201:
@@ -114,6 +153,8 @@ class HomeScreen(MDScreen):
         self.add_widget(self.side_menu)
         self.side_menu.pos_hint = {'x': -1}
         self.alerts = []
+        self.risk_zones = []
+        self.risk_zone_layer = None
         self.fall_detected = False
         self.freefall_start_time = None
         self.FREEFALL_THRESHOLD = 2.0 # m/s^2
@@ -121,11 +162,15 @@ class HomeScreen(MDScreen):
         self.FREEFALL_TIME = 0.2 # seconds
 
     def on_enter(self, *args):
+        self.alerts = ["Loading alerts..."]
         self.load_alerts()
+        Clock.schedule_interval(self.load_alerts, ALERT_REFRESH_INTERVAL)
         self.update_itinerary_panel()
         self.add_geofence_layer()
+        Thread(target=self.sync_risk_zones, daemon=True).start()
         Clock.schedule_interval(self.update_alert, 5)
         try:
+            from plyer import accelerometer
             accelerometer.enable()
             Clock.schedule_interval(self.check_user_status, 1) # Check once a second
         except Exception as e:
@@ -133,13 +178,34 @@ class HomeScreen(MDScreen):
 
     def add_geofence_layer(self):
         try:
-            geojson_layer = GeoJsonMapLayer(source="website/northeast_india.geojson")
+            from kivy_garden.mapview.geojson import GeoJsonMapLayer
+            from risk_zones import GEOFENCE_PATH
+            geojson_layer = GeoJsonMapLayer(source=GEOFENCE_PATH)
             self.ids.map_view.add_layer(geojson_layer)
         except Exception as e:
             print(f"Error adding geofence layer: {e}")
 
+    def sync_risk_zones(self):
+        from risk_zone_client import sync_risk_zones
+        zones = sync_risk_zones(BASE_URL, MDApp.get_running_app().user_data_dir)
+        Clock.schedule_once(lambda dt: self.show_risk_zones(zones))
+
+    def show_risk_zones(self, zones):
+        self.risk_zones = zones
+        try:
+            from kivy_garden.mapview.geojson import GeoJsonMapLayer
+            from risk_zone_client import zones_to_geojson
+            if self.risk_zone_layer:
+                self.ids.map_view.remove_layer(self.risk_zone_layer)
+            self.risk_zone_layer = GeoJsonMapLayer(geojson=zones_to_geojson(zones))
+            self.ids.map_view.add_layer(self.risk_zone_layer)
+        except Exception as e:
+            print(f"Error adding risk zone layer: {e}")
+
     def on_leave(self, *args):
+        Clock.unschedule(self.load_alerts)
         try:
+            from plyer import accelerometer
             accelerometer.disable()
             Clock.unschedule(self.check_user_status)
         except Exception as e:
@@ -155,15 +221,24 @@ class HomeScreen(MDScreen):
         MIN_LON, MAX_LON = 77.5, 97.5
 
         try:
+            from utils import get_location
             location = get_location()
             if location:
                 lat, lon = location.latitude, location.longitude
                 if not (MIN_LAT <= lat <= MAX_LAT and MIN_LON <= lon <= MAX_LON):
                     self.show_geofence_alert()
+                elif self.in_risk_zone(lat, lon):
+                    self.show_geofence_alert()
         except Exception as e:
             print(f"Error getting location for geofence: {e}")
 
+    def in_risk_zone(self, lat, lon):
+        from risk_zones import zone_contains
+        return any(zone_contains(zone, lat, lon) for zone in self.risk_zones)
+
     def show_geofence_alert(self):
+        from kivymd.uix.button import MDFlatButton
+        from kivymd.uix.dialog import MDDialog
         if not hasattr(self, 'geofence_dialog') or not self.geofence_dialog.is_open:
             self.geofence_dialog = MDDialog(
                 title="High-Risk Zone",
@@ -177,6 +252,7 @@ class HomeScreen(MDScreen):
             return
 
         try:
+            from plyer import accelerometer
             val = accelerometer.acceleration
             if not val or all(v is None for v in val):
                 return
@@ -198,6 +274,8 @@ class HomeScreen(MDScreen):
             pass
     
     def show_fall_dialog(self):
+        from kivymd.uix.button import MDFlatButton
+        from kivymd.uix.dialog import MDDialog
         self.countdown_value = 60
         
         self.countdown_label = MDLabel(
@@ -242,18 +320,28 @@ class HomeScreen(MDScreen):
         self.send_sos_notification()
         self.fall_detected = False
 
-    def load_alerts(self):
-        try:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            alerts_path = os.path.join(script_dir, 'alerts.json')
-            with open(alerts_path, 'r') as f:
-                self.alerts = json.load(f)
-                if not self.alerts:
-                    self.alerts = ["No alerts available."]
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.alerts = ["Could not load alerts."]
+    def load_alerts(self, *args):
+        Thread(target=self.fetch_alerts, daemon=True).start()
+
+    def fetch_alerts(self):
+        from broadcast_client import active, fetch_alerts, load_cache
+        from utils import get_location
+        cache_dir = MDApp.get_running_app().user_data_dir
+        location = get_location()
+        if location:
+            alerts = fetch_alerts(BASE_URL, cache_dir, location.latitude, location.longitude)
+        else:
+            # Same filter as fetch_alerts, so expired alerts are never shown offline.
+            alerts = active(load_cache(cache_dir).get("alerts", []))
+        messages = [alert["message"] for alert in alerts] or ["No alerts for your area."]
+        Clock.schedule_once(lambda dt: self.set_alerts(messages))
 
-    def update_itinerary_panel(self):
+    def set_alerts(self, messages):
+        self.alerts = messages
+        self.current_alert_index = 0
+        self.update_alert(0)
+
+    def update_itinerary_panel(self, profile=None):
         app = MDApp.get_running_app()
         user = app.current_user
         title_label = self.ids.itinerary_title_label
@@ -272,9 +360,17 @@ class HomeScreen(MDScreen):
                 selected_itinerary = next((i for i in itineraries if i['city'] == city_name), None)
 
                 if selected_itinerary:
-                    for item in selected_itinerary['itinerary']:
+                    if profile:
+                        # The module (and requests) is already loaded by load_itinerary_risk.
+                        from itinerary_risk_client import day_lines, trip_summary
+                        summary = trip_summary(profile)
+                        lines = ([summary] if summary else []) + day_lines(selected_itinerary, profile)
+                    else:
+                        lines = [f"Day {item['day']}: {item['activity']}" for item in selected_itinerary['itinerary']]
+                        Thread(target=self.load_itinerary_risk, args=(city_name,), daemon=True).start()
+                    for line in lines:
                         day_label = MDLabel(
-                            text=f"Day {item['day']}: {item['activity']}",
+                            text=line,
                             halign='left',
                             valign='middle',
                             size_hint_y=None
@@ -289,6 +385,18 @@ class HomeScreen(MDScreen):
         else:
             title_label.text = "Select an Itinerary"
 
+    def load_itinerary_risk(self, city_name):
+        from itinerary_risk_client import fetch_risk
+        profile = fetch_risk(BASE_URL, MDApp.get_running_app().user_data_dir, city_name)
+        if profile:
+            Clock.schedule_once(lambda dt: self.show_itinerary_risk(city_name, profile))
+
+    def show_itinerary_risk(self, city_name, profile):
+        user = MDApp.get_running_app().current_user
+        # The user may have picked another trip while the profile was loading.
+        if user and user.get('selected_itinerary') == city_name:
+            self.update_itinerary_panel(profile)
+
     def go_to_itinerary_list(self, *args):
         self.manager.current = 'itinerary_list_screen'
 
@@ -308,6 +416,7 @@ class HomeScreen(MDScreen):
             return
 
         try:
+            from utils import get_location
             location = get_location()
             if location:
                 lat = location.latitude
@@ -332,15 +441,31 @@ class HomeScreen(MDScreen):
             }
         }
 
+        import requests
         try:
             response = requests.post(f"{BASE_URL}/sos", json=payload)
             if response.status_code == 200:
                 print(f"SOS signal sent successfully. Response: {response.text}")
+                incident_id = response.json().get("incident_id")
+                if incident_id:
+                    self.start_incident_stream(incident_id)
             else:
                 print(f"Failed to send SOS signal. Status code: {response.status_code}")
         except requests.exceptions.RequestException as e:
             print(f"Error sending SOS signal: {e}")
 
+    def start_incident_stream(self, incident_id):
+        from incident_client import IncidentStream
+        app = MDApp.get_running_app()
+        if app.incident_stream:
+            app.incident_stream.stop()
+        app.incident_stream = IncidentStream(BASE_URL, incident_id, on_ack=self.on_dispatcher_ack)
+        app.incident_stream.start()
+
+    def on_dispatcher_ack(self, message):
+        text = f"Dispatcher: {message}"
+        Clock.schedule_once(lambda dt: setattr(self.ids.alerts_label, 'text', text))
+
     def start_anomaly_report(self):
         if platform == 'android':
             from android.permissions import request_permission, Permission
@@ -357,6 +482,7 @@ class HomeScreen(MDScreen):
     def open_camera(self):
         try:
             from datetime import datetime
+            from plyer import camera
             current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
             self.photo_path = f"report_{current_time}.jpg"
             camera.take_picture(
@@ -376,6 +502,9 @@ class HomeScreen(MDScreen):
 
     def show_report_dialog(self):
         if not hasattr(self, 'dialog'):
+            from kivymd.uix.button import MDFlatButton
+            from kivymd.uix.dialog import MDDialog
+            from kivymd.uix.textfield import MDTextField
             self.reason_input = MDTextField(
                 hint_text="Reason for report",
                 multiline=True,
@@ -408,6 +537,7 @@ class HomeScreen(MDScreen):
         user_data = app.current_user
         
         try:
+            from utils import get_location
             location = get_location()
             if location:
                 location_data = {"latitude": location.latitude, "longitude": location.longitude}
@@ -417,31 +547,23 @@ class HomeScreen(MDScreen):
             print(f"Could not get location for report: {e}")
             location_data = {"latitude": "Error", "longitude": "Error"}
 
-        report_data = {
-            'reason': reason,
-            'user': json.dumps(user_data),
-            'location': json.dumps(location_data)
-        }
-        
-        try:
-            with open(photo_path, 'rb') as f:
-                files = {'image': (os.path.basename(photo_path), f, 'image/jpeg')}
-                
-                response = requests.post(
-                    f"{BASE_URL}/report",
-                    files=files,
-                    data=report_data
-                )
-                
-                if response.status_code == 200:
-                    print("Report submitted successfully.")
-                else:
-                    print(f"Failed to submit report. Status: {response.status_code}, Response: {response.text}")
+        # Retries back off for up to a few minutes on bad links, so keep
+        # them off the UI thread.
+        Thread(
+            target=self.upload_report,
+            args=(photo_path, reason, user_data, location_data),
+            daemon=True
+        ).start()
 
+    def upload_report(self, photo_path, reason, user_data, location_data):
+        from report_uploader import upload_report
+        try:
+            if upload_report(BASE_URL, photo_path, reason, user_data, location_data):
+                print("Report submitted successfully.")
+            else:
+                print("Failed to submit report.")
         except FileNotFoundError:
             print(f"Error: Could not find photo file at {photo_path}")
-        except requests.exceptions.RequestException as e:
-            print(f"Error submitting report: {e}")
 
     def toggle_side_menu(self):
         if self.side_menu_open:
@@ -486,6 +608,8 @@ class ItineraryListScreen(MDScreen):
         self.load_cities()
 
     def load_cities(self):
+        from kivy.uix.image import Image
+        from kivymd.uix.card import MDCard
         city_list_layout = self.ids.city_list
         city_list_layout.clear_widgets()
         try:
@@ -528,7 +652,7 @@ class ItineraryDetailScreen(MDScreen):
     def on_enter(self):
         self.populate_details()
 
-    def populate_details(self):
+    def populate_details(self, profile=None):
         app = MDApp.get_running_app()
         itinerary = app.current_itinerary
         if not itinerary:
@@ -536,10 +660,25 @@ class ItineraryDetailScreen(MDScreen):
         self.ids.city_name_label.text = f"Itinerary for {itinerary['city']}"
         details_layout = self.ids.itinerary_details_layout
         details_layout.clear_widgets()
-        for item in itinerary['itinerary']:
-            details_layout.add_widget(
-                MDLabel(text=f"Day {item['day']}: {item['activity']}", size_hint_y=None, height=dp(40))
-            )
+        if profile:
+            from itinerary_risk_client import day_lines, trip_summary
+            summary = trip_summary(profile)
+            lines = ([summary] if summary else []) + day_lines(itinerary, profile)
+        else:
+            lines = [f"Day {item['day']}: {item['activity']}" for item in itinerary['itinerary']]
+            Thread(target=self.load_risk, args=(itinerary,), daemon=True).start()
+        for line in lines:
+            details_layout.add_widget(MDLabel(text=line, size_hint_y=None, height=dp(40)))
+
+    def load_risk(self, itinerary):
+        from itinerary_risk_client import fetch_risk
+        profile = fetch_risk(BASE_URL, MDApp.get_running_app().user_data_dir, itinerary['city'])
+        if profile:
+            Clock.schedule_once(lambda dt: self.show_risk(itinerary, profile))
+
+    def show_risk(self, itinerary, profile):
+        if MDApp.get_running_app().current_itinerary is itinerary:
+            self.populate_details(profile)
 
     def select_itinerary(self):
         app = MDApp.get_running_app()
@@ -569,6 +708,8 @@ class SafetyScoreScreen(MDScreen):
         Thread(target=self.fetch_safety_score).start()
 
     def fetch_safety_score(self):
+        import requests
+        from utils import get_location
         try:
             location = get_location()
             if not location:
@@ -580,6 +721,35 @@ class SafetyScoreScreen(MDScreen):
 
         lat, lon = location.latitude, location.longitude
 
+        try:
+            self.fetch_live_score(lat, lon)
+            return
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            print(f"Live safety score unavailable, using static scores: {e}")
+        self.fetch_static_city_score(lat, lon)
+
+    def fetch_live_score(self, lat, lon):
+        import requests
+        headers = {}
+        cached = getattr(self, 'last_live_score', None)
+        if cached:
+            headers['If-None-Match'] = cached['etag']
+        response = requests.get(
+            f"{BASE_URL}/safety_score",
+            params={'lat': lat, 'lon': lon},
+            headers=headers,
+            timeout=10
+        )
+        if response.status_code == 304:
+            data = cached['data']
+        else:
+            response.raise_for_status()
+            data = response.json()
+            self.last_live_score = {'etag': response.headers.get('ETag', ''), 'data': data}
+        self.update_labels(f"{data['score']}/5", f"({data['status']}) near your location")
+
+    def fetch_static_city_score(self, lat, lon):
+        import requests
         try:
             headers = {'User-Agent': 'KivySafetyApp/1.0'}
             response = requests.get(
@@ -639,6 +809,7 @@ class LoginScreen(MDScreen):
 
         payload = {"mobile": mobile}
 
+        import requests
         try:
             response = requests.post(f"{BASE_URL}/login", json=payload)
             if response.status_code == 200:
@@ -651,50 +822,99 @@ class LoginScreen(MDScreen):
         except requests.exceptions.RequestException as e:
             print(f"Error during login: {e}")
 
+class LazyScreenManager(ScreenManager):
+    """ScreenManager that loads a screen's kv rules and builds it on first use."""
+
+    def __init__(self, **kwargs):
+        self._screen_factories = {}
+        self._loaded_kv_files = set()
+        super().__init__(**kwargs)
+
+    def register_screen(self, name, screen_cls, kv_files):
+        self._screen_factories[name] = (screen_cls, kv_files)
+
+    def is_built(self, name):
+        return name in self.screen_names
+
+    def build_screen(self, name):
+        screen_cls, kv_files = self._screen_factories[name]
+        with startup_timer.phase(f"build {name}"):
+            for kv_file in kv_files:
+                if kv_file not in self._loaded_kv_files:
+                    Builder.load_file(kv_file)
+                    self._loaded_kv_files.add(kv_file)
+            screen = screen_cls(name=name)
+            self.add_widget(screen)
+        return screen
+
+    def get_screen(self, name):
+        if name in self._screen_factories and not self.is_built(name):
+            return self.build_screen(name)
+        return super().get_screen(name)
+
+    def has_screen(self, name):
+        return name in self._screen_factories or super().has_screen(name)
+
+
+# name -> (screen class, kv files that must be loaded before it is built)
+SCREENS = [
+    ('splash_screen', SplashScreen, ['splash.kv']),
+    ('welcome_screen', WelcomeScreen, ['welcome.kv']),
+    ('registration_screen', RegistrationScreen, ['registration.kv']),
+    ('login_screen', LoginScreen, ['login.kv']),
+    ('home_screen', HomeScreen, ['sidemenu.kv', 'home.kv']),
+    ('profile_screen', ProfileScreen, ['profile.kv']),
+    ('main_app_screen', MainAppScreen, ['main_app.kv']),
+    ('itinerary_list_screen', ItineraryListScreen, ['itinerary_list.kv']),
+    ('itinerary_detail_screen', ItineraryDetailScreen, ['itinerary_detail.kv']),
+    ('safety_score_screen', SafetyScoreScreen, ['safetyscore.kv']),
+]
+
 class MyApp(MDApp):
     current_user = ObjectProperty(None)
     current_itinerary = ObjectProperty(None)
+    incident_stream = ObjectProperty(None)
 
     def switch_theme(self):
         self.theme_cls.theme_style = 'Light' if self.theme_cls.theme_style == 'Dark' else 'Dark'
 
+    def close_side_menu(self):
+        if self.root.is_built('home_screen'):
+            home_screen = self.root.get_screen('home_screen')
+            if home_screen.side_menu_open:
+                home_screen.toggle_side_menu()
+
     def go_to_profile(self):
         self.root.current = 'profile_screen'
-        if self.root.get_screen('home_screen').side_menu_open:
-            self.root.get_screen('home_screen').toggle_side_menu()
+        self.close_side_menu()
 
     def logout(self):
         self.current_user = None
+        if self.incident_stream:
+            self.incident_stream.stop()
+            self.incident_stream = None
         self.root.current = 'login_screen'
-        if self.root.get_screen('home_screen').side_menu_open:
-            self.root.get_screen('home_screen').toggle_side_menu()
+        self.close_side_menu()
 
     def build(self):
+        startup_timer.mark("app init")
         self.theme_cls.theme_style = "Dark"
         self.theme_cls.primary_palette = "Blue"
-        sm = ScreenManager()
-        Builder.load_file('splash.kv')
-        Builder.load_file('welcome.kv')
-        Builder.load_file('registration.kv')
-        Builder.load_file('login.kv')
-        Builder.load_file('profile.kv')
-        Builder.load_file('sidemenu.kv')
-        Builder.load_file('home.kv')
-        Builder.load_file('main_app.kv')
-        Builder.load_file('itinerary_list.kv')
-        Builder.load_file('itinerary_detail.kv')
-        Builder.load_file('safetyscore.kv')
-        sm.add_widget(SplashScreen(name='splash_screen'))
-        sm.add_widget(WelcomeScreen(name='welcome_screen'))
-        sm.add_widget(RegistrationScreen(name='registration_screen'))
-        sm.add_widget(LoginScreen(name='login_screen'))
-        sm.add_widget(HomeScreen(name='home_screen'))
-        sm.add_widget(ProfileScreen(name='profile_screen'))
-        sm.add_widget(MainAppScreen(name='main_app_screen'))
-        sm.add_widget(ItineraryListScreen(name='itinerary_list_screen'))
-        sm.add_widget(ItineraryDetailScreen(name='itinerary_detail_screen'))
-        sm.add_widget(SafetyScoreScreen(name='safety_score_screen'))
+        sm = LazyScreenManager()
+        for name, screen_cls, kv_files in SCREENS:
+            sm.register_screen(name, screen_cls, kv_files)
+        # Only the splash screen is built up front; the rest are built the
+        # first time something navigates to them.
+        sm.build_screen('splash_screen')
+        startup_timer.mark("build")
         return sm
 
+    def on_start(self):
+        Clock.schedule_once(self.report_startup_timings)
+
+    def report_startup_timings(self, dt):
+        startup_timer.mark("first frame")
+        startup_timer.report()
+
 if __name__ == '__main__':
     MyApp().run()
@@ -0,0 +1,382 @@
+"""Columnar archive for old SOS alerts and anomaly reports.
+
+Alerts and reports older than the retention window are rolled out of
+alert.json / website/reports.json into immutable segments under archive/.
+A segment is a directory of NumPy .npy columns, memory-mapped when read, so
+analytics scan only the columns and time ranges they need. Each segment also
+lists the ids it holds, so a roll that crashed after writing its segment but
+before removing the records from the live files is finished by the next one
+instead of archiving them twice.
+
+Usage:
+    python archive.py roll [--days 30]
+    python archive.py bench [--records 2000000]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from datastore import FSYNC, DataStore, fsync_directory, removed_keys
+
+ARCHIVE_DIR = "archive"
+META_FILE = "meta.json"
+USERS_FILE = "users.json"
+IDS_FILE = "ids.json"
+
+KINDS = {"sos": 0, "report": 1}
+STATUS_CODES = {"open": 0, "pending": 1, "accepted": 2}
+COLUMN_TYPES = {
+    "ts": np.int64,            # epoch seconds, segments are sorted by it
+    "lat": np.float32,
+    "lon": np.float32,
+    "kind": np.uint8,          # KINDS
+    "status": np.uint8,        # STATUS_CODES
+    "user": np.int32,          # index into the segment's users.json, -1 if unknown
+    "response_s": np.float32,  # seconds until a report was accepted, NaN otherwise
+}
+MAX_BUCKETS = 10000
+# Region cells are packed as two 32-bit indexes, so cells can't be smaller.
+MIN_CELL_SIZE = 0.001
+
+
+def to_epoch(value):
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def record_fields(record, kind):
+    """Returns (ts, lat, lon, status, user, response_s) for an alert or report."""
+    ts = to_epoch(record.get("timestamp"))
+    location = record.get("location") or {}
+    if kind == "sos":
+        user = record.get("blockchainId") or record.get("phoneNumber")
+        status = "open"
+        response = float("nan")
+    else:
+        user_data = record.get("user") or {}
+        user = user_data.get("blockchain_id") or user_data.get("mobile")
+        status = record.get("status", "pending")
+        accepted = to_epoch(record.get("accepted_at"))
+        response = float(accepted - ts) if accepted is not None and ts is not None else float("nan")
+    return ts, to_float(location.get("latitude")), to_float(location.get("longitude")), \
+        STATUS_CODES.get(status, 0), user, response
+
+
+def build_columns(alerts, reports):
+    """Converts alert and report dicts into sorted columns plus a user dictionary."""
+    rows = []
+    for kind, records in (("sos", alerts), ("report", reports)):
+        for record in records:
+            ts, lat, lon, status, user, response = record_fields(record, kind)
+            if ts is not None:
+                rows.append((ts, lat, lon, KINDS[kind], status, user, response))
+
+    users = []
+    user_codes = {}
+    encoded = []
+    for ts, lat, lon, kind, status, user, response in rows:
+        if user is None:
+            code = -1
+        else:
+            code = user_codes.get(user)
+            if code is None:
+                code = user_codes[user] = len(users)
+                users.append(user)
+        encoded.append((ts, lat, lon, kind, status, code, response))
+
+    columns = {
+        name: np.array([row[i] for row in encoded], dtype=dtype)
+        for i, (name, dtype) in enumerate(COLUMN_TYPES.items())
+    }
+    order = np.argsort(columns["ts"], kind="stable")
+    return {name: column[order] for name, column in columns.items()}, users
+
+
+class Segment:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), "r") as f:
+            self.meta = json.load(f)
+        self._columns = {}
+        self._users = None
+        self._ids = None
+
+    def column(self, name):
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._columns[name]
+
+    def users(self):
+        if self._users is None:
+            with open(os.path.join(self.path, USERS_FILE), "r") as f:
+                self._users = {user: code for code, user in enumerate(json.load(f))}
+        return self._users
+
+    def ids(self):
+        """{kind: set of record ids} archived in this segment."""
+        if self._ids is None:
+            try:
+                with open(os.path.join(self.path, IDS_FILE), "r") as f:
+                    self._ids = {kind: set(ids) for kind, ids in json.load(f).items()}
+            except FileNotFoundError:
+                self._ids = {}
+        return self._ids
+
+
+class ColumnSet:
+    """Adapts in-memory columns (e.g. records not yet archived) to the Segment interface."""
+
+    def __init__(self, columns, users):
+        self.columns = columns
+        self.user_codes = {user: code for code, user in enumerate(users)}
+        ts = columns["ts"]
+        self.meta = {"min_ts": int(ts[0]) if len(ts) else 0, "max_ts": int(ts[-1]) if len(ts) else -1}
+
+    def column(self, name):
+        return self.columns[name]
+
+    def users(self):
+        return self.user_codes
+
+
+class Archive:
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self._segments = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def segments(self):
+        """Returns all segments, opening any written since the last call."""
+        with self.lock:
+            names = set(os.listdir(self.directory))
+            for name in names - set(self._segments):
+                path = os.path.join(self.directory, name)
+                if name.startswith("segment_") and os.path.exists(os.path.join(path, META_FILE)):
+                    self._segments[name] = Segment(path)
+            return [self._segments[name] for name in sorted(self._segments)]
+
+    def write_segment(self, columns, users, ids=None):
+        count = len(columns["ts"])
+        if not count:
+            return None
+        name = f"segment_{int(columns['ts'][0])}_{int(columns['ts'][-1])}_{uuid.uuid4().hex[:8]}"
+        tmp_path = os.path.join(self.directory, "." + name)
+        os.makedirs(tmp_path)
+
+        def write(filename, dump):
+            with open(os.path.join(tmp_path, filename), "wb") as f:
+                dump(f)
+                f.flush()
+                if FSYNC:
+                    os.fsync(f.fileno())
+
+        for column_name, column in columns.items():
+            write(f"{column_name}.npy", lambda f: np.save(f, column))
+        write(USERS_FILE, lambda f: f.write(json.dumps(users).encode("utf-8")))
+        if ids is not None:
+            write(IDS_FILE, lambda f: f.write(json.dumps(ids).encode("utf-8")))
+        write(META_FILE, lambda f: f.write(json.dumps({
+            "count": count,
+            "min_ts": int(columns["ts"][0]),
+            "max_ts": int(columns["ts"][-1]),
+            "created": int(time.time())
+        }).encode("utf-8")))
+        # Segments appear atomically, so readers never see a partial one, and
+        # their files are on disk before the rename makes them visible (the
+        # records are removed from the live files right after).
+        if FSYNC:
+            fsync_directory(tmp_path)
+        os.rename(tmp_path, os.path.join(self.directory, name))
+        if FSYNC:
+            fsync_directory(self.directory)
+        return name
+
+    def archived_ids(self, start, end):
+        """{kind: set of ids} held by segments overlapping [start, end] (epoch seconds)."""
+        archived = {kind: set() for kind in KINDS}
+        for segment in self.segments():
+            if segment.meta["min_ts"] <= end and segment.meta["max_ts"] >= start:
+                for kind, ids in segment.ids().items():
+                    archived.setdefault(kind, set()).update(ids)
+        return archived
+
+    def roll(self, alerts, reports, cutoff):
+        """Archives records older than `cutoff` (epoch seconds).
+
+        Returns (alerts_to_keep, reports_to_keep, removed_count). Pending
+        reports stay live so dispatchers can still act on them. Records an
+        earlier roll already archived are removed without being written again.
+        """
+        def is_old(record):
+            ts = to_epoch(record.get("timestamp"))
+            return ts is not None and ts < cutoff
+
+        old_alerts = [a for a in alerts if is_old(a)]
+        old_reports = [r for r in reports if is_old(r) and r.get("status") != "pending"]
+        if not old_alerts and not old_reports:
+            return alerts, reports, 0
+
+        timestamps = [to_epoch(r.get("timestamp")) for r in old_alerts + old_reports]
+        archived = self.archived_ids(min(timestamps), max(timestamps))
+        new_alerts = [a for a in old_alerts if a.get("id") is None or a["id"] not in archived["sos"]]
+        new_reports = [r for r in old_reports if r.get("id") is None or r["id"] not in archived["report"]]
+        if new_alerts or new_reports:
+            columns, users = build_columns(new_alerts, new_reports)
+            self.write_segment(columns, users, ids={
+                "sos": [a["id"] for a in new_alerts if a.get("id") is not None],
+                "report": [r["id"] for r in new_reports if r.get("id") is not None],
+            })
+        rolled_reports = {id(r) for r in old_reports}
+        return [a for a in alerts if not is_old(a)], \
+            [r for r in reports if id(r) not in rolled_reports], len(old_alerts) + len(old_reports)
+
+    def analytics(self, start, end, bucket_size, cell_size=0.5, kind=None, user=None, live=None):
+        """Aggregates archived (and optionally live) records in [start, end).
+
+        Returns time-bucketed counts, a per-region histogram over
+        `cell_size`-degree cells and report response-time statistics.
+        """
+        if not np.isfinite(cell_size) or not MIN_CELL_SIZE <= cell_size <= 180:
+            raise ValueError(f"cell must be a number of degrees between {MIN_CELL_SIZE} and 180")
+        bucket_count = int(np.ceil((end - start) / bucket_size))
+        if bucket_count <= 0 or bucket_count > MAX_BUCKETS:
+            raise ValueError(f"Time range must span between 1 and {MAX_BUCKETS} buckets")
+
+        counts = np.zeros(bucket_count, dtype=np.int64)
+        region_keys = []
+        response_times = []
+        sources = self.segments() + ([live] if live is not None else [])
+
+        for source in sources:
+            if source.meta["max_ts"] < start or source.meta["min_ts"] >= end:
+                continue
+            ts = source.column("ts")
+            lo, hi = np.searchsorted(ts, [start, end])
+            if lo == hi:
+                continue
+            ts = ts[lo:hi]
+            mask = np.ones(hi - lo, dtype=bool)
+            if kind is not None:
+                mask &= source.column("kind")[lo:hi] == KINDS[kind]
+            if user is not None:
+                code = source.users().get(user)
+                if code is None:
+                    continue
+                mask &= source.column("user")[lo:hi] == code
+
+            selected_ts = ts[mask]
+            counts += np.bincount((selected_ts - start) // bucket_size, minlength=bucket_count)
+
+            lat = source.column("lat")[lo:hi][mask]
+            lon = source.column("lon")[lo:hi][mask]
+            located = ~(np.isnan(lat) | np.isnan(lon))
+            lat_cells = np.floor(lat[located] / cell_size).astype(np.int64)
+            lon_cells = np.floor(lon[located] / cell_size).astype(np.int64)
+            region_keys.append((lat_cells << 32) | (lon_cells & 0xFFFFFFFF))
+
+            response = source.column("response_s")[lo:hi][mask]
+            response_times.append(response[~np.isnan(response)])
+
+        regions = []
+        if region_keys:
+            keys, key_counts = np.unique(np.concatenate(region_keys), return_counts=True)
+            lat_cells = keys >> 32
+            lon_cells = (keys & 0xFFFFFFFF).astype(np.int32)
+            regions = [
+                {"lat": round(float(la) * cell_size, 4), "lon": round(float(lo_) * cell_size, 4), "count": int(c)}
+                for la, lo_, c in zip(lat_cells, lon_cells, key_counts)
+            ]
+
+        response_times = np.concatenate(response_times) if response_times else np.array([])
+        response_stats = {"count": int(len(response_times))}
+        if len(response_times):
+            p50, p90 = np.percentile(response_times, [50, 90])
+            response_stats.update({
+                "mean_s": round(float(response_times.mean()), 1),
+                "p50_s": round(float(p50), 1),
+                "p90_s": round(float(p90), 1),
+                "max_s": round(float(response_times.max()), 1),
+            })
+
+        return {
+            "total": int(counts.sum()),
+            "buckets": {"start": start, "size": bucket_size, "counts": counts.tolist()},
+            "regions": {"cell_size": cell_size, "cells": regions},
+            "response_time": response_stats,
+        }
+
+
+def read_json_list(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+def roll_files(archive, days):
+    cutoff = time.time() - days * 24 * 60 * 60
+    datastore = DataStore()
+    with datastore.lock:
+        old_alerts, old_reports = read_json_list("alert.json"), read_json_list("website/reports.json")
+        alerts, reports, archived = archive.roll(old_alerts, old_reports, cutoff)
+        if archived:
+            datastore.save("alerts", alerts, "remove", keys=removed_keys(old_alerts, alerts))
+            datastore.save("reports", reports, "remove", keys=removed_keys(old_reports, reports))
+    return archived
+
+
+def bench(records):
+    import tempfile
+    rng = np.random.default_rng(0)
+    now = int(time.time())
+    columns = {
+        "ts": np.sort(rng.integers(now - 365 * 86400, now, records)).astype(np.int64),
+        "lat": rng.uniform(21.5, 31.5, records).astype(np.float32),
+        "lon": rng.uniform(77.5, 97.5, records).astype(np.float32),
+        "kind": rng.integers(0, 2, records).astype(np.uint8),
+        "status": rng.integers(0, 3, records).astype(np.uint8),
+        "user": rng.integers(0, 50000, records).astype(np.int32),
+        "response_s": np.where(rng.random(records) < 0.3, rng.exponential(1800, records), np.nan).astype(np.float32),
+    }
+    archive = Archive(tempfile.mkdtemp(prefix="archive_bench_"))
+    for part in np.array_split(np.arange(records), 10):
+        archive.write_segment({name: column[part] for name, column in columns.items()},
+                              [str(i) for i in range(50000)])
+
+    start = time.perf_counter()
+    result = Archive(archive.directory).analytics(now - 365 * 86400, now, 86400)
+    elapsed = time.perf_counter() - start
+    print(f"{records} records in 10 segments: full-year daily analytics in {elapsed * 1000:.0f} ms "
+          f"({result['total']} matched, {len(result['regions']['cells'])} regions)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the alert/report archive")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    roll_parser = subparsers.add_parser("roll", help="archive records older than --days")
+    roll_parser.add_argument("--days", type=float, default=30)
+    bench_parser = subparsers.add_parser("bench", help="time analytics over synthetic records")
+    bench_parser.add_argument("--records", type=int, default=2000000)
+    args = parser.parse_args()
+
+    if args.command == "roll":
+        print(f"Archived {roll_files(Archive(), args.days)} records.")
+    else:
+        bench(args.records)
@@ -0,0 +1,185 @@
+"""Benchmarks /sos latency while slow /report uploads flood the server.
+
+Usage:
+    python bench_admission.py [--workers 16] [--flooders 48] [--duration 10]
+
+Starts server:app under gunicorn (one gthread worker with --workers threads)
+in a scratch directory, once without and once with admission control.
+Uploaders trickle their request bodies in slowly like a phone on a poor link,
+so each one holds a worker thread for about a second. Prints SOS p50/p99
+latency and how many uploads were admitted or shed in each run.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(scratch, port, admission_enabled, args):
+    env = dict(os.environ,
+               PYTHONPATH=REPO_DIR,
+               WORKER_THREADS=str(args.workers),
+               RESERVED_THREADS=str(max(2, args.workers // 4)),
+               ADMISSION_CONTROL="1" if admission_enabled else "0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-k", "gthread", "-w", "1",
+         "--threads", str(args.workers), "-b", f"127.0.0.1:{port}", "--chdir", scratch, "server:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            admission_metrics(port)
+            return process
+        except (OSError, http.client.HTTPException):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start; is it installed?")
+
+
+def admission_metrics(port):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request("GET", "/metrics/admission")
+    body = json.loads(conn.getresponse().read())
+    conn.close()
+    return body
+
+
+def multipart_report(size):
+    boundary = "benchboundary"
+    head = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="reason"\r\n\r\nbenchmark\r\n'
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="image"; filename="bench.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    return head + os.urandom(size) + tail, f"multipart/form-data; boundary={boundary}"
+
+
+def flood_uploads(port, stop, counts, lock, upload_size, upload_seconds):
+    body, content_type = multipart_report(upload_size)
+    pieces = 16
+    piece_size = len(body) // pieces + 1
+    while not stop.is_set():
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            conn.putrequest("POST", "/report")
+            conn.putheader("Content-Type", content_type)
+            conn.putheader("Content-Length", str(len(body)))
+            conn.endheaders()
+            try:
+                for i in range(0, len(body), piece_size):
+                    conn.send(body[i:i + piece_size])
+                    time.sleep(upload_seconds / pieces)
+            except OSError:
+                # A shed request is answered and closed before its body is
+                # read, so the rest of the send fails; the 503 is still there.
+                pass
+            status = conn.getresponse().status
+            conn.close()
+        except (OSError, http.client.HTTPException):
+            status = "error"
+        with lock:
+            counts[status] = counts.get(status, 0) + 1
+        if status != 200:
+            # Retry aggressively rather than honouring Retry-After.
+            time.sleep(0.2)
+
+
+def probe_sos(port, stop, latencies, failures):
+    payload = json.dumps({
+        "blockchainId": "bench",
+        "phoneNumber": "0000000000",
+        "location": {"latitude": 26.14, "longitude": 91.73}
+    })
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            conn.request("POST", "/sos", payload, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            if response.status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                failures.append(response.status)
+        except (OSError, http.client.HTTPException):
+            failures.append("error")
+        time.sleep(0.05)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return float("nan")
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+
+def run(scratch, admission_enabled, args):
+    port = free_port()
+    process = start_server(scratch, port, admission_enabled, args)
+
+    stop = threading.Event()
+    counts, lock = {}, threading.Lock()
+    latencies, failures = [], []
+    threads = [
+        threading.Thread(target=flood_uploads, daemon=True,
+                         args=(port, stop, counts, lock, args.upload_kb * 1024, args.upload_seconds))
+        for _ in range(args.flooders)
+    ]
+    threads.append(threading.Thread(target=probe_sos, args=(port, stop, latencies, failures), daemon=True))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=35)
+    metrics = admission_metrics(port)
+    process.terminate()
+    process.wait()
+
+    label = "on " if admission_enabled else "off"
+    print(f"admission {label} | sos n={len(latencies):4d} failed={len(failures):3d} "
+          f"p50={percentile(latencies, 0.50):8.1f} ms p99={percentile(latencies, 0.99):8.1f} ms | "
+          f"uploads admitted={counts.get(200, 0):4d} shed={counts.get(503, 0):4d} "
+          f"dropped={counts.get('error', 0):4d}")
+    if admission_enabled:
+        for name, stats in metrics["classes"].items():
+            print(f"    {name:<8} {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=16, help="worker threads in the pool")
+    parser.add_argument("--flooders", type=int, default=48, help="concurrent uploading clients")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run")
+    parser.add_argument("--upload-kb", type=int, default=256, help="size of each uploaded photo")
+    parser.add_argument("--upload-seconds", type=float, default=1.0, help="time to trickle in each upload")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_admission_")
+    os.makedirs(os.path.join(scratch, "website", "uploads"))
+
+    print(f"{args.workers} threads, {args.flooders} uploaders, {args.duration:.0f}s per run, scratch dir {scratch}")
+    run(scratch, False, args)
+    run(scratch, True, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import json
+import os
+import time
+
+import requests
+
+CACHE_FILE = "alert_feed_cache.json"
+
+
+def load_cache(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, CACHE_FILE), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_cache(cache_dir, cache):
+    path = os.path.join(cache_dir, CACHE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(cache, f)
+    os.replace(path + ".tmp", path)
+
+
+def active(alerts):
+    now = time.time()
+    return [alert for alert in alerts if alert.get("expires_at") is None or alert["expires_at"] > now]
+
+
+def fetch_alerts(base_url, cache_dir, lat, lon):
+    """Returns the broadcast alerts for lat/lon, falling back to the last cached feed offline.
+
+    The feed's ETag is kept with the cached alerts so an unchanged feed
+    costs the server a 304.
+    """
+    cache = load_cache(cache_dir)
+    headers = {"If-None-Match": cache["etag"]} if cache.get("etag") else {}
+    try:
+        response = requests.get(f"{base_url}/alerts/feed", params={"lat": lat, "lon": lon},
+                                headers=headers, timeout=10)
+        if response.status_code == 304:
+            return active(cache.get("alerts", []))
+        response.raise_for_status()
+        alerts = response.json()["alerts"]
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        print(f"[ALERTS] Feed unavailable, using cached alerts: {e}")
+        return active(cache.get("alerts", []))
+
+    save_cache(cache_dir, {"etag": response.headers.get("ETag"), "alerts": alerts})
+    return active(alerts)
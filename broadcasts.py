@@ -0,0 +1,240 @@
+"""Geo-targeted broadcast alerts (weather, landslides, closures) for the app's ticker.
+
+Admins publish an alert for everyone, for a lat/lon box or for any risk-zone
+geometry (a point with a radius, a polygon or a multipolygon). Devices ask
+for the feed of the grid cell they are in; each cell's response body and
+ETag are built once and reused until an alert changes or expires.
+
+Like the risk zones, every worker keeps its own copy: writes take the
+datastore's process lock and reload the file before rewriting it, and the
+other workers reload on BROADCASTS_UPDATED.
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from datastore import atomic_write_json
+from risk_zones import ZoneError, normalize_zone, point_in_ring, polygons_of
+
+# Feeds are cached per cell of this many degrees (~11 km, as for safety scores).
+CELL_SIZE = 0.1
+MAX_CACHED_CELLS = 20000
+SEVERITIES = ("info", "warning", "danger")
+MAX_MESSAGE_LENGTH = 280
+
+
+def cell_for(lat, lon):
+    return (math.floor(lat / CELL_SIZE), math.floor(lon / CELL_SIZE))
+
+
+def cell_bounds(cell):
+    """Returns (min_lon, min_lat, max_lon, max_lat) of a cell."""
+    return (cell[1] * CELL_SIZE, cell[0] * CELL_SIZE, (cell[1] + 1) * CELL_SIZE, (cell[0] + 1) * CELL_SIZE)
+
+
+def segments_cross(p1, p2, q1, q2):
+    def orientation(a, b, c):
+        return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+    d1, d2 = orientation(q1, q2, p1), orientation(q1, q2, p2)
+    d3, d4 = orientation(p1, p2, q1), orientation(p1, p2, q2)
+    return (d1 > 0) != (d2 > 0) and (d3 > 0) != (d4 > 0)
+
+
+def target_intersects(target, bounds):
+    """True if an alert's target geometry overlaps the (min_lon, min_lat, max_lon, max_lat) box."""
+    if target is None:
+        return True
+    min_lon, min_lat, max_lon, max_lat = bounds
+    t_min_lon, t_min_lat, t_max_lon, t_max_lat = target["bbox"]
+    if t_max_lon < min_lon or t_min_lon > max_lon or t_max_lat < min_lat or t_min_lat > max_lat:
+        return False
+
+    geometry = target["geometry"]
+    if geometry["type"] == "Point":
+        lon, lat = geometry["coordinates"][:2]
+        nearest_lon = min(max(lon, min_lon), max_lon)
+        nearest_lat = min(max(lat, min_lat), max_lat)
+        return math.hypot(nearest_lat - lat, nearest_lon - lon) * 111000 <= target["radius_m"]
+
+    corners = [(min_lon, min_lat), (max_lon, min_lat), (max_lon, max_lat), (min_lon, max_lat)]
+    edges = list(zip(corners, corners[1:] + corners[:1]))
+    for polygon in polygons_of(geometry):
+        outer = polygon[0]
+        if any(point_in_ring(lat, lon, outer) for lon, lat in corners):
+            return True
+        if any(min_lon <= p[0] <= max_lon and min_lat <= p[1] <= max_lat for p in outer):
+            return True
+        for a, b in zip(outer, outer[1:]):
+            if any(segments_cross(a, b, c, d) for c, d in edges):
+                return True
+    return False
+
+
+class BroadcastError(Exception):
+    pass
+
+
+def normalize_alert(data, alert_id=None):
+    if not isinstance(data, dict):
+        raise BroadcastError("Alert must be an object")
+    message = str(data.get("message", "")).strip()
+    if not message or len(message) > MAX_MESSAGE_LENGTH:
+        raise BroadcastError(f"message is required and at most {MAX_MESSAGE_LENGTH} characters")
+    severity = data.get("severity", "info")
+    if severity not in SEVERITIES:
+        raise BroadcastError(f"severity must be one of {', '.join(SEVERITIES)}")
+
+    target = None
+    region = data.get("region")
+    if region is not None:
+        try:
+            min_lat, min_lon = float(region["min_lat"]), float(region["min_lon"])
+            max_lat, max_lon = float(region["max_lat"]), float(region["max_lon"])
+        except (KeyError, TypeError, ValueError):
+            raise BroadcastError("region needs min_lat, min_lon, max_lat and max_lon")
+        data = dict(data, geometry={"type": "Polygon", "coordinates": [[
+            [min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]
+        ]]})
+    if data.get("geometry") is not None:
+        try:
+            zone = normalize_zone({"geometry": data["geometry"], "radius_m": data.get("radius_m", 1000)})
+        except ZoneError as e:
+            raise BroadcastError(f"Invalid target: {e}")
+        target = {key: zone[key] for key in ("geometry", "bbox", "radius_m") if key in zone}
+
+    now = time.time()
+    try:
+        expires_at = float(data["expires_at"]) if data.get("expires_at") is not None else None
+    except (TypeError, ValueError):
+        raise BroadcastError("expires_at must be epoch seconds")
+    if expires_at is not None and not math.isfinite(expires_at):
+        raise BroadcastError("expires_at must be epoch seconds")
+    if expires_at is not None and expires_at <= now:
+        raise BroadcastError("expires_at is in the past")
+    return {
+        "id": alert_id or uuid.uuid4().hex[:12],
+        "message": message,
+        "severity": severity,
+        "category": str(data.get("category", "general")),
+        "issued_at": int(now),
+        "expires_at": expires_at,
+        "target": target,
+    }
+
+
+class BroadcastStore:
+    def __init__(self, path, legacy_path=None, lock=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.lock = threading.Lock()
+        self.file_lock = lock or threading.RLock()
+        self.cell_cache = OrderedDict()
+        self.version = None
+        self.load()
+
+    def read_state(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def load(self):
+        """(Re)reads the alerts from disk, e.g. after another worker changed them."""
+        state = self.read_state()
+        if state is None:
+            with self.file_lock:
+                state = self.read_state()
+                if state is None:
+                    state = {"version": 0, "alerts": []}
+                    if self.legacy_path:
+                        # The ticker messages that used to ship with the app, shown everywhere.
+                        # Ids come from the text so they match whichever worker imports them.
+                        try:
+                            with open(self.legacy_path, "r") as f:
+                                state["alerts"] = [
+                                    normalize_alert({"message": text},
+                                                    hashlib.sha1(str(text).encode("utf-8")).hexdigest()[:12])
+                                    for text in json.load(f)]
+                        except (FileNotFoundError, json.JSONDecodeError, BroadcastError):
+                            pass
+                    atomic_write_json(self.path, state)
+        with self.lock:
+            if state["version"] != self.version:
+                self.cell_cache.clear()
+            self.version = state["version"]
+            self.alerts = state["alerts"]
+
+    def publish(self, data):
+        alert = normalize_alert(data)
+        version = self._change(lambda alerts: alerts + [alert])
+        return alert, version
+
+    def withdraw(self, alert_id):
+        def remove(alerts):
+            remaining = [a for a in alerts if a["id"] != alert_id]
+            return remaining if len(remaining) < len(alerts) else None
+        return self._change(remove)
+
+    def _change(self, update):
+        """Applies `update` to the alerts on disk; returns the new version, or None if it made no change.
+
+        Only the file write happens under the shared datastore lock (which
+        /sos also takes); the cell cache is dropped afterwards and each cell
+        is rebuilt by the next feed request for it.
+        """
+        with self.file_lock:
+            self.load()
+            with self.lock:
+                alerts, version = self.alerts, self.version
+            updated = update(alerts)
+            if updated is None:
+                return None
+            now = time.time()
+            updated = [a for a in updated if a["expires_at"] is None or a["expires_at"] > now]
+            version += 1
+            atomic_write_json(self.path, {"version": version, "alerts": updated})
+        with self.lock:
+            if version > self.version:
+                self.alerts, self.version = updated, version
+                self.cell_cache.clear()
+        return version
+
+    def list(self):
+        with self.lock:
+            return self.version, list(self.alerts)
+
+    def _build(self, cell, now):
+        bounds = cell_bounds(cell)
+        alerts = [
+            {key: alert[key] for key in ("id", "message", "severity", "category", "issued_at", "expires_at")}
+            for alert in self.alerts
+            if (alert["expires_at"] is None or alert["expires_at"] > now) and target_intersects(alert["target"], bounds)
+        ]
+        alerts.sort(key=lambda a: (-SEVERITIES.index(a["severity"]), -a["issued_at"]))
+        body = json.dumps({"status": "success", "cell": list(cell), "alerts": alerts},
+                          separators=(',', ':')).encode("utf-8")
+        expiries = [a["expires_at"] for a in alerts if a["expires_at"] is not None]
+        return {
+            "body": body,
+            "etag": "af-" + hashlib.sha1(body).hexdigest()[:16],
+            "valid_until": min(expiries) if expiries else math.inf,
+        }
+
+    def feed(self, lat, lon):
+        """Returns the cached (body, etag) of the feed for the cell containing lat/lon."""
+        cell = cell_for(lat, lon)
+        now = time.time()
+        with self.lock:
+            entry = self.cell_cache.get(cell)
+            if entry is None or entry["valid_until"] <= now:
+                entry = self.cell_cache[cell] = self._build(cell, now)
+                if len(self.cell_cache) > MAX_CACHED_CELLS:
+                    self.cell_cache.popitem(last=False)
+            else:
+                self.cell_cache.move_to_end(cell)
+            return entry["body"], entry["etag"]
@@ -0,0 +1,166 @@
+"""Builds cache-friendly copies of the website's static assets.
+
+Run `python build_assets.py` before deploying. For every image, stylesheet and
+script referenced by the dashboard pages it writes a content-fingerprinted
+copy to static_build/ (served from /assets/ with immutable caching), plus:
+
+- gzip and, if the brotli module is installed, brotli variants of text assets
+- a downscaled, recompressed copy of each image and a WebP variant of it
+  (requires Pillow; images are copied unchanged without it)
+
+The pages themselves are rewritten to point at the fingerprinted URLs and
+written to static_build/ under their original names.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+from io import BytesIO
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+BUILD_DIR = os.path.join(SOURCE_DIR, "static_build")
+MANIFEST_FILE = "manifest.json"
+PAGES = ["MAIN.html", "admin.html", "login.html"]
+
+TEXT_EXTENSIONS = {".css", ".js", ".json", ".geojson", ".svg", ".html"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+MAX_IMAGE_DIMENSION = 1600
+JPEG_QUALITY = 80
+WEBP_QUALITY = 75
+
+HTML_REFERENCE = re.compile(r'(\b(?:src|href)=")([^"#?:]+)(")')
+CSS_REFERENCE = re.compile(r'(url\(["\']?)([^"\')#?:]+)(["\']?\))')
+
+
+def fingerprinted_name(name, content):
+    stem, ext = os.path.splitext(name)
+    stem = re.sub(r"[^A-Za-z0-9_.-]+", "-", stem).strip("-")
+    digest = hashlib.sha256(content).hexdigest()[:10]
+    return f"{stem}.{digest}{ext.lower()}"
+
+
+def write(name, content):
+    with open(os.path.join(BUILD_DIR, name), "wb") as f:
+        f.write(content)
+
+
+def write_compressed_variants(name, content):
+    write(name + ".gz", gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli:
+        write(name + ".br", brotli.compress(content, quality=11))
+
+
+def optimize_image(path):
+    """Returns (content, webp_content) for an image; webp_content may be None."""
+    with open(path, "rb") as f:
+        original = f.read()
+    if Image is None:
+        return original, None
+
+    ext = os.path.splitext(path)[1].lower()
+    with Image.open(BytesIO(original)) as image:
+        image.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION))
+        output = BytesIO()
+        if ext == ".png":
+            image.save(output, "PNG", optimize=True)
+        else:
+            image.convert("RGB").save(output, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        webp = BytesIO()
+        image.save(webp, "WEBP", quality=WEBP_QUALITY, method=6)
+
+    content = output.getvalue()
+    if len(content) >= len(original):
+        content = original
+    webp_content = webp.getvalue() if len(webp.getvalue()) < len(content) else None
+    return content, webp_content
+
+
+class AssetBuilder:
+    def __init__(self):
+        self.manifest = {}
+
+    def asset_url(self, reference):
+        """Builds `reference` if it is a local asset and returns its /assets/ URL."""
+        name = reference.strip()
+        if name in self.manifest:
+            return "/assets/" + self.manifest[name]
+
+        path = os.path.join(SOURCE_DIR, name)
+        ext = os.path.splitext(name)[1].lower()
+        if name in PAGES or not os.path.isfile(path) or os.path.getsize(path) == 0:
+            return None
+        if ext in IMAGE_EXTENSIONS:
+            self.build_image(name, path)
+        elif ext in TEXT_EXTENSIONS and ext != ".html":
+            self.build_text(name, path)
+        else:
+            return None
+        return "/assets/" + self.manifest[name]
+
+    def rewrite(self, text, pattern):
+        def replace(match):
+            url = self.asset_url(match.group(2))
+            return match.group(1) + url + match.group(3) if url else match.group(0)
+        return pattern.sub(replace, text)
+
+    def build_image(self, name, path):
+        content, webp_content = optimize_image(path)
+        built_name = fingerprinted_name(name, content)
+        write(built_name, content)
+        if webp_content:
+            write(os.path.splitext(built_name)[0] + ".webp", webp_content)
+        self.manifest[name] = built_name
+
+    def build_text(self, name, path):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        if name.endswith(".css"):
+            text = self.rewrite(text, CSS_REFERENCE)
+        content = text.encode("utf-8")
+        built_name = fingerprinted_name(name, content)
+        write(built_name, content)
+        write_compressed_variants(built_name, content)
+        self.manifest[name] = built_name
+
+    def build_page(self, name):
+        with open(os.path.join(SOURCE_DIR, name), "r", encoding="utf-8") as f:
+            content = self.rewrite(f.read(), HTML_REFERENCE).encode("utf-8")
+        write(name, content)
+        write_compressed_variants(name, content)
+
+    def build(self):
+        if os.path.isdir(BUILD_DIR):
+            shutil.rmtree(BUILD_DIR)
+        os.makedirs(BUILD_DIR)
+        for page in PAGES:
+            self.build_page(page)
+        with open(os.path.join(BUILD_DIR, MANIFEST_FILE), "w") as f:
+            json.dump(self.manifest, f, indent=4, sort_keys=True)
+        return self.manifest
+
+
+def total_size(names):
+    return sum(os.path.getsize(os.path.join(SOURCE_DIR, name)) for name in names)
+
+
+if __name__ == "__main__":
+    manifest = AssetBuilder().build()
+    built = sum(os.path.getsize(os.path.join(BUILD_DIR, name)) for name in manifest.values())
+    print(f"Built {len(manifest)} assets into {BUILD_DIR}: "
+          f"{total_size(manifest) / 1024:.0f} KB -> {built / 1024:.0f} KB before compression")
+    if Image is None:
+        print("Pillow is not installed; images were copied without resizing or WebP variants.")
+    if brotli is None:
+        print("brotli is not installed; only gzip variants were written.")
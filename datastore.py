@@ -0,0 +1,456 @@
+"""Crash-safe persistence for the server's JSON stores: alerts, reports and users.
+
+Every change to a store is first appended to an operation log
+(data/oplog.jsonl, one CRC-checked line per change) and then written out
+with write-to-temp, fsync and rename, so a crash leaves either the old or
+the new file and never a truncated one.
+
+A snapshot is a point-in-time copy of all stores. Because the files are
+only ever replaced, never rewritten in place, taking one only hard-links
+the current files and moves the operation log into the previous snapshot's
+directory while the data lock is held for a few hundred microseconds;
+hashing the copies for the manifest happens after ingest has resumed.
+
+  data/snapshots/<id>/<store>.json   the stores as of the snapshot
+  data/snapshots/<id>/manifest.json  sha256 and size of each, written last
+  data/snapshots/<id>/oplog.jsonl    changes made after this snapshot and
+                                     before the next one
+  data/oplog.jsonl                   changes since the newest snapshot
+
+recover() runs at startup. A store that is missing or does not parse is
+restored from the newest snapshot whose copy of it matches its manifest.
+The log since that snapshot is then replayed; replay is idempotent
+(appends are skipped when their key is already present), so it also
+re-applies a change whose log line was written but whose file write was
+cut short. Recovery costs one parse of each store plus at most
+SNAPSHOT_LOG_BYTES of log, since a snapshot is taken whenever the log
+grows past that.
+
+Usage:
+    python datastore.py snapshot
+    python datastore.py recover
+    python datastore.py bench [--records 1000000]
+"""
+import argparse
+import fcntl
+import gc
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime
+
+Store = namedtuple("Store", "path key indent")
+
+STORES = {
+    "alerts": Store("alert.json", "id", None),
+    "reports": Store(os.path.join("website", "reports.json"), "id", 4),
+    "users": Store("users.json", "mobile", 4),
+}
+# Snapshot at least this often, and sooner once the log passes SNAPSHOT_LOG_BYTES.
+SNAPSHOT_INTERVAL = 15 * 60
+SNAPSHOT_LOG_BYTES = 32 * 1024 * 1024
+KEEP_SNAPSHOTS = 3
+# Set DATA_FSYNC=0 to trade durability on power loss for write latency.
+FSYNC = os.environ.get("DATA_FSYNC", "1") != "0"
+
+
+def fsync_directory(directory):
+    fd = os.open(directory or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path, data, indent=None):
+    """Replaces `path` with `data` as JSON without ever leaving a partial file behind."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            # One dumps() call runs the C encoder; json.dump() streams through the Python one.
+            f.write(json.dumps(data, indent=indent))
+            f.flush()
+            if FSYNC:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if FSYNC:
+        fsync_directory(os.path.dirname(path))
+
+
+def load_records(path):
+    """Returns the list stored at `path`; raises ValueError if it is not a JSON list of objects."""
+    with open(path, "rb") as f:
+        records = json.load(f)
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise ValueError(f"{path} is not a list of records")
+    return records
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def removed_keys(before, after, key="id"):
+    kept = {record.get(key) for record in after}
+    return [record[key] for record in before if record.get(key) is not None and record[key] not in kept]
+
+
+def encode_op(op):
+    line = json.dumps(op, separators=(",", ":"))
+    return f"{zlib.crc32(line.encode('utf-8')):08x} {line}\n".encode("utf-8")
+
+
+def read_ops(path):
+    """Yields the logged operations in `path`, stopping at a torn or corrupt line."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            try:
+                crc, payload = line.rstrip(b"\n").split(b" ", 1)
+                if int(crc, 16) != zlib.crc32(payload):
+                    break
+                yield json.loads(payload)
+            except ValueError:
+                break
+
+
+def apply_ops(records, key, ops):
+    """Applies logged operations to `records` in place; returns how many changed anything."""
+    if not ops:
+        return 0
+    index = {record.get(key): i for i, record in enumerate(records)}
+    changed = 0
+    for op in ops:
+        kind = op["op"]
+        if kind in ("append", "extend"):
+            for record in ([op["record"]] if kind == "append" else op["records"]):
+                if record.get(key) not in index:
+                    index[record.get(key)] = len(records)
+                    records.append(record)
+                    changed += 1
+        elif kind == "update":
+            i = index.get(op["key"])
+            if i is not None and any(records[i].get(k) != v for k, v in op["fields"].items()):
+                records[i].update(op["fields"])
+                changed += 1
+        elif kind == "remove":
+            keys = set(op["keys"]) & index.keys()
+            if keys:
+                records[:] = [record for record in records if record.get(key) not in keys]
+                index = {record.get(key): i for i, record in enumerate(records)}
+                changed += 1
+    return changed
+
+
+class ProcessLock:
+    """A re-entrant lock that excludes other threads and other processes (e.g. gunicorn workers)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.fd = None
+        self.pid = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            if self.pid != os.getpid():
+                # A descriptor inherited across fork() would share the flock with the parent.
+                self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                self.pid = os.getpid()
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.thread_lock.release()
+
+
+class DataStore:
+    def __init__(self, stores=STORES, directory="data"):
+        self.stores = stores
+        self.directory = directory
+        self.snapshot_dir = os.path.join(directory, "snapshots")
+        self.log_path = os.path.join(directory, "oplog.jsonl")
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        self.lock = ProcessLock(os.path.join(directory, "lock"))
+        self.snapshot_due = threading.Event()
+
+    # --- Writes ---
+
+    def log(self, name, op, **fields):
+        line = encode_op(dict(fields, store=name, op=op))
+        with self.lock:
+            with open(self.log_path, "ab") as f:
+                f.write(line)
+                f.flush()
+                if FSYNC:
+                    os.fsync(f.fileno())
+                size = f.tell()
+        if size > SNAPSHOT_LOG_BYTES:
+            self.snapshot_due.set()
+
+    def write(self, name, state):
+        store = self.stores[name]
+        atomic_write_json(store.path, state, indent=store.indent)
+
+    def save(self, name, state, op, **fields):
+        """Logs one change to store `name` and writes out `state`, the whole list including it.
+
+        op is "append" (record=), "extend" (records=), "update" (key=,
+        fields=) or "remove" (keys=). Callers hold self.lock across their
+        read-modify-write.
+        """
+        with self.lock:
+            self.log(name, op, **fields)
+            self.write(name, state)
+
+    # --- Snapshots ---
+
+    def snapshot_ids(self):
+        return sorted(name for name in os.listdir(self.snapshot_dir)
+                      if os.path.isdir(os.path.join(self.snapshot_dir, name)))
+
+    def manifest(self, snapshot_id):
+        try:
+            with open(os.path.join(self.snapshot_dir, snapshot_id, "manifest.json"), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def snapshots(self):
+        """Completed snapshots, newest first."""
+        return [m for m in (self.manifest(s) for s in reversed(self.snapshot_ids())) if m]
+
+    def snapshot_needed(self):
+        try:
+            if os.path.getsize(self.log_path) > SNAPSHOT_LOG_BYTES:
+                return True
+        except FileNotFoundError:
+            pass
+        snapshots = self.snapshots()
+        # Other workers snapshot too; a slightly early one is fine, a second one is not.
+        return not snapshots or time.time() - snapshots[0]["created_at"] > SNAPSHOT_INTERVAL * 0.9
+
+    def snapshot(self):
+        """Takes a consistent copy of every store and returns its manifest."""
+        started = time.perf_counter()
+        with self.lock:
+            paused = time.perf_counter()
+            previous = self.snapshot_ids()
+            snapshot_id = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+            directory = os.path.join(self.snapshot_dir, snapshot_id)
+            os.makedirs(directory)
+            for name, store in self.stores.items():
+                if os.path.exists(store.path):
+                    try:
+                        os.link(store.path, os.path.join(directory, name + ".json"))
+                    except OSError:
+                        shutil.copyfile(store.path, os.path.join(directory, name + ".json"))
+            # Changes logged so far are in these copies; the log of what follows starts empty.
+            if os.path.exists(self.log_path):
+                if previous:
+                    os.replace(self.log_path, os.path.join(self.snapshot_dir, previous[-1], "oplog.jsonl"))
+                else:
+                    os.remove(self.log_path)
+            paused = time.perf_counter() - paused
+
+        files = {}
+        for name in self.stores:
+            path = os.path.join(directory, name + ".json")
+            if os.path.exists(path):
+                files[name] = {"sha256": file_sha256(path), "bytes": os.path.getsize(path)}
+        manifest = {
+            "id": snapshot_id,
+            "created_at": time.time(),
+            "files": files,
+            "paused_ms": round(paused * 1000, 3),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        atomic_write_json(os.path.join(directory, "manifest.json"), manifest, indent=4)
+        self.prune()
+        return manifest
+
+    def prune(self):
+        """Drops snapshots older than the KEEP_SNAPSHOTS newest completed ones."""
+        completed = [m["id"] for m in self.snapshots()]
+        if len(completed) < KEEP_SNAPSHOTS:
+            return
+        oldest_kept = completed[KEEP_SNAPSHOTS - 1]
+        for snapshot_id in self.snapshot_ids():
+            if snapshot_id < oldest_kept:
+                shutil.rmtree(os.path.join(self.snapshot_dir, snapshot_id), ignore_errors=True)
+
+    def log_segments(self):
+        """(segment, operations) for every log on disk, oldest first.
+
+        A snapshot directory's log holds the changes made after that
+        snapshot; the live log sorts last.
+        """
+        segments = [(snapshot_id, os.path.join(self.snapshot_dir, snapshot_id, "oplog.jsonl"))
+                    for snapshot_id in self.snapshot_ids()]
+        segments.append(("~live", self.log_path))
+        return [(segment, list(read_ops(path))) for segment, path in segments]
+
+    def restore_point(self, name):
+        """The records of store `name` from the newest snapshot whose copy checks out."""
+        for manifest in self.snapshots():
+            entry = manifest["files"].get(name)
+            if entry is None:
+                continue
+            path = os.path.join(self.snapshot_dir, manifest["id"], name + ".json")
+            try:
+                if file_sha256(path) == entry["sha256"]:
+                    return manifest["id"], load_records(path)
+            except (OSError, ValueError):
+                pass
+            print(f"[DATA] Snapshot {manifest['id']} has a damaged copy of {name}, trying an older one")
+        return None, None
+
+    # --- Recovery ---
+
+    def recover(self):
+        """Validates every store, restoring and replaying where needed; returns a timing report."""
+        started = time.perf_counter()
+        report = {"stores": {}}
+        # Parsing builds millions of objects and no cycles; the collector would only rescan them.
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._recover(report)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return report
+
+    def _recover(self, report):
+        with self.lock:
+            for store in self.stores.values():
+                directory = os.path.dirname(store.path) or "."
+                prefix = os.path.basename(store.path) + "."
+                for leftover in os.listdir(directory) if os.path.isdir(directory) else []:
+                    if leftover.startswith(prefix) and leftover.endswith(".tmp"):
+                        os.remove(os.path.join(directory, leftover))
+
+            snapshots = self.snapshots()
+            newest = snapshots[0]["id"] if snapshots else None
+            segments = self.log_segments()
+
+            for name, store in self.stores.items():
+                store_started = time.perf_counter()
+                source, base = "file", newest
+                try:
+                    records = load_records(store.path)
+                except FileNotFoundError:
+                    records = None
+                except (OSError, ValueError) as e:
+                    records = None
+                    damaged = f"{store.path}.damaged-{int(time.time())}"
+                    os.replace(store.path, damaged)
+                    print(f"[DATA] {store.path} is unreadable ({e}); moved to {damaged}")
+                if records is None:
+                    base, records = self.restore_point(name)
+                    source = f"snapshot {base}" if base else "empty"
+                    records = records if records is not None else []
+
+                pending = [op for segment, ops in segments if base is None or segment >= base
+                           for op in ops if op.get("store") == name]
+                replayed = apply_ops(records, store.key, pending)
+                if replayed or source.startswith("snapshot"):
+                    self.write(name, records)
+                report["stores"][name] = {
+                    "source": source,
+                    "records": len(records),
+                    "log_entries": len(pending),
+                    "replayed": replayed,
+                    "ms": round((time.perf_counter() - store_started) * 1000, 1),
+                }
+
+
+def bench(records):
+    import tempfile
+    now = datetime.now()
+    alerts = [{
+        "id": f"bench-{i}",
+        "phoneNumber": f"98{i:08d}",
+        "blockchainId": f"{i:064x}",
+        "location": {"latitude": 26 + (i % 500) / 100, "longitude": 91 + (i % 700) / 100},
+        "timestamp": now.isoformat(),
+    } for i in range(records)]
+    reports = [{"id": f"report-{i}.jpg", "reason": "Bench report", "status": "pending",
+                "timestamp": now.isoformat()} for i in range(records // 10)]
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="datastore_bench_") as scratch:
+        os.chdir(scratch)
+        try:
+            os.makedirs("website")
+            store = DataStore()
+            store.write("alerts", alerts)
+            store.write("reports", reports)
+            print(f"{records} alerts, {len(reports)} reports: "
+                  f"alert.json {os.path.getsize('alert.json') / 1e6:.0f} MB")
+
+            manifest = store.snapshot()
+            print(f"snapshot: ingest paused {manifest['paused_ms']:.2f} ms, "
+                  f"done in {manifest['elapsed_ms']:.0f} ms")
+
+            # A full log's worth of SOS appends since the snapshot.
+            start = time.perf_counter()
+            logged = 0
+            while not os.path.exists(store.log_path) or os.path.getsize(store.log_path) < SNAPSHOT_LOG_BYTES:
+                alerts.append(dict(alerts[0], id=f"new-{logged}"))
+                store.log("alerts", "append", record=alerts[-1])
+                logged += 1
+            print(f"log: {logged} appends, {(time.perf_counter() - start) / logged * 1e6:.1f} us each")
+            store.write("alerts", alerts)
+            del alerts, reports
+
+            for case in ("clean", "truncated"):
+                if case == "truncated":
+                    with open("alert.json", "r+b") as f:
+                        f.truncate(os.path.getsize("alert.json") // 2)
+                report = store.recover()
+                stores = ", ".join(f"{name} {r['source']} {r['ms']:.0f} ms, {r['replayed']} replayed"
+                                   for name, r in report["stores"].items())
+                print(f"recover ({case}): {report['elapsed_ms']:.0f} ms ({stores})")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot, recover or benchmark the server's data files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("snapshot", help="take a snapshot now")
+    subparsers.add_parser("recover", help="validate the stores and replay the log")
+    bench_parser = subparsers.add_parser("bench", help="time snapshots and recovery")
+    bench_parser.add_argument("--records", type=int, default=1000000)
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        print(json.dumps(DataStore().snapshot(), indent=4))
+    elif args.command == "recover":
+        print(json.dumps(DataStore().recover(), indent=4))
+    else:
+        bench(args.records)
@@ -0,0 +1,241 @@
+"""Event bus shared by every server worker.
+
+Caches and streaming endpoints keep per-process state, so changes made in
+one gunicorn worker (or on another node) have to reach the others. Handlers
+publish events here and the state owners subscribe to them; the bus decides
+how far an event travels:
+
+- InProcessEventBus: only this process (the default, one worker).
+- UnixSocketEventBus: every process on this machine that uses the same
+  directory. Each process binds a datagram socket there and publishes by
+  sending to all of them, so no broker process is needed. Sends happen on a
+  background thread and never wait on a peer; events that are too large, or
+  that find the outbox or a peer's socket buffer full, are dropped, logged
+  and counted in `dropped`. The bus must be created after the fork, i.e.
+  gunicorn without --preload (its default).
+- NetworkEventBus: every node, through a pluggable transport. RedisTransport
+  uses Redis pub/sub; LoopbackTransport is an in-memory stand-in for tests.
+
+Delivery to other processes is at most once. Every publisher numbers its
+events, so a receiver that sees a gap in a publisher's numbers knows it
+missed something and dispatches RESYNC locally; its handlers reload the
+state they keep from the files. A loss is noticed at the publisher's next
+event, and incident messages and location fixes, which are superseded
+within seconds, are not reloaded.
+
+Select one with EVENT_BUS=inprocess|unix|redis (EVENT_BUS_DIR and
+EVENT_BUS_URL configure the latter two).
+"""
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import uuid
+
+ALERT_CREATED = "alert.created"
+REPORT_UPDATED = "report.updated"
+USER_REGISTERED = "user.registered"
+INCIDENT_MESSAGE = "incident.message"
+BROADCASTS_UPDATED = "broadcasts.updated"
+RISK_ZONES_UPDATED = "risk_zones.updated"
+LOCATIONS_RECORDED = "locations.recorded"
+ARCHIVE_ROLLED = "archive.rolled"
+# Dispatched locally, never published: this process missed events from another.
+RESYNC = "bus.resync"
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessEventBus:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.handlers = {}
+        self.node_id = uuid.uuid4().hex
+        self.sequence = 0
+        # origin -> sequence number of the last event received from it
+        self.received = {}
+
+    def subscribe(self, topic, handler):
+        with self.lock:
+            self.handlers.setdefault(topic, []).append(handler)
+
+        def unsubscribe():
+            with self.lock:
+                self.handlers.get(topic, []).remove(handler)
+        return unsubscribe
+
+    def dispatch(self, topic, payload):
+        with self.lock:
+            handlers = list(self.handlers.get(topic, ()))
+        for handler in handlers:
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("Event handler for %s failed", topic)
+
+    def publish(self, topic, payload):
+        self.dispatch(topic, payload)
+
+    def encode(self, topic, payload):
+        with self.lock:
+            self.sequence += 1
+            sequence = self.sequence
+        return json.dumps({"topic": topic, "payload": payload, "origin": self.node_id, "seq": sequence},
+                          separators=(',', ':')).encode("utf-8")
+
+    def deliver_remote(self, data):
+        """Dispatches an event received from another process, ignoring our own."""
+        try:
+            message = json.loads(data)
+        except ValueError:
+            logger.warning("Dropping malformed event")
+            return
+        if not isinstance(message, dict) or not isinstance(message.get("topic"), str) or "payload" not in message:
+            logger.warning("Dropping malformed event")
+            return
+        origin = message.get("origin")
+        if origin == self.node_id:
+            return
+        sequence = message.get("seq")
+        if isinstance(sequence, int):
+            with self.lock:
+                last = self.received.get(origin)
+                if last is None or sequence > last:
+                    self.received[origin] = sequence
+            if last is not None and sequence > last + 1:
+                logger.warning("Missed %d events from %s, resyncing", sequence - last - 1, origin)
+                self.dispatch(RESYNC, {"origin": origin, "missed": sequence - last - 1})
+        self.dispatch(message["topic"], message["payload"])
+
+
+class UnixSocketEventBus(InProcessEventBus):
+    MAX_EVENT_SIZE = 64 * 1024
+    MAX_PENDING = 1000
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{os.getpid()}-{self.node_id[:8]}.sock")
+        self.receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.receiver.bind(self.path)
+        self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        # A slow peer must not hold up delivery to the others.
+        self.sender.setblocking(False)
+        self.outbox = queue.Queue(self.MAX_PENDING)
+        self.dropped = 0
+        threading.Thread(target=self.receive_loop, daemon=True).start()
+        threading.Thread(target=self.send_loop, daemon=True).start()
+
+    def receive_loop(self):
+        while True:
+            try:
+                data = self.receiver.recv(self.MAX_EVENT_SIZE)
+            except OSError as e:
+                if self.receiver.fileno() == -1:
+                    return
+                logger.error("Event bus receive failed: %s", e)
+                continue
+            self.deliver_remote(data)
+
+    def drop(self, topic, reason, *args):
+        with self.lock:
+            self.dropped += 1
+        logger.error("Dropped event %s: " + reason, topic, *args)
+
+    def publish(self, topic, payload):
+        self.dispatch(topic, payload)
+        # Numbered even if dropped below, so receivers notice the gap.
+        data = self.encode(topic, payload)
+        if len(data) > self.MAX_EVENT_SIZE:
+            self.drop(topic, "too large to share (%d bytes)", len(data))
+            return
+        try:
+            self.outbox.put_nowait((topic, data))
+        except queue.Full:
+            self.drop(topic, "outbox full (%d events)", self.MAX_PENDING)
+
+    def send_loop(self):
+        while True:
+            topic, data = self.outbox.get()
+            for name in os.listdir(self.directory):
+                peer = os.path.join(self.directory, name)
+                if peer == self.path or not name.endswith(".sock"):
+                    continue
+                try:
+                    self.sender.sendto(data, peer)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # The process that owned this socket has exited.
+                    try:
+                        os.remove(peer)
+                    except FileNotFoundError:
+                        pass
+                except BlockingIOError:
+                    self.drop(topic, "%s has a full socket buffer", name)
+                except OSError as e:
+                    self.drop(topic, "not delivered to %s: %s", name, e)
+
+    def close(self):
+        self.receiver.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class NetworkEventBus(InProcessEventBus):
+    """Shares events between nodes through a transport with publish(bytes) and listen(callback)."""
+
+    def __init__(self, transport):
+        super().__init__()
+        self.transport = transport
+        transport.listen(self.deliver_remote)
+
+    def publish(self, topic, payload):
+        self.dispatch(topic, payload)
+        try:
+            self.transport.publish(self.encode(topic, payload))
+        except Exception as e:
+            logger.error("Could not publish %s to the network bus: %s", topic, e)
+
+
+class LoopbackTransport:
+    """In-memory transport; every bus built on the same channel acts as a separate node."""
+
+    channels = {}
+    channels_lock = threading.Lock()
+
+    def __init__(self, channel="default"):
+        with self.channels_lock:
+            self.listeners = self.channels.setdefault(channel, [])
+
+    def listen(self, callback):
+        self.listeners.append(callback)
+
+    def publish(self, data):
+        for callback in list(self.listeners):
+            callback(data)
+
+
+class RedisTransport:
+    def __init__(self, url, channel="ers-events"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+
+    def listen(self, callback):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: lambda message: callback(message["data"])})
+        pubsub.run_in_thread(sleep_time=0.1, daemon=True)
+
+    def publish(self, data):
+        self.client.publish(self.channel, data)
+
+
+def create_event_bus():
+    kind = os.environ.get("EVENT_BUS", "inprocess")
+    if kind == "unix":
+        return UnixSocketEventBus(os.environ.get("EVENT_BUS_DIR", "/tmp/ers-events"))
+    if kind == "redis":
+        return NetworkEventBus(RedisTransport(os.environ.get("EVENT_BUS_URL", "redis://localhost:6379/0")))
+    return InProcessEventBus()
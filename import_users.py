@@ -0,0 +1,69 @@
+"""Bulk-imports tourists for tour-operator onboarding.
+
+Usage:
+    python import_users.py group.csv
+    python import_users.py group.ndjson --errors errors.json
+
+CSV files need a header row with mobile, kyc and emergency_contact columns;
+NDJSON files hold one JSON object per line with the same fields. Errors are
+reported against the line of the file the row came from.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+from datastore import DataStore
+from users import add_users
+
+
+def read_rows(path):
+    """Returns (line number, row) pairs; a line that is not valid JSON gives a None row."""
+    if path.endswith(".csv"):
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            return [(reader.line_num, row) for row in reader]
+
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append((line_number, json.loads(line)))
+            except json.JSONDecodeError:
+                # Reported as an error against its line.
+                rows.append((line_number, None))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import users into users.json")
+    parser.add_argument("path", help="CSV or NDJSON file of users")
+    parser.add_argument("--errors", help="write the per-row error report to this JSON file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    numbered = read_rows(args.path)
+    rows = [row for _, row in numbered]
+    datastore = DataStore()
+    with datastore.lock:
+        created, errors = add_users(rows, save=lambda users, created: datastore.save(
+            "users", users, "extend", records=created), row_numbers=[number for number, _ in numbered])
+    elapsed = time.perf_counter() - start
+
+    print(f"Imported {len(created)} of {len(rows)} users in {elapsed:.2f}s, {len(errors)} rejected.")
+    for error in errors[:20]:
+        print(f"  row {error['row']} ({error['mobile']}): {error['message']}")
+    if len(errors) > 20:
+        print(f"  ... and {len(errors) - 20} more")
+
+    if args.errors:
+        with open(args.errors, "w") as f:
+            json.dump(errors, f, indent=4)
+    return 1 if errors and not created else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+
+import websocket
+
+from utils import get_location
+
+LOCATION_INTERVAL = 5  # seconds between location updates
+STREAM_DURATION = 60 * 60  # stop streaming an hour after the SOS
+RECONNECT_DELAY = 5
+
+
+def websocket_url(base_url, incident_id):
+    if base_url.startswith("https://"):
+        base_url = "wss://" + base_url[len("https://"):]
+    elif base_url.startswith("http://"):
+        base_url = "ws://" + base_url[len("http://"):]
+    return f"{base_url}/ws/incident/{incident_id}?role=tourist"
+
+
+class IncidentStream:
+    """Streams the tourist's location for an open SOS incident over a WebSocket.
+
+    Acknowledgements pushed by dispatchers are passed to `on_ack` with the
+    message text. The stream reconnects on network errors until `stop()` is
+    called or STREAM_DURATION has passed.
+    """
+
+    def __init__(self, base_url, incident_id, on_ack=None):
+        self.url = websocket_url(base_url, incident_id)
+        self.on_ack = on_ack
+        self.stopped = threading.Event()
+        self.ws = None
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.ws:
+            self.ws.close()
+
+    def run(self):
+        deadline = time.time() + STREAM_DURATION
+        while not self.stopped.is_set() and time.time() < deadline:
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self.on_open,
+                on_message=self.on_message,
+                on_error=lambda ws, error: print(f"[INCIDENT] Stream error: {error}")
+            )
+            self.ws.run_forever(ping_interval=30, ping_timeout=10)
+            self.stopped.wait(RECONNECT_DELAY)
+        self.stopped.set()
+
+    def on_open(self, ws):
+        threading.Thread(target=self.send_locations, args=(ws,), daemon=True).start()
+
+    def send_locations(self, ws):
+        while not self.stopped.is_set() and ws.sock and ws.sock.connected:
+            try:
+                location = get_location()
+                if location:
+                    ws.send(json.dumps({
+                        "t": "loc",
+                        "la": round(location.latitude, 5),
+                        "lo": round(location.longitude, 5),
+                        "ts": int(time.time())
+                    }, separators=(',', ':')))
+            except Exception as e:
+                print(f"[INCIDENT] Could not send location: {e}")
+                return
+            self.stopped.wait(LOCATION_INTERVAL)
+
+    def on_message(self, ws, raw):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+        if message.get("t") == "ack" and self.on_ack:
+            self.on_ack(message.get("msg", ""))
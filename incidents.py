@@ -0,0 +1,132 @@
+import json
+import queue
+import threading
+import time
+import uuid
+
+# Messages waiting for a slow subscriber beyond this are dropped; location
+# updates are superseded every few seconds so losing one is harmless.
+SUBSCRIBER_QUEUE_SIZE = 64
+# An incident nobody is watching is forgotten this long after its last
+# message; it is reopened from the known SOS ids if someone connects again.
+INCIDENT_TTL = 24 * 60 * 60
+PRUNE_INTERVAL = 60
+
+
+def encode_message(message):
+    return json.dumps(message, separators=(',', ':'))
+
+
+class Subscriber(queue.Queue):
+    """A subscriber's outgoing queue; the token identifies it across processes."""
+
+    def __init__(self):
+        super().__init__(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.token = uuid.uuid4().hex
+
+
+class IncidentHub:
+    """Fans out live incident messages to every connection watching an incident.
+
+    Tourists stream location updates into an incident and dispatchers push
+    acknowledgements back; each message is encoded once and queued for every
+    other subscriber of that incident.
+
+    `known` maps the id of every SOS in alert.json to its blockchain id, so
+    a connection for an unknown id is answered without reading the file.
+    """
+
+    def __init__(self, ttl=INCIDENT_TTL):
+        self.lock = threading.Lock()
+        self.ttl = ttl
+        self.incidents = {}
+        self.subscribers = {}
+        self.known = {}
+        self.pruned = time.time()
+
+    def load(self, alerts):
+        """Replaces the known SOS ids with those of `alerts`, e.g. after a start or an archive roll."""
+        known = {alert['id']: alert.get('blockchainId') for alert in alerts
+                 if isinstance(alert, dict) and isinstance(alert.get('id'), str)}
+        with self.lock:
+            self.known = known
+
+    def open_incident(self, incident_id, blockchain_id=None, location=None):
+        now = time.time()
+        with self.lock:
+            self.known[incident_id] = blockchain_id
+            self._open(incident_id, blockchain_id, location, now)
+            if now - self.pruned >= PRUNE_INTERVAL:
+                self._prune(now)
+
+    def _open(self, incident_id, blockchain_id, location, now):
+        self.incidents[incident_id] = {
+            "opened": now,
+            "active": now,
+            "blockchain_id": blockchain_id,
+            "last_location": location
+        }
+
+    def _prune(self, now):
+        self.pruned = now
+        expired = [incident_id for incident_id, incident in self.incidents.items()
+                   if now - incident["active"] > self.ttl and incident_id not in self.subscribers]
+        for incident_id in expired:
+            del self.incidents[incident_id]
+
+    def blockchain_id(self, incident_id):
+        with self.lock:
+            incident = self.incidents.get(incident_id)
+            return incident["blockchain_id"] if incident else None
+
+    def has_incident(self, incident_id):
+        """True for an open incident or a known SOS, which is reopened."""
+        with self.lock:
+            if incident_id in self.incidents:
+                return True
+            if incident_id not in self.known:
+                return False
+            self._open(incident_id, self.known[incident_id], None, time.time())
+            return True
+
+    def last_location(self, incident_id):
+        with self.lock:
+            incident = self.incidents.get(incident_id)
+            return incident["last_location"] if incident else None
+
+    def subscribe(self, incident_id):
+        subscriber = Subscriber()
+        with self.lock:
+            self.subscribers.setdefault(incident_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, incident_id, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(incident_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[incident_id]
+
+    def watcher_count(self, incident_id):
+        with self.lock:
+            return len(self.subscribers.get(incident_id, ()))
+
+    def publish(self, incident_id, message, sender=None):
+        """Queues `message` for all subscribers of the incident except the one whose token is `sender`."""
+        encoded = encode_message(message)
+        with self.lock:
+            incident = self.incidents.get(incident_id)
+            if incident:
+                incident["active"] = time.time()
+                if message.get("t") == "loc":
+                    incident["last_location"] = message
+            subscribers = list(self.subscribers.get(incident_id, ()))
+        for subscriber in subscribers:
+            if subscriber.token == sender:
+                continue
+            try:
+                subscriber.put_nowait(encoded)
+            except queue.Full:
+                pass
+        return len(subscribers)
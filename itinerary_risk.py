@@ -0,0 +1,235 @@
+"""Per-day risk profiles for the trips in itineraries.json.
+
+Each stop is geocoded once into itinerary_stops.json (`python
+itinerary_risk.py geocode` fills in stops added since). At startup every
+stop is checked against the geofence and joined against the risk zones;
+after that sync() only re-checks the zones changed since the zone store
+version it last saw, in every worker as each one learns of the change.
+
+A stop's risk is the larger of the intensity of the zones it lies in and
+1 - score / 5 from the safety engine's incident density for its cell. A
+day is as risky as its riskiest stop and a trip as its riskiest day.
+Stop results are cached with the zone and safety-engine cell versions
+they were computed from, so a new incident only recomputes the stops near
+it; a city's response body and ETag are rebuilt only when one of its
+stops' results changes, and at most every CACHE_TTL seconds as incident
+weights decay.
+
+Usage:
+    python itinerary_risk.py geocode [--refresh]
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+
+from risk_zones import point_in_ring, polygons_of, zone_contains
+from safety import CACHE_TTL, cell_for
+
+LEVELS = [(0.5, "high"), (0.2, "moderate")]
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+
+
+def level_for(risk):
+    if risk is None:
+        return "unknown"
+    for threshold, level in LEVELS:
+        if risk >= threshold:
+            return level
+    return "low"
+
+
+def read_json(path, default):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def geofence_contains(polygons, lat, lon):
+    return any(point_in_ring(lat, lon, polygon[0]) and
+               not any(point_in_ring(lat, lon, hole) for hole in polygon[1:])
+               for polygon in polygons)
+
+
+class ItineraryRiskProfiles:
+    def __init__(self, safety_engine, itineraries_path, stops_path, geofence_path):
+        self.safety_engine = safety_engine
+        self.itineraries_path = itineraries_path
+        self.stops_path = stops_path
+        self.geofence_path = geofence_path
+        self.lock = threading.Lock()
+        self.cities = {}
+        self.zones_version = None
+
+    def load(self, zone_store):
+        """Reads and geocodes the itineraries, then joins every stop against the store's zones."""
+        geocoded = read_json(self.stops_path, {})
+        geofence = [polygon for feature in read_json(self.geofence_path, {}).get("features", [])
+                    for polygon in polygons_of(feature["geometry"])]
+        cities = {}
+        for itinerary in read_json(self.itineraries_path, []):
+            places = geocoded.get(itinerary["city"], {})
+            stops = []
+            for item in itinerary["itinerary"]:
+                # A stop that could not be geocoded falls back to its city centre.
+                point = places.get("stops", {}).get(item["activity"]) or places.get("center")
+                stop = {"day": item["day"], "activity": item["activity"], "point": point,
+                        "zones": {}, "zone_version": 0, "result": None}
+                if point:
+                    stop["cell"] = cell_for(*point)
+                    stop["in_geofence"] = geofence_contains(geofence, *point)
+                stops.append(stop)
+            cities[itinerary["city"].lower()] = {"city": itinerary["city"], "state": itinerary.get("state"),
+                                                 "stops": stops, "entry": None}
+        with self.lock:
+            self.cities = cities
+            self.zones_version, zones = zone_store.list()
+            for zone in zones:
+                self._join_zone(zone["id"], zone)
+
+    def _join_zone(self, zone_id, zone):
+        for city in self.cities.values():
+            for stop in city["stops"]:
+                inside = zone is not None and stop["point"] is not None and zone_contains(zone, *stop["point"])
+                if inside:
+                    stop["zones"][zone_id] = {"id": zone_id, "name": zone.get("name", ""),
+                                              "intensity": zone["intensity"]}
+                elif stop["zones"].pop(zone_id, None) is None:
+                    continue
+                stop["zone_version"] += 1
+
+    def sync(self, zone_store):
+        """Re-joins the zones saved or deleted since the zone store version last seen."""
+        with self.lock:
+            if self.zones_version == zone_store.version:
+                return
+            version, changed = zone_store.changes_since(self.zones_version)
+            if changed is None:
+                # Too far behind for the change log: join every zone again.
+                version, zones = zone_store.list()
+                changed = {zone["id"]: zone for zone in zones}
+                for city in self.cities.values():
+                    for stop in city["stops"]:
+                        changed.update((zone_id, None) for zone_id in stop["zones"] if zone_id not in changed)
+            for zone_id, zone in changed.items():
+                self._join_zone(zone_id, zone)
+            self.zones_version = version
+
+    # --- Profiles ---
+
+    def _stop_result(self, stop, now):
+        """The cached risk of a stop, recomputed if its zones or nearby incidents changed or it aged out."""
+        if stop["point"] is None:
+            return {"activity": stop["activity"], "risk": None, "level": "unknown"}
+        key = (stop["zone_version"], self.safety_engine.version(stop["cell"]))
+        cached = stop["result"]
+        if cached and cached["key"] == key and now - cached["computed"] < CACHE_TTL:
+            return cached["value"]
+
+        safety = self.safety_engine.score(*stop["point"], now=now)
+        zones = sorted(stop["zones"].values(), key=lambda z: -z["intensity"])
+        risk = round(max([1 - safety["score"] / 5] + [z["intensity"] for z in zones]), 2)
+        value = {
+            "activity": stop["activity"],
+            "lat": round(stop["point"][0], 4),
+            "lon": round(stop["point"][1], 4),
+            "risk": risk,
+            "level": level_for(risk),
+            "safety_score": safety["score"],
+            "incident_density": safety["incident_density"],
+            "zones": zones,
+            "in_geofence": stop["in_geofence"],
+        }
+        stop["result"] = {"key": key, "computed": now, "value": value}
+        return value
+
+    def profile(self, city_name, now=None):
+        """Returns the (body, etag) of a city's risk profile, or None for an unknown city."""
+        now = now or time.time()
+        with self.lock:
+            city = self.cities.get(city_name.lower())
+            if city is None:
+                return None
+            results = [self._stop_result(stop, now) for stop in city["stops"]]
+            entry = city["entry"]
+            if entry is not None and len(results) == len(entry["results"]) and \
+                    all(a is b for a, b in zip(results, entry["results"])):
+                return entry["body"], entry["etag"]
+
+            days = {}
+            for stop, result in zip(city["stops"], results):
+                days.setdefault(stop["day"], []).append(result)
+            day_profiles = []
+            for day, stops in sorted(days.items()):
+                risks = [s["risk"] for s in stops if s["risk"] is not None]
+                risk = max(risks) if risks else None
+                day_profiles.append({"day": day, "risk": risk, "level": level_for(risk), "stops": stops})
+            known = [d for d in day_profiles if d["risk"] is not None]
+            riskiest = max(known, key=lambda d: d["risk"]) if known else None
+            body = json.dumps({
+                "status": "success",
+                "city": city["city"],
+                "state": city["state"],
+                "risk": riskiest["risk"] if riskiest else None,
+                "level": level_for(riskiest["risk"]) if riskiest else "unknown",
+                "riskiest_day": riskiest["day"] if riskiest else None,
+                "days": day_profiles,
+            }, separators=(',', ':')).encode("utf-8")
+            etag = "ir-" + hashlib.sha1(body).hexdigest()[:16]
+            city["entry"] = {"results": results, "body": body, "etag": etag}
+            return body, etag
+
+
+# --- Geocoding ---
+
+def geocode(query):
+    import requests
+    response = requests.get(NOMINATIM_URL, params={"q": query, "format": "json", "limit": 1},
+                            headers={"User-Agent": "KivySafetyApp/1.0"}, timeout=15)
+    response.raise_for_status()
+    results = response.json()
+    return [round(float(results[0]["lat"]), 4), round(float(results[0]["lon"]), 4)] if results else None
+
+
+def geocode_stops(itineraries_path, stops_path, refresh=False):
+    """Looks up every stop (and city centre) not yet in stops_path; returns how many were added."""
+    geocoded = {} if refresh else read_json(stops_path, {})
+    added = 0
+    for itinerary in read_json(itineraries_path, []):
+        city, state = itinerary["city"], itinerary.get("state", "")
+        places = geocoded.setdefault(city, {"center": None, "stops": {}})
+        queries = [(None, f"{city}, {state}, India")] + \
+            [(item["activity"], f"{item['activity']}, {city}, {state}, India") for item in itinerary["itinerary"]]
+        for activity, query in queries:
+            if (places["center"] if activity is None else places["stops"].get(activity)):
+                continue
+            try:
+                point = geocode(query)
+            except Exception as e:
+                print(f"[ITINERARY] Could not geocode {query!r}: {e}")
+                point = None
+            # Nominatim's usage policy allows one request per second.
+            time.sleep(1)
+            if point is None:
+                continue
+            if activity is None:
+                places["center"] = point
+            else:
+                places["stops"][activity] = point
+            added += 1
+    with open(stops_path, "w") as f:
+        json.dump(geocoded, f, indent=4)
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Geocode the itinerary stops")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    geocode_parser = subparsers.add_parser("geocode", help="look up stops missing from itinerary_stops.json")
+    geocode_parser.add_argument("--refresh", action="store_true", help="look up every stop again")
+    args = parser.parse_args()
+    added = geocode_stops("itineraries.json", "itinerary_stops.json", args.refresh)
+    print(f"Geocoded {added} places.")
@@ -0,0 +1,66 @@
+import json
+import os
+
+import requests
+
+CACHE_FILE = "itinerary_risk_cache.json"
+
+
+def load_cache(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, CACHE_FILE), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_cache(cache_dir, cache):
+    path = os.path.join(cache_dir, CACHE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(cache, f)
+    os.replace(path + ".tmp", path)
+
+
+def fetch_risk(base_url, cache_dir, city):
+    """Returns the server's risk profile for a city's itinerary, or the last cached one offline.
+
+    Profiles are cached per city with their ETag; None if neither is available.
+    """
+    cache = load_cache(cache_dir)
+    cached = cache.get(city) or {}
+    headers = {"If-None-Match": cached["etag"]} if cached.get("etag") else {}
+    try:
+        response = requests.get(f"{base_url}/itineraries/{city}/risk", headers=headers, timeout=10)
+        if response.status_code == 304:
+            return cached.get("profile")
+        response.raise_for_status()
+        profile = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"[ITINERARY] Risk profile unavailable, using cached profile: {e}")
+        return cached.get("profile")
+
+    cache[city] = {"etag": response.headers.get("ETag"), "profile": profile}
+    save_cache(cache_dir, cache)
+    return profile
+
+
+def day_lines(itinerary, profile):
+    """'Day N: activity' lines for an itinerary, with each day's risk level when known."""
+    levels = {day["day"]: day["level"] for day in (profile or {}).get("days", [])}
+    lines = []
+    for item in itinerary["itinerary"]:
+        line = f"Day {item['day']}: {item['activity']}"
+        level = levels.get(item["day"])
+        if level and level != "unknown":
+            line += f" ({level.capitalize()} risk)"
+        lines.append(line)
+    return lines
+
+
+def trip_summary(profile):
+    if not profile or profile.get("level", "unknown") == "unknown":
+        return None
+    summary = f"Trip risk: {profile['level'].capitalize()}"
+    if profile["level"] != "low":
+        summary += f" (riskiest: Day {profile['riskiest_day']})"
+    return summary
@@ -0,0 +1,453 @@
+"""Append-only, tamper-evident ledger of SOS and report events.
+
+append() encodes a snapshot of the record and queues it, so later changes
+to the record never reach the ledger and a record JSON cannot encode fails
+the caller instead of the sealing thread. A background thread seals the
+queue every BATCH_INTERVAL seconds (or once BATCH_SIZE events are waiting)
+into a batch:
+
+  leaf   = sha256(0x00 || canonical JSON of the event)
+  node   = sha256(0x01 || left || right), an odd node is carried up as is
+  header = {batch, root, prev, count, sealed_at}, where prev is the hash of
+           the previous header, so batches form a chain
+  signature over sha256(canonical header): Ed25519 when the cryptography
+           package is installed, otherwise HMAC-SHA256 with a local secret
+
+Events go to ledger/events.jsonl and signed headers to ledger/batches.jsonl.
+A batch's events are written before its header, and events are only indexed
+once their header is read; the next seal truncates a torn last line, or the
+events of a seal that crashed before writing its header, before appending.
+An inclusion proof lets anyone holding the public key check that an event
+is in a signed root without the rest of the ledger. Events still queued
+when the process dies (at most one batch interval) are lost; the records
+themselves are in alert.json and reports.json.
+
+Each batch header records the algorithm it was signed with and is checked
+with that one, so a ledger outlives a change of signer. Record ids are
+indexed for the newest MAX_INDEXED_EVENTS events; proofs for older events
+are found by scanning the part of events.jsonl that fell out of the index.
+
+Usage:
+    python ledger.py verify         # check every batch, root and signature
+    python ledger.py bench [--events 200000]
+"""
+import argparse
+import base64
+import fcntl
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+except ImportError:
+    Ed25519PrivateKey = None
+
+LEDGER_DIR = "ledger"
+EVENTS_FILE = "events.jsonl"
+BATCHES_FILE = "batches.jsonl"
+BATCH_INTERVAL = 0.1
+BATCH_SIZE = 1000
+MAX_INDEXED_EVENTS = 1000000
+GENESIS = "0" * 64
+
+logger = logging.getLogger(__name__)
+
+
+def canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=True).encode("ascii")
+
+
+def leaf_hash(event):
+    return hashlib.sha256(b"\x00" + canonical(event)).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def header_hash(header):
+    return hashlib.sha256(canonical(header)).hexdigest()
+
+
+def merkle_levels(leaves):
+    """Returns every level of the tree, leaves first and the root level last."""
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def inclusion_proof(levels, index):
+    """Sibling hashes from the leaf at `index` up to the root."""
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({"side": "left" if sibling < index else "right", "hash": level[sibling].hex()})
+        index //= 2
+    return proof
+
+
+def verify_inclusion(event, proof, root):
+    digest = leaf_hash(event)
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        digest = node_hash(sibling, digest) if step["side"] == "left" else node_hash(digest, sibling)
+    return digest.hex() == root
+
+
+class Signer:
+    """Signs batch headers with an Ed25519 key (or HMAC secret) kept in the ledger directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        if Ed25519PrivateKey is not None:
+            self.algorithm = "ed25519"
+            path = os.path.join(directory, "signing_key")
+            self.private_key = Ed25519PrivateKey.from_private_bytes(
+                self._load_or_create(path, lambda: Ed25519PrivateKey.generate().private_bytes(
+                    serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption())))
+            self.public_key = self.private_key.public_key().public_bytes(
+                serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        else:
+            self.algorithm = "hmac-sha256"
+            env_key = os.environ.get("LEDGER_HMAC_KEY")
+            self.secret = env_key.encode() if env_key else \
+                self._load_or_create(os.path.join(directory, "hmac_key"), lambda: os.urandom(32))
+            self.public_key = None
+
+    @staticmethod
+    def _load_or_create(path, generate):
+        try:
+            with open(path, "rb") as f:
+                return base64.b64decode(f.read())
+        except FileNotFoundError:
+            key = generate()
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(base64.b64encode(key))
+            return key
+
+    def sign(self, message):
+        if self.algorithm == "ed25519":
+            return base64.b64encode(self.private_key.sign(message)).decode()
+        return base64.b64encode(hmac.new(self.secret, message, hashlib.sha256).digest()).decode()
+
+    def verify(self, message, signature, algorithm):
+        """Checks a signature made with `algorithm`.
+
+        Raises ValueError for an algorithm this process has no key or library for.
+        """
+        signature = base64.b64decode(signature)
+        if algorithm == "ed25519":
+            if self.algorithm != "ed25519":
+                raise ValueError("ed25519 signatures need the cryptography package")
+            try:
+                Ed25519PublicKey.from_public_bytes(self.public_key).verify(signature, message)
+                return True
+            except Exception:
+                return False
+        if algorithm == "hmac-sha256":
+            secret = self._hmac_secret()
+            return hmac.compare_digest(signature, hmac.new(secret, message, hashlib.sha256).digest())
+        raise ValueError(f"unknown signature algorithm {algorithm!r}")
+
+    def _hmac_secret(self):
+        if self.algorithm == "hmac-sha256":
+            return self.secret
+        env_key = os.environ.get("LEDGER_HMAC_KEY")
+        if env_key:
+            return env_key.encode()
+        try:
+            with open(os.path.join(self.directory, "hmac_key"), "rb") as f:
+                return base64.b64decode(f.read())
+        except FileNotFoundError:
+            raise ValueError("no HMAC key to check hmac-sha256 signatures") from None
+
+    def describe(self):
+        return {"algorithm": self.algorithm,
+                "public_key": base64.b64encode(self.public_key).decode() if self.public_key else None}
+
+
+class Ledger:
+    def __init__(self, directory=LEDGER_DIR, batch_interval=BATCH_INTERVAL, batch_size=BATCH_SIZE):
+        self.directory = directory
+        self.batch_interval = batch_interval
+        self.batch_size = batch_size
+        os.makedirs(directory, exist_ok=True)
+        self.events_path = os.path.join(directory, EVENTS_FILE)
+        self.batches_path = os.path.join(directory, BATCHES_FILE)
+        self.lock_path = os.path.join(directory, "seal.lock")
+        self.signer = Signer(directory)
+        self.condition = threading.Condition()
+        self.pending = []
+        # record id -> [(batch, index)], filled from the files so events
+        # sealed by other processes are found too. index_order holds
+        # (batch, record ids) oldest first so whole batches can be evicted;
+        # batches before unindexed_batches are only found by a scan.
+        self.index_lock = threading.Lock()
+        self.record_index = {}
+        self.index_order = deque()
+        self.indexed_events = 0
+        self.unindexed_batches = 0
+        self.batch_offsets = {}
+        self.headers = []
+        self.events_read = 0
+        self.batches_read = 0
+        self.catch_up()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def append(self, kind, record_id, record):
+        """Queues an event (e.g. kind "sos.created") with a snapshot of the record.
+
+        Raises TypeError or ValueError if the record cannot be encoded as JSON.
+        """
+        data = canonical({"kind": kind, "id": record_id, "ts": round(time.time(), 3), "record": record})
+        with self.condition:
+            self.pending.append((record_id, data))
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                if len(self.pending) < self.batch_size:
+                    self.condition.wait(self.batch_interval)
+                batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+            if batch:
+                try:
+                    self.seal(batch)
+                except Exception as e:
+                    logger.error("Could not seal batch of %d events: %s", len(batch), e)
+                    with self.condition:
+                        self.pending[:0] = batch
+
+    def seal(self, events):
+        """Seals queued (record id, encoded event) pairs as the next batch."""
+        encoded = [data for _, data in events]
+        levels = merkle_levels([hashlib.sha256(b"\x00" + data).digest() for data in encoded])
+        with open(self.lock_path, "w") as lock_file:
+            # Other server processes append to the same files.
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.catch_up()
+            # Under the lock catch_up() has read every complete, sealed line;
+            # anything after that is a torn line or events whose header was
+            # never written, and the batch number they used is reused below.
+            self._truncate(self.events_path, self.events_read)
+            self._truncate(self.batches_path, self.batches_read)
+            with self.index_lock:
+                previous = self.headers[-1] if self.headers else None
+            header = {
+                "batch": previous["header"]["batch"] + 1 if previous else 0,
+                "root": levels[-1][0].hex(),
+                "prev": header_hash(previous["header"]) if previous else GENESIS,
+                "count": len(events),
+                "sealed_at": round(time.time(), 3),
+            }
+            signed = {"header": header, "alg": self.signer.algorithm,
+                      "signature": self.signer.sign(bytes.fromhex(header_hash(header)))}
+            batch = header["batch"]
+            # Same bytes as canonical({"batch", "event", "index"}), without re-encoding the events.
+            lines = [b'{"batch":%d,"event":%s,"index":%d}\n' % (batch, data, i) for i, data in enumerate(encoded)]
+            header_line = canonical(signed) + b"\n"
+            with open(self.events_path, "ab") as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.batches_path, "ab") as f:
+                f.write(header_line)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # Index our own batch directly; catch_up() above read everyone else's.
+            with self.index_lock:
+                self.batch_offsets[batch] = self.events_read
+                for i, (record_id, _) in enumerate(events):
+                    self._index(record_id, batch, i)
+                self._evict()
+                self.events_read += sum(len(line) for line in lines)
+                self.headers.append(signed)
+                self.batches_read += len(header_line)
+        return header
+
+    @staticmethod
+    def _truncate(path, size):
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            logger.warning("Dropping %d unsealed bytes from %s", os.path.getsize(path) - size, path)
+            with open(path, "r+b") as f:
+                f.truncate(size)
+                os.fsync(f.fileno())
+
+    def catch_up(self):
+        """Indexes batches and events appended since the last call, by any process.
+
+        Events are only indexed once their batch header has been read.
+        """
+        with self.index_lock:
+            if os.path.exists(self.batches_path):
+                with open(self.batches_path, "rb") as f:
+                    f.seek(self.batches_read)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        self.headers.append(json.loads(line))
+                        self.batches_read += len(line)
+            if os.path.exists(self.events_path):
+                with open(self.events_path, "rb") as f:
+                    f.seek(self.events_read)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        entry = json.loads(line)
+                        if entry["batch"] >= len(self.headers):
+                            break
+                        if entry["index"] == 0:
+                            self.batch_offsets[entry["batch"]] = self.events_read
+                        self._index(entry["event"]["id"], entry["batch"], entry["index"])
+                        self.events_read += len(line)
+            self._evict()
+
+    def _index(self, record_id, batch, index):
+        if not self.index_order or self.index_order[-1][0] != batch:
+            self.index_order.append((batch, []))
+        self.index_order[-1][1].append(record_id)
+        self.record_index.setdefault(record_id, []).append((batch, index))
+        self.indexed_events += 1
+
+    def _evict(self):
+        """Drops the oldest batches from the index until it is back under MAX_INDEXED_EVENTS."""
+        while self.indexed_events > MAX_INDEXED_EVENTS and len(self.index_order) > 1:
+            batch, record_ids = self.index_order.popleft()
+            for record_id in record_ids:
+                # A record's oldest location is always from the oldest indexed batch.
+                locations = self.record_index[record_id]
+                locations.pop(0)
+                if not locations:
+                    del self.record_index[record_id]
+            self.indexed_events -= len(record_ids)
+            self.unindexed_batches = batch + 1
+
+    def _scan(self, record_id, end_batch):
+        """(batch, index) of the events for `record_id` in batches before `end_batch`, read from the file."""
+        needle = b'"id":' + canonical(record_id)
+        locations = []
+        with open(self.events_path, "rb") as f:
+            end = self.batch_offsets[end_batch]
+            while f.tell() < end:
+                line = f.readline()
+                if needle in line:
+                    entry = json.loads(line)
+                    if entry["event"]["id"] == record_id:
+                        locations.append((entry["batch"], entry["index"]))
+        return locations
+
+    def batch_events(self, batch):
+        with open(self.events_path, "rb") as f:
+            f.seek(self.batch_offsets[batch])
+            count = self.headers[batch]["header"]["count"]
+            return [json.loads(f.readline())["event"] for _ in range(count)]
+
+    def proofs(self, record_id):
+        """Every sealed event for a record with its signed batch header and inclusion proof."""
+        self.catch_up()
+        with self.index_lock:
+            locations = list(self.record_index.get(record_id, ()))
+            unindexed = self.unindexed_batches
+        if unindexed:
+            locations = self._scan(record_id, unindexed) + locations
+        results = []
+        for batch, index in locations:
+            events = self.batch_events(batch)
+            levels = merkle_levels([leaf_hash(event) for event in events])
+            results.append({
+                "event": events[index],
+                "leaf": levels[0][index].hex(),
+                "proof": inclusion_proof(levels, index),
+                "batch": self.headers[batch],
+            })
+        return results
+
+    def batches(self, after=-1, limit=100):
+        self.catch_up()
+        with self.index_lock:
+            return self.headers[after + 1:after + 1 + limit]
+
+    def verify(self):
+        """Recomputes every root and checks the header chain and signatures; returns problems found."""
+        self.catch_up()
+        problems = []
+        previous = GENESIS
+        for signed in self.headers:
+            header = signed["header"]
+            digest = header_hash(header)
+            if header["prev"] != previous:
+                problems.append(f"batch {header['batch']}: chain broken")
+            try:
+                if not self.signer.verify(bytes.fromhex(digest), signed["signature"], signed.get("alg")):
+                    problems.append(f"batch {header['batch']}: bad signature")
+            except ValueError as e:
+                problems.append(f"batch {header['batch']}: signature not checked: {e}")
+            events = self.batch_events(header["batch"])
+            if merkle_levels([leaf_hash(event) for event in events])[-1][0].hex() != header["root"]:
+                problems.append(f"batch {header['batch']}: root does not match its events")
+            previous = digest
+        return problems
+
+
+def bench(events):
+    import tempfile
+    record = {"id": "x", "blockchainId": "b" * 64, "phoneNumber": "9800000000",
+              "location": {"latitude": 26.1, "longitude": 91.7}, "timestamp": "2025-09-08T19:31:01"}
+
+    start = time.perf_counter()
+    plain = []
+    for i in range(events):
+        plain.append(("sos.created", str(i), record))
+    baseline = time.perf_counter() - start
+
+    ledger = Ledger(tempfile.mkdtemp(prefix="ledger_bench_"))
+    start = time.perf_counter()
+    for i in range(events):
+        ledger.append("sos.created", str(i), record)
+    ingest = time.perf_counter() - start
+    while ledger.pending or sum(h["header"]["count"] for h in ledger.batches(limit=events)) < events:
+        time.sleep(0.05)
+    sealed = time.perf_counter() - start
+    batches = ledger.batches(limit=events)
+
+    print(f"{events} events: append {ingest / events * 1e6:.2f} us/event "
+          f"(plain list append {baseline / events * 1e6:.2f} us), all sealed after {sealed:.2f} s "
+          f"in {len(batches)} batches, signed with {ledger.signer.algorithm}")
+    start = time.perf_counter()
+    proofs = ledger.proofs(str(events // 2))
+    assert verify_inclusion(proofs[0]["event"], proofs[0]["proof"], proofs[0]["batch"]["header"]["root"])
+    print(f"inclusion proof ({len(proofs[0]['proof'])} hashes) in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit or benchmark the event ledger")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("verify", help="check every batch, root and signature")
+    bench_parser = subparsers.add_parser("bench", help="time ingest and sealing")
+    bench_parser.add_argument("--events", type=int, default=200000)
+    args = parser.parse_args()
+
+    if args.command == "verify":
+        ledger = Ledger()
+        problems = ledger.verify()
+        for problem in problems:
+            print(problem)
+        print(f"{len(ledger.headers)} batches checked, {len(problems)} problems.")
+    else:
+        bench(args.events)
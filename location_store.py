@@ -0,0 +1,175 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from safety import valid_point
+
+# Points newer than this are kept at full resolution.
+RAW_RETENTION = 6 * 60 * 60
+# Older points are downsampled to one point (the last one seen) per bucket.
+COARSE_BUCKET = 5 * 60
+# Nothing older than this is kept at all.
+MAX_RETENTION = 7 * 24 * 60 * 60
+# Hard per-user cap on full-resolution points; beyond it the oldest raw points
+# are downsampled early.
+MAX_RAW_POINTS = 4096
+# Least recently updated tourists are evicted beyond this many, or once all
+# tracks together hold more than MAX_STORED_POINTS points (24 bytes each, so
+# about 200 MB per worker instead of users x MAX_RAW_POINTS).
+MAX_TRACKED_USERS = 50000
+MAX_STORED_POINTS = 8000000
+EXPIRE_INTERVAL = 10 * 60
+
+
+class Segment:
+    """Parallel (lat, lon, ts) arrays kept sorted by timestamp."""
+
+    __slots__ = ('lat', 'lon', 'ts')
+
+    def __init__(self):
+        self.lat = array('d')
+        self.lon = array('d')
+        self.ts = array('d')
+
+    def __len__(self):
+        return len(self.ts)
+
+    def append(self, lat, lon, ts):
+        if not self.ts or ts >= self.ts[-1]:
+            self.lat.append(lat)
+            self.lon.append(lon)
+            self.ts.append(ts)
+        else:
+            # Late point from a client catching up after being offline.
+            i = bisect_right(self.ts, ts)
+            self.lat.insert(i, lat)
+            self.lon.insert(i, lon)
+            self.ts.insert(i, ts)
+
+    def drop_before(self, cutoff):
+        """Removes points older than `cutoff` and returns them as a Segment."""
+        i = bisect_left(self.ts, cutoff)
+        dropped = Segment()
+        if i:
+            dropped.lat, self.lat = self.lat[:i], self.lat[i:]
+            dropped.lon, self.lon = self.lon[:i], self.lon[i:]
+            dropped.ts, self.ts = self.ts[:i], self.ts[i:]
+        return dropped
+
+    def window(self, start, end):
+        i = bisect_left(self.ts, start)
+        j = bisect_right(self.ts, end)
+        return [[self.lat[k], self.lon[k], self.ts[k]] for k in range(i, j)]
+
+
+def accepted_points(points, now):
+    """The (lat, lon, ts) points worth storing: valid coordinates, within retention, not from the future."""
+    oldest_allowed = now - MAX_RETENTION
+    return [(lat, lon, ts) for lat, lon, ts in points
+            if valid_point(lat, lon) and oldest_allowed <= ts <= now + 60]
+
+
+class Track:
+    __slots__ = ('raw', 'coarse')
+
+    def __init__(self):
+        self.raw = Segment()
+        self.coarse = Segment()
+
+    def __len__(self):
+        return len(self.raw) + len(self.coarse)
+
+    def last(self):
+        segment = self.raw if len(self.raw) else self.coarse
+        if not len(segment):
+            return None
+        return {"lat": segment.lat[-1], "lon": segment.lon[-1], "ts": segment.ts[-1]}
+
+    def compact(self, now):
+        cutoff = now - RAW_RETENTION
+        if len(self.raw) > MAX_RAW_POINTS:
+            cutoff = max(cutoff, self.raw.ts[len(self.raw) - MAX_RAW_POINTS])
+        old = self.raw.drop_before(cutoff)
+        for k in range(len(old)):
+            bucket = old.ts[k] // COARSE_BUCKET
+            if len(self.coarse) and self.coarse.ts[-1] // COARSE_BUCKET == bucket:
+                self.coarse.lat[-1] = old.lat[k]
+                self.coarse.lon[-1] = old.lon[k]
+                self.coarse.ts[-1] = old.ts[k]
+            else:
+                self.coarse.append(old.lat[k], old.lon[k], old.ts[k])
+        self.coarse.drop_before(now - MAX_RETENTION)
+
+    def needs_compaction(self, now):
+        return len(self.raw) > MAX_RAW_POINTS or \
+            (len(self.raw) and self.raw.ts[0] < now - RAW_RETENTION - COARSE_BUCKET)
+
+    def trail(self, start, end):
+        return self.coarse.window(start, end) + self.raw.window(start, end)
+
+
+class LocationStore:
+    """In-memory time series of tourist locations keyed by blockchain_id.
+
+    Each worker keeps its own copy; the server feeds every copy through the
+    event bus.
+    """
+
+    def __init__(self, max_users=MAX_TRACKED_USERS, max_points=MAX_STORED_POINTS):
+        self.lock = threading.Lock()
+        self.tracks = OrderedDict()
+        self.max_users = max_users
+        self.max_points = max_points
+        self.points = 0
+        self.last_expire = time.time()
+
+    def add(self, blockchain_id, points, now=None):
+        """Records (lat, lon, ts) tuples for a tourist. Returns how many were kept."""
+        now = now or time.time()
+        points = accepted_points(points, now)
+        with self.lock:
+            track = self.tracks.get(blockchain_id)
+            if track is None:
+                track = self.tracks[blockchain_id] = Track()
+            else:
+                self.tracks.move_to_end(blockchain_id)
+
+            before = len(track)
+            for lat, lon, ts in points:
+                track.raw.append(lat, lon, ts)
+            if track.needs_compaction(now):
+                track.compact(now)
+            self.points += len(track) - before
+
+            while len(self.tracks) > self.max_users or \
+                    (self.points > self.max_points and len(self.tracks) > 1):
+                self.points -= len(self.tracks.popitem(last=False)[1])
+
+        if now - self.last_expire > EXPIRE_INTERVAL:
+            self.expire(now)
+        return len(points)
+
+    def last_position(self, blockchain_id):
+        with self.lock:
+            track = self.tracks.get(blockchain_id)
+            return track.last() if track else None
+
+    def trail(self, blockchain_id, start, end):
+        with self.lock:
+            track = self.tracks.get(blockchain_id)
+            return track.trail(start, end) if track else []
+
+    def expire(self, now=None):
+        """Compacts every track and forgets tourists with no recent data."""
+        now = now or time.time()
+        with self.lock:
+            self.last_expire = now
+            for blockchain_id in list(self.tracks):
+                track = self.tracks[blockchain_id]
+                before = len(track)
+                track.compact(now)
+                self.points += len(track) - before
+                if not len(track):
+                    del self.tracks[blockchain_id]
@@ -0,0 +1,413 @@
+"""Background delivery of emergency-contact notifications.
+
+/sos only enqueues jobs; a pool of worker threads delivers them. The queue
+is a SQLite table (notifications.db), so queued jobs survive restarts and
+several server processes can share it: a worker claims a batch by leasing
+it, and a lease that isn't completed in time (the worker died) expires and
+the jobs are picked up again.
+
+Each channel (sms, email, webhook) has a provider with its own rate limit
+and batch size. Rate limits are token buckets in each process, so with
+several workers a gateway sees up to workers x rate messages per second;
+set SMS_RATE and SMTP_RATE to the gateway's limit divided by the worker
+count. Failed sends are retried with exponential backoff until
+MAX_ATTEMPTS.
+
+NOTIFY_PROVIDER=live (the default) uses the real gateways configured below;
+a channel whose gateway is not configured is reported at startup, and its
+jobs are recorded as failed rather than dropped. NOTIFY_PROVIDER=fake
+records messages locally instead of sending them, for development only.
+
+Emergency contacts come straight from the public /sos body, so a URL
+contact is only ever POSTed to when its host is listed in
+WEBHOOK_ALLOWED_HOSTS (comma-separated); any other URL contact is recorded
+as a failed job and never requested, and redirects are not followed.
+"""
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+QUEUE_FILE = "notifications.db"
+WORKERS = int(os.environ.get("NOTIFY_WORKERS", "4"))
+POLL_INTERVAL = 1
+LEASE_SECONDS = 60
+MAX_ATTEMPTS = 8
+BASE_BACKOFF = 2
+MAX_BACKOFF = 300
+
+logger = logging.getLogger(__name__)
+
+
+def allowed_webhook_hosts():
+    return {host.strip().lower() for host in os.environ.get("WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()}
+
+
+def webhook_allowed(url, allowed_hosts):
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+    except ValueError:
+        return False
+    return parts.scheme in ("http", "https") and host in allowed_hosts
+
+
+class TokenBucket:
+    """Per-process rate limit; see the module docstring for several workers."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count=1):
+        """Blocks until `count` (at most `capacity`) tokens are available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= count:
+                    self.tokens -= count
+                    return
+                wait = (count - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class JobQueue:
+    def __init__(self, path=QUEUE_FILE):
+        self.path = path
+        self.local = threading.local()
+        with self.connection() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                recipient TEXT NOT NULL,
+                body TEXT NOT NULL,
+                ref TEXT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                created REAL NOT NULL,
+                sent_at REAL,
+                last_error TEXT
+            )""")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (channel, status, next_attempt)")
+
+    def connection(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            # WAL plus NORMAL sync keeps an enqueue well under a millisecond.
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def enqueue(self, jobs, error=None):
+        """Adds (channel, recipient, body, ref) tuples; returns how many were queued.
+
+        With an `error` the jobs are recorded as failed instead, so they show
+        up in jobs_for() and counts() rather than vanishing.
+        """
+        now = time.time()
+        status = "queued" if error is None else "failed"
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT INTO jobs (channel, recipient, body, ref, status, next_attempt, created, last_error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(channel, recipient, body, ref, status, now, now, error)
+                 for channel, recipient, body, ref in jobs])
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return len(jobs)
+
+    def claim(self, channel, limit):
+        """Leases up to `limit` due jobs of `channel`, including ones whose lease expired."""
+        now = time.time()
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute(
+                "SELECT * FROM jobs WHERE channel = ? AND status IN ('queued', 'sending') "
+                "AND next_attempt <= ? ORDER BY next_attempt LIMIT ?", (channel, now, limit)).fetchall()
+            db.executemany("UPDATE jobs SET status = 'sending', next_attempt = ? WHERE id = ?",
+                           [(now + LEASE_SECONDS, row["id"]) for row in rows])
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return [dict(row) for row in rows]
+
+    def mark_sent(self, job_id):
+        self.connection().execute(
+            "UPDATE jobs SET status = 'sent', sent_at = ?, attempts = attempts + 1, last_error = NULL WHERE id = ?",
+            (time.time(), job_id))
+
+    def mark_failed(self, job, error):
+        attempts = job["attempts"] + 1
+        if attempts >= MAX_ATTEMPTS:
+            status, next_attempt = "failed", job["next_attempt"]
+        else:
+            delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (attempts - 1))
+            status, next_attempt = "queued", time.time() + delay * random.uniform(0.5, 1)
+        self.connection().execute(
+            "UPDATE jobs SET status = ?, attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+            (status, attempts, next_attempt, str(error)[:500], job["id"]))
+        return status
+
+    def counts(self):
+        rows = self.connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def jobs_for(self, ref):
+        rows = self.connection().execute(
+            "SELECT id, channel, recipient, status, attempts, sent_at, last_error FROM jobs WHERE ref = ? ORDER BY id",
+            (ref,)).fetchall()
+        return [dict(row) for row in rows]
+
+
+# --- Providers ---
+# send_batch(jobs) returns {job_id: error or None}; raising fails the whole batch.
+
+class FakeProvider:
+    """Records messages instead of sending them, optionally failing some to exercise retries."""
+
+    def __init__(self, rate=50, batch_size=20, fail_rate=0.0, latency=0.0, outbox_path=None):
+        self.rate = rate
+        self.batch_size = batch_size
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.outbox_path = outbox_path
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send_batch(self, jobs):
+        time.sleep(self.latency)
+        results = {}
+        delivered = []
+        for job in jobs:
+            if random.random() < self.fail_rate:
+                results[job["id"]] = "simulated gateway failure"
+            else:
+                results[job["id"]] = None
+                delivered.append({"channel": job["channel"], "to": job["recipient"],
+                                  "body": job["body"], "at": time.time()})
+        with self.lock:
+            self.sent.extend(delivered)
+            if self.outbox_path and delivered:
+                with open(self.outbox_path, "a") as f:
+                    f.writelines(json.dumps(message) + "\n" for message in delivered)
+        return results
+
+
+class HttpSmsProvider:
+    """Posts batches to an SMS gateway that accepts {"messages": [{"to", "body"}]}."""
+
+    def __init__(self, url, token, rate=10, batch_size=50):
+        self.url = url
+        self.token = token
+        self.rate = rate
+        self.batch_size = batch_size
+
+    def send_batch(self, jobs):
+        import requests
+        response = requests.post(self.url, timeout=10, headers={"Authorization": f"Bearer {self.token}"},
+                                 json={"messages": [{"to": job["recipient"], "body": job["body"]} for job in jobs]})
+        response.raise_for_status()
+        return {job["id"]: None for job in jobs}
+
+
+class SmtpEmailProvider:
+    def __init__(self, host, port, sender, username=None, password=None, rate=5, batch_size=20):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.rate = rate
+        self.batch_size = batch_size
+
+    def send_batch(self, jobs):
+        import smtplib
+        from email.message import EmailMessage
+        results = {}
+        # One connection per batch.
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for job in jobs:
+                message = EmailMessage()
+                message["From"] = self.sender
+                message["To"] = job["recipient"]
+                message["Subject"] = "Emergency alert"
+                message.set_content(job["body"])
+                try:
+                    smtp.send_message(message)
+                    results[job["id"]] = None
+                except smtplib.SMTPException as e:
+                    results[job["id"]] = str(e)
+        return results
+
+
+class WebhookProvider:
+    def __init__(self, allowed_hosts, rate=20, batch_size=10):
+        self.allowed_hosts = allowed_hosts
+        self.rate = rate
+        self.batch_size = batch_size
+
+    def send_batch(self, jobs):
+        import requests
+        results = {}
+        with requests.Session() as session:
+            for job in jobs:
+                if not webhook_allowed(job["recipient"], self.allowed_hosts):
+                    results[job["id"]] = "webhook host not allowed"
+                    continue
+                try:
+                    session.post(job["recipient"], json={"text": job["body"], "incident_id": job["ref"]},
+                                 timeout=10, allow_redirects=False).raise_for_status()
+                    results[job["id"]] = None
+                except requests.exceptions.RequestException as e:
+                    results[job["id"]] = str(e)
+        return results
+
+
+CHANNELS = ("sms", "email", "webhook")
+
+
+def create_providers():
+    kind = os.environ.get("NOTIFY_PROVIDER", "live")
+    if kind == "fake":
+        outbox = os.environ.get("NOTIFY_OUTBOX", "notifications_outbox.jsonl")
+        logger.warning("NOTIFY_PROVIDER=fake: notifications are written to %s, not delivered", outbox)
+        return {channel: FakeProvider(outbox_path=outbox) for channel in CHANNELS}
+    if kind != "live":
+        raise ValueError(f"NOTIFY_PROVIDER must be live or fake, not {kind!r}")
+    providers = {}
+    if allowed_webhook_hosts():
+        providers["webhook"] = WebhookProvider(allowed_webhook_hosts())
+    if os.environ.get("SMS_GATEWAY_URL"):
+        providers["sms"] = HttpSmsProvider(os.environ["SMS_GATEWAY_URL"], os.environ.get("SMS_GATEWAY_TOKEN", ""),
+                                           rate=float(os.environ.get("SMS_RATE", "10")))
+    if os.environ.get("SMTP_HOST"):
+        providers["email"] = SmtpEmailProvider(
+            os.environ["SMTP_HOST"], int(os.environ.get("SMTP_PORT", "587")),
+            os.environ.get("SMTP_FROM", "alerts@localhost"),
+            os.environ.get("SMTP_USER"), os.environ.get("SMTP_PASSWORD"),
+            rate=float(os.environ.get("SMTP_RATE", "5")))
+    for channel in CHANNELS:
+        if channel not in providers:
+            logger.error("No %s gateway configured (see notifications.py); %s notifications will fail",
+                         channel, channel)
+    return providers
+
+
+# --- Messages ---
+
+def channel_for(contact):
+    if contact.startswith(("http://", "https://")):
+        return "webhook"
+    if "@" in contact:
+        return "email"
+    return "sms"
+
+def sos_message(alert):
+    location = alert.get("location") or {}
+    text = f"SOS: {alert.get('phoneNumber') or 'A tourist'} has requested emergency help"
+    if location.get("latitude") is not None and location.get("longitude") is not None:
+        lat, lon = location["latitude"], location["longitude"]
+        text += f" at https://maps.google.com/?q={lat},{lon}"
+    return text + f". Incident {alert['id']}."
+
+
+class NotificationDispatcher:
+    def __init__(self, queue=None, providers=None, workers=WORKERS, webhook_hosts=None):
+        self.queue = queue or JobQueue()
+        self.webhook_hosts = webhook_hosts if webhook_hosts is not None else allowed_webhook_hosts()
+        self.providers = providers if providers is not None else create_providers()
+        self.buckets = {channel: TokenBucket(provider.rate, provider.batch_size)
+                        for channel, provider in self.providers.items()}
+        self.workers = workers
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+
+    def enqueue_sos(self, alert):
+        """Queues a message to each of the alert's emergency contacts; returns how many can be delivered.
+
+        Contacts on a channel without a provider, and URLs outside
+        WEBHOOK_ALLOWED_HOSTS, are recorded as failed jobs and never sent.
+        """
+        contacts = [c.strip() for c in re.split(r"[,;]", alert.get("emergencyContact") or "") if c.strip()]
+        body = sos_message(alert)
+        jobs = [(channel_for(c), c, body, alert["id"]) for c in contacts]
+        refused = [job for job in jobs if job[0] == "webhook" and not webhook_allowed(job[1], self.webhook_hosts)]
+        if refused:
+            logger.warning("Refusing %d webhook contacts outside WEBHOOK_ALLOWED_HOSTS for incident %s",
+                           len(refused), alert["id"])
+            self.queue.enqueue(refused, error="webhook host not allowed")
+        jobs = [job for job in jobs if job not in refused]
+        undeliverable = [job for job in jobs if job[0] not in self.providers]
+        for channel in {job[0] for job in undeliverable}:
+            logger.error("No %s provider for incident %s; recording its notifications as failed",
+                         channel, alert["id"])
+            self.queue.enqueue([job for job in undeliverable if job[0] == channel],
+                               error=f"no {channel} provider configured")
+        jobs = [job for job in jobs if job[0] in self.providers]
+        if not jobs:
+            return 0
+        self.queue.enqueue(jobs)
+        self.wakeup.set()
+        return len(jobs)
+
+    def start(self):
+        for _ in range(self.workers):
+            threading.Thread(target=self.run_worker, daemon=True).start()
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+
+    def run_worker(self):
+        while not self.stopping.is_set():
+            try:
+                busy = False
+                for channel in self.providers:
+                    busy = self.deliver_batch(channel) or busy
+            except Exception:
+                logger.exception("Notification worker error")
+                busy = False
+            if not busy and self.wakeup.wait(POLL_INTERVAL):
+                self.wakeup.clear()
+
+    def deliver_batch(self, channel):
+        provider = self.providers[channel]
+        jobs = self.queue.claim(channel, provider.batch_size)
+        if not jobs:
+            return False
+        self.buckets[channel].acquire(len(jobs))
+        try:
+            results = provider.send_batch(jobs)
+        except Exception as e:
+            results = {job["id"]: str(e) or type(e).__name__ for job in jobs}
+        for job in jobs:
+            error = results.get(job["id"], "no result from provider")
+            if error is None:
+                self.queue.mark_sent(job["id"])
+            elif self.queue.mark_failed(job, error) == "failed":
+                logger.error("Giving up on %s notification %s to %s: %s",
+                             channel, job["id"], job["recipient"], error)
+        return True
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+MAX_PHOTO_DIMENSION = 1280
+JPEG_QUALITY = 70
+MAX_RETRIES = 8
+REQUEST_TIMEOUT = 30
+
+
+def prepare_photo(photo_path):
+    """Downscales and recompresses a camera photo before it is uploaded.
+
+    Returns the path of the file to send. Falls back to the original photo
+    if Pillow isn't available or the image can't be processed.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return photo_path
+
+    root, _ = os.path.splitext(photo_path)
+    output_path = f"{root}_upload.jpg"
+    try:
+        with Image.open(photo_path) as image:
+            image = image.convert("RGB")
+            image.thumbnail((MAX_PHOTO_DIMENSION, MAX_PHOTO_DIMENSION))
+            image.save(output_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    except Exception as e:
+        print(f"[UPLOAD] Could not compress photo, sending original: {e}")
+        return photo_path
+
+    if os.path.getsize(output_path) >= os.path.getsize(photo_path):
+        os.remove(output_path)
+        return photo_path
+    return output_path
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _state_path(photo_path):
+    return f"{photo_path}.upload.json"
+
+
+def _load_upload_id(photo_path, sha256):
+    try:
+        with open(_state_path(photo_path), "r") as f:
+            state = json.load(f)
+        if state.get("sha256") == sha256:
+            return state.get("upload_id")
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return None
+
+
+def _save_upload_id(photo_path, sha256, upload_id):
+    with open(_state_path(photo_path), "w") as f:
+        json.dump({"sha256": sha256, "upload_id": upload_id}, f)
+
+
+def _clear_upload_id(photo_path):
+    if os.path.exists(_state_path(photo_path)):
+        os.remove(_state_path(photo_path))
+
+
+def _backoff(attempt):
+    time.sleep(min(2 ** attempt, 30))
+
+
+def upload_report(base_url, photo_path, reason, user_data, location_data):
+    """Uploads an anomaly report photo in resumable chunks.
+
+    The upload id is stored next to the photo so that an interrupted upload
+    continues from the last acknowledged offset, even after an app restart.
+    Returns True once the server has accepted the report.
+    """
+    upload_path = prepare_photo(photo_path)
+    size = os.path.getsize(upload_path)
+    sha256 = _file_sha256(upload_path)
+
+    upload_id = _load_upload_id(upload_path, sha256)
+    offset = None
+    chunk_size = None
+    attempt = 0
+
+    while attempt <= MAX_RETRIES:
+        try:
+            if upload_id:
+                response = requests.get(f"{base_url}/report/upload/{upload_id}", timeout=REQUEST_TIMEOUT)
+                if response.status_code == 404:
+                    upload_id = None
+                    continue
+                response.raise_for_status()
+                offset = response.json()["offset"]
+                chunk_size = response.json()["chunk_size"]
+            else:
+                response = requests.post(
+                    f"{base_url}/report/upload/init",
+                    json={
+                        "filename": os.path.basename(upload_path),
+                        "size": size,
+                        "sha256": sha256,
+                        "reason": reason,
+                        "user": user_data,
+                        "location": location_data
+                    },
+                    timeout=REQUEST_TIMEOUT
+                )
+                if response.status_code != 201:
+                    print(f"[UPLOAD] Server rejected upload: {response.text}")
+                    return False
+                upload_id = response.json()["upload_id"]
+                offset = 0
+                chunk_size = response.json()["chunk_size"]
+                _save_upload_id(upload_path, sha256, upload_id)
+
+            with open(upload_path, "rb") as f:
+                while offset < size:
+                    f.seek(offset)
+                    chunk = f.read(chunk_size)
+                    response = requests.put(
+                        f"{base_url}/report/upload/{upload_id}",
+                        params={"offset": offset},
+                        data=chunk,
+                        headers={
+                            "Content-Type": "application/octet-stream",
+                            "X-Chunk-SHA256": hashlib.sha256(chunk).hexdigest()
+                        },
+                        timeout=REQUEST_TIMEOUT
+                    )
+                    body = response.json()
+                    if response.status_code in (200, 409):
+                        # 409 means the server has a different offset, resume from it.
+                        offset = body["offset"]
+                        attempt = 0
+                    else:
+                        response.raise_for_status()
+
+            response = requests.post(f"{base_url}/report/upload/{upload_id}/complete", timeout=REQUEST_TIMEOUT)
+            if response.status_code == 200:
+                _clear_upload_id(upload_path)
+                if upload_path != photo_path:
+                    os.remove(upload_path)
+                return True
+            if response.status_code == 422:
+                # The assembled file was corrupt and the server dropped it; start over.
+                _clear_upload_id(upload_path)
+                upload_id = None
+            else:
+                response.raise_for_status()
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            print(f"[UPLOAD] Upload interrupted at offset {offset}: {e}")
+        attempt += 1
+        _backoff(attempt)
+
+    print("[UPLOAD] Giving up after repeated failures; the upload can be resumed later.")
+    return False
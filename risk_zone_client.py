@@ -0,0 +1,69 @@
+import json
+import os
+
+import requests
+
+from risk_zones import apply_bundle, decode_bundle
+
+CACHE_FILE = "risk_zones_cache.json"
+
+
+def load_cache(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, CACHE_FILE), "r") as f:
+            cache = json.load(f)
+        return cache["version"], {zone["id"]: zone for zone in cache["zones"]}
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+        return None, {}
+
+
+def save_cache(cache_dir, version, zones_by_id):
+    path = os.path.join(cache_dir, CACHE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"version": version, "zones": list(zones_by_id.values())}, f)
+    os.replace(path + ".tmp", path)
+
+
+def sync_risk_zones(base_url, cache_dir):
+    """Brings the locally cached risk zones up to date and returns them.
+
+    Only the zones that changed since the cached version are downloaded; an
+    unchanged server answers 304. If the server can't be reached, the cached
+    zones are returned as they are.
+    """
+    version, zones_by_id = load_cache(cache_dir)
+    params, headers = {}, {}
+    if version is not None:
+        params["since"] = version
+        headers["If-None-Match"] = f'"rz-{version}"'
+
+    try:
+        response = requests.get(f"{base_url}/risk_zones/bundle", params=params, headers=headers, timeout=15)
+        if response.status_code == 304:
+            return list(zones_by_id.values())
+        response.raise_for_status()
+        bundle = decode_bundle(response.content)
+    except (requests.exceptions.RequestException, ValueError, IndexError) as e:
+        print(f"[RISK ZONES] Sync failed, using cached zones: {e}")
+        return list(zones_by_id.values())
+
+    if bundle["kind"] == "delta" and bundle["from_version"] != version:
+        print("[RISK ZONES] Delta does not match cached version, ignoring it.")
+        return list(zones_by_id.values())
+    apply_bundle(zones_by_id, bundle)
+    save_cache(cache_dir, bundle["version"], zones_by_id)
+    return list(zones_by_id.values())
+
+
+def zones_to_geojson(zones):
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"name": zone["name"], "intensity": zone["intensity"]},
+                "geometry": zone["geometry"]
+            }
+            for zone in zones if zone["geometry"]["type"] != "Point"
+        ]
+    }
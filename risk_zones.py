@@ -0,0 +1,496 @@
+"""Versioned risk zones and their compact binary bundle format.
+
+Every change to a zone bumps the store's version. Clients download a full
+bundle once and afterwards only delta patches with the zones that changed
+since the version they hold.
+
+Bundle layout (all integers are LEB128 varints, signed ones zigzag-encoded):
+
+    full:  b"RZB1" version count zone*
+    delta: b"RZD1" from_version to_version removed_count id* count zone*
+    zone:  id name intensity(byte) bbox geometry
+    bbox:  min_lat min_lon (max_lat - min_lat) (max_lon - min_lon)
+    geometry: type(byte) then
+        point:   radius_m
+        polygon: ring_count, per ring point_count and (lat, lon) deltas
+        multi:   polygon_count, then each polygon as above
+
+Coordinates are quantized to 1e-5 degrees (about a metre) and the points of
+a ring are stored as deltas from the previous point, starting at the bbox
+minimum corner.
+"""
+import json
+import math
+import os
+import re
+import threading
+import uuid
+
+from datastore import atomic_write_json
+
+SCALE = 100000
+FULL_MAGIC = b"RZB1"
+DELTA_MAGIC = b"RZD1"
+GEOMETRY_TYPES = {"Point": 0, "Polygon": 1, "MultiPolygon": 2}
+GEOMETRY_NAMES = {code: name for name, code in GEOMETRY_TYPES.items()}
+DEFAULT_RADIUS_M = 1000
+MAX_RADIUS_M = 500000
+# Deltas can be served for clients up to this many changes behind.
+MAX_CHANGES = 1000
+# Zone ids always contain a digit, "_" or "-", so they never collide with a
+# route under /risk_zones/ such as "bundle".
+ZONE_ID_PATTERN = re.compile(r"(?=.*[0-9_-])[A-Za-z0-9_-]{1,64}")
+# Fields of a website/risk_zones.json entry that the store derives from the zone.
+LEGACY_FIELDS = ("lat", "lng", "intensity")
+# The region the app operates in, drawn on the map and used to flag itinerary stops outside it.
+GEOFENCE_PATH = os.path.join("website", "northeast_india.geojson")
+
+
+class ZoneError(ValueError):
+    pass
+
+
+# --- Encoding ---
+
+def write_varint(buf, value):
+    if value < 0:
+        # The loop below would never terminate on a negative number.
+        raise ValueError(f"varint must not be negative: {value}")
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            buf.append(byte | 0x80)
+        else:
+            buf.append(byte)
+            return
+
+def write_signed(buf, value):
+    write_varint(buf, (value << 1) if value >= 0 else ((-value) << 1) - 1)
+
+def write_string(buf, text):
+    data = text.encode("utf-8")
+    write_varint(buf, len(data))
+    buf.extend(data)
+
+def quantize(value):
+    return int(round(value * SCALE))
+
+def polygons_of(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+def bbox_of(zone):
+    """Returns (min_lon, min_lat, max_lon, max_lat) in degrees."""
+    geometry = zone["geometry"]
+    if geometry["type"] == "Point":
+        lon, lat = geometry["coordinates"][:2]
+        # One degree of latitude is ~111 km; longitude is close enough here.
+        pad = zone.get("radius_m", DEFAULT_RADIUS_M) / 111000
+        return (lon - pad, lat - pad, lon + pad, lat + pad)
+    points = [point for polygon in polygons_of(geometry) for ring in polygon for point in ring]
+    lons = [p[0] for p in points]
+    lats = [p[1] for p in points]
+    return (min(lons), min(lats), max(lons), max(lats))
+
+def encode_zone(buf, zone):
+    write_string(buf, zone["id"])
+    write_string(buf, zone.get("name", ""))
+    buf.append(max(0, min(255, int(round(zone.get("intensity", 1.0) * 255)))))
+
+    min_lon, min_lat, max_lon, max_lat = (quantize(v) for v in zone["bbox"])
+    write_signed(buf, min_lat)
+    write_signed(buf, min_lon)
+    write_varint(buf, max_lat - min_lat)
+    write_varint(buf, max_lon - min_lon)
+
+    geometry = zone["geometry"]
+    buf.append(GEOMETRY_TYPES[geometry["type"]])
+    if geometry["type"] == "Point":
+        write_varint(buf, int(zone.get("radius_m", DEFAULT_RADIUS_M)))
+        return
+
+    polygons = polygons_of(geometry)
+    if geometry["type"] == "MultiPolygon":
+        write_varint(buf, len(polygons))
+    for polygon in polygons:
+        write_varint(buf, len(polygon))
+        for ring in polygon:
+            write_varint(buf, len(ring))
+            prev_lat, prev_lon = min_lat, min_lon
+            for lon, lat in (point[:2] for point in ring):
+                q_lat, q_lon = quantize(lat), quantize(lon)
+                write_signed(buf, q_lat - prev_lat)
+                write_signed(buf, q_lon - prev_lon)
+                prev_lat, prev_lon = q_lat, q_lon
+
+def encode_full(version, zones):
+    buf = bytearray(FULL_MAGIC)
+    write_varint(buf, version)
+    write_varint(buf, len(zones))
+    for zone in zones:
+        encode_zone(buf, zone)
+    return bytes(buf)
+
+def encode_delta(from_version, to_version, changed, removed_ids):
+    buf = bytearray(DELTA_MAGIC)
+    write_varint(buf, from_version)
+    write_varint(buf, to_version)
+    write_varint(buf, len(removed_ids))
+    for zone_id in removed_ids:
+        write_string(buf, zone_id)
+    write_varint(buf, len(changed))
+    for zone in changed:
+        encode_zone(buf, zone)
+    return bytes(buf)
+
+
+# --- Decoding ---
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def byte(self):
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def varint(self):
+        result = shift = 0
+        while True:
+            byte = self.byte()
+            result |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return result
+            shift += 7
+
+    def signed(self):
+        value = self.varint()
+        return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+    def string(self):
+        length = self.varint()
+        text = self.data[self.pos:self.pos + length].decode("utf-8")
+        self.pos += length
+        return text
+
+def decode_polygon(reader, min_lat, min_lon):
+    rings = []
+    for _ in range(reader.varint()):
+        ring = []
+        lat, lon = min_lat, min_lon
+        for _ in range(reader.varint()):
+            lat += reader.signed()
+            lon += reader.signed()
+            ring.append([lon / SCALE, lat / SCALE])
+        rings.append(ring)
+    return rings
+
+def decode_zone(reader):
+    zone = {"id": reader.string(), "name": reader.string(), "intensity": round(reader.byte() / 255, 3)}
+    min_lat = reader.signed()
+    min_lon = reader.signed()
+    max_lat = min_lat + reader.varint()
+    max_lon = min_lon + reader.varint()
+    zone["bbox"] = [min_lon / SCALE, min_lat / SCALE, max_lon / SCALE, max_lat / SCALE]
+
+    geometry_type = GEOMETRY_NAMES[reader.byte()]
+    if geometry_type == "Point":
+        zone["radius_m"] = reader.varint()
+        zone["geometry"] = {"type": "Point", "coordinates": [
+            (min_lon + max_lon) / 2 / SCALE, (min_lat + max_lat) / 2 / SCALE]}
+    elif geometry_type == "Polygon":
+        zone["geometry"] = {"type": "Polygon", "coordinates": decode_polygon(reader, min_lat, min_lon)}
+    else:
+        polygons = [decode_polygon(reader, min_lat, min_lon) for _ in range(reader.varint())]
+        zone["geometry"] = {"type": "MultiPolygon", "coordinates": polygons}
+    return zone
+
+def decode_bundle(data):
+    """Decodes a full bundle or delta patch.
+
+    Returns a dict with `kind` ("full" or "delta"), `version`, `zones` and,
+    for deltas, `from_version` and `removed`.
+    """
+    reader = Reader(data)
+    magic = bytes(data[:4])
+    reader.pos = 4
+    if magic == FULL_MAGIC:
+        version = reader.varint()
+        zones = [decode_zone(reader) for _ in range(reader.varint())]
+        return {"kind": "full", "version": version, "zones": zones}
+    if magic == DELTA_MAGIC:
+        from_version = reader.varint()
+        version = reader.varint()
+        removed = [reader.string() for _ in range(reader.varint())]
+        zones = [decode_zone(reader) for _ in range(reader.varint())]
+        return {"kind": "delta", "from_version": from_version, "version": version,
+                "removed": removed, "zones": zones}
+    raise ZoneError("Not a risk zone bundle")
+
+def apply_bundle(zones_by_id, bundle):
+    """Applies a decoded bundle to a {zone_id: zone} dict in place."""
+    if bundle["kind"] == "full":
+        zones_by_id.clear()
+    for zone_id in bundle.get("removed", []):
+        zones_by_id.pop(zone_id, None)
+    for zone in bundle["zones"]:
+        zones_by_id[zone["id"]] = zone
+    return zones_by_id
+
+
+# --- Geometry helpers ---
+
+def point_in_ring(lat, lon, ring):
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+def zone_contains(zone, lat, lon):
+    min_lon, min_lat, max_lon, max_lat = zone["bbox"]
+    if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+        return False
+    geometry = zone["geometry"]
+    if geometry["type"] == "Point":
+        center_lon, center_lat = geometry["coordinates"][:2]
+        return ((lat - center_lat) ** 2 + (lon - center_lon) ** 2) ** 0.5 * 111000 <= zone["radius_m"]
+    for polygon in polygons_of(geometry):
+        if point_in_ring(lat, lon, polygon[0]) and \
+                not any(point_in_ring(lat, lon, hole) for hole in polygon[1:]):
+            return True
+    return False
+
+
+# --- Server-side store ---
+
+def finite_number(value):
+    """float(value) if it is a finite number, else None."""
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+def normalize_position(position):
+    """Returns a GeoJSON position as [lon, lat] floats; raises ZoneError if it is not one."""
+    if not isinstance(position, (list, tuple)) or len(position) < 2:
+        raise ZoneError("Positions must be [longitude, latitude] pairs")
+    lon, lat = finite_number(position[0]), finite_number(position[1])
+    if lon is None or lat is None or not -180 <= lon <= 180 or not -90 <= lat <= 90:
+        raise ZoneError("Positions need a finite longitude in [-180, 180] and latitude in [-90, 90]")
+    return [lon, lat]
+
+def normalize_geometry(geometry):
+    if not isinstance(geometry, dict) or geometry.get("type") not in GEOMETRY_TYPES:
+        raise ZoneError("geometry must be a GeoJSON Point, Polygon or MultiPolygon")
+    coordinates = geometry.get("coordinates")
+    if geometry["type"] == "Point":
+        return {"type": "Point", "coordinates": normalize_position(coordinates)}
+
+    polygons = [coordinates] if geometry["type"] == "Polygon" else coordinates
+    if not isinstance(polygons, list) or not polygons:
+        raise ZoneError("Invalid geometry coordinates")
+    normalized = []
+    for polygon in polygons:
+        if not isinstance(polygon, list) or not polygon or \
+                not all(isinstance(ring, list) and len(ring) >= 4 for ring in polygon):
+            raise ZoneError("Polygon rings need at least four positions")
+        normalized.append([[normalize_position(position) for position in ring] for ring in polygon])
+    return {"type": geometry["type"],
+            "coordinates": normalized[0] if geometry["type"] == "Polygon" else normalized}
+
+def new_zone_id():
+    return "zone-" + uuid.uuid4().hex[:12]
+
+
+def normalize_zone(data, zone_id=None):
+    """Validates a zone from the API, accepting the legacy {lat, lng, intensity} shape."""
+    if not isinstance(data, dict):
+        raise ZoneError("Zone must be an object")
+    geometry = data.get("geometry")
+    if geometry is None and "lat" in data and "lng" in data:
+        geometry = {"type": "Point", "coordinates": [data["lng"], data["lat"]]}
+    geometry = normalize_geometry(geometry)
+    intensity = finite_number(data.get("intensity", 1.0))
+    if intensity is None or not 0 <= intensity <= 1:
+        raise ZoneError("intensity must be a number between 0 and 1")
+
+    zone = {
+        "id": str(zone_id or data.get("id") or new_zone_id()),
+        "name": str(data.get("name", "")),
+        "intensity": intensity,
+        "geometry": geometry,
+    }
+    if geometry["type"] == "Point":
+        radius_m = finite_number(data.get("radius_m", DEFAULT_RADIUS_M))
+        if radius_m is None or not 1 <= radius_m <= MAX_RADIUS_M:
+            raise ZoneError(f"radius_m must be a number of metres between 1 and {MAX_RADIUS_M}")
+        zone["radius_m"] = int(radius_m)
+    zone["bbox"] = list(bbox_of(zone))
+    return zone
+
+
+class RiskZoneStore:
+    """Persists risk zones with a version number and a log of changed zone ids.
+
+    Every server worker has its own copy; writes take `lock` (the datastore's
+    process lock), reload the file and rewrite it, so no worker overwrites
+    another's change, and the others reload when told of the new version.
+    """
+
+    def __init__(self, path, legacy_path=None, lock=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.lock = threading.Lock()
+        self.file_lock = lock or threading.RLock()
+        self.bundle_cache = {}
+        self.version = None
+        self.load()
+
+    def read_state(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def load(self):
+        """(Re)reads the zones from disk, e.g. after another worker changed them."""
+        state = self.read_state()
+        if state is None:
+            with self.file_lock:
+                # The first worker imports the legacy list and saves it, so
+                # every worker sees the same generated zone ids.
+                state = self.read_state()
+                if state is None:
+                    state = {"version": 0, "zones": {}, "changes": [], "legacy": {}, "legacy_unimported": []}
+                    if self.legacy_path:
+                        self._import_legacy(state)
+                    atomic_write_json(self.path, state)
+        zones = {}
+        for zone_id, zone in state["zones"].items():
+            # Zones saved before coordinates and radii were validated.
+            try:
+                zones[zone_id] = normalize_zone(zone, zone_id)
+            except ZoneError as e:
+                print(f"[ZONES] Dropping invalid stored zone {zone_id}: {e}")
+        with self.lock:
+            if state["version"] != self.version:
+                self.bundle_cache.clear()
+            self.version = state["version"]
+            self.zones = zones
+            self.changes = state["changes"]
+            self.legacy = state.get("legacy", {})
+            self.legacy_unimported = state.get("legacy_unimported", [])
+
+    def _import_legacy(self, state):
+        """Imports website/risk_zones.json, remembering the fields of each entry the zone doesn't hold."""
+        try:
+            with open(self.legacy_path, "r") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        for entry in entries if isinstance(entries, list) else []:
+            try:
+                legacy_id = entry.get("id") if isinstance(entry, dict) else None
+                zone_id = legacy_id if isinstance(legacy_id, str) and ZONE_ID_PATTERN.fullmatch(legacy_id) \
+                    else new_zone_id()
+                zone = normalize_zone(entry, zone_id)
+            except ZoneError as e:
+                # Written back unchanged, so nothing in the file is lost.
+                print(f"[ZONES] Not importing legacy zone {entry!r}: {e}")
+                state["legacy_unimported"].append(entry)
+                continue
+            state["zones"][zone["id"]] = zone
+            state["legacy"][zone["id"]] = {k: v for k, v in entry.items() if k not in LEGACY_FIELDS}
+
+    def save(self):
+        atomic_write_json(self.path, {"version": self.version, "zones": self.zones, "changes": self.changes,
+                                      "legacy": self.legacy, "legacy_unimported": self.legacy_unimported})
+        if self.legacy_path:
+            # map.py's heatmap still reads the flat list of zone centres;
+            # entries imported from it keep the fields they had.
+            heat_points = []
+            for zone_id, zone in self.zones.items():
+                min_lon, min_lat, max_lon, max_lat = zone["bbox"]
+                heat_points.append(dict(self.legacy.get(zone_id, {}), lat=(min_lat + max_lat) / 2,
+                                        lng=(min_lon + max_lon) / 2, intensity=zone["intensity"]))
+            atomic_write_json(self.legacy_path, heat_points + self.legacy_unimported, indent=4)
+
+    def _record_change(self, zone_id):
+        self.version += 1
+        self.changes.append({"version": self.version, "id": zone_id})
+        del self.changes[:-MAX_CHANGES]
+        self.bundle_cache.clear()
+        self.save()
+
+    def put(self, data, zone_id=None):
+        zone = normalize_zone(data, zone_id)
+        if not ZONE_ID_PATTERN.fullmatch(zone["id"]):
+            raise ZoneError("Zone ids are 1-64 letters, digits, '_' or '-', with at least one digit, '_' or '-'")
+        with self.file_lock:
+            self.load()
+            with self.lock:
+                self.zones[zone["id"]] = zone
+                self._record_change(zone["id"])
+                return zone, self.version
+
+    def delete(self, zone_id):
+        with self.file_lock:
+            self.load()
+            with self.lock:
+                if zone_id not in self.zones:
+                    return None
+                del self.zones[zone_id]
+                self.legacy.pop(zone_id, None)
+                self._record_change(zone_id)
+                return self.version
+
+    def list(self):
+        with self.lock:
+            return self.version, list(self.zones.values())
+
+    def changes_since(self, version):
+        """Returns (version, {zone id: zone, or None if deleted}) for the zones changed after `version`.
+
+        The changes are None when `version` is older than the change log.
+        """
+        with self.lock:
+            oldest_delta_base = self.changes[0]["version"] - 1 if self.changes else self.version
+            if not oldest_delta_base <= version <= self.version:
+                return self.version, None
+            changed_ids = {c["id"] for c in self.changes if c["version"] > version}
+            return self.version, {zone_id: self.zones.get(zone_id) for zone_id in changed_ids}
+
+    def bundle(self, since=None):
+        """Returns (kind, version, bytes): a delta from `since` when possible, else the full bundle."""
+        with self.lock:
+            oldest_delta_base = self.changes[0]["version"] - 1 if self.changes else self.version
+            if since is not None and oldest_delta_base <= since <= self.version:
+                kind = "delta"
+            else:
+                kind, since = "full", None
+            key = (kind, since, self.version)
+            if key not in self.bundle_cache:
+                if kind == "full":
+                    data = encode_full(self.version, list(self.zones.values()))
+                else:
+                    changed_ids = {c["id"] for c in self.changes if c["version"] > since}
+                    changed = [self.zones[i] for i in sorted(changed_ids) if i in self.zones]
+                    removed = sorted(i for i in changed_ids if i not in self.zones)
+                    data = encode_delta(since, self.version, changed, removed)
+                self.bundle_cache[key] = data
+            return kind, self.version, self.bundle_cache[key]
@@ -0,0 +1,170 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+# Incidents are bucketed into grid cells of this many degrees (~11 km).
+CELL_SIZE = 0.1
+# An incident's weight halves every this many seconds.
+HALF_LIFE = 3 * 24 * 60 * 60
+DECAY_RATE = math.log(2) / HALF_LIFE
+EVENT_WEIGHTS = {"sos": 1.0, "report": 0.5}
+# Incidents in the eight surrounding cells count for this fraction.
+NEIGHBOUR_WEIGHT = 0.25
+# Decayed incident weight at which the score drops from 5 to 5/e (~1.8).
+SCORE_SCALE = 4.0
+# Cached cell scores are recomputed at least this often as counters decay.
+CACHE_TTL = 60
+# Cells whose score or version is kept; the least recently touched go first.
+MAX_CACHED_CELLS = 50000
+MAX_VERSIONED_CELLS = 200000
+
+STATUS_THRESHOLDS = [(4.0, "Very Safe"), (3.0, "Safe"), (2.0, "Moderate")]
+
+
+def cell_for(lat, lon):
+    return (math.floor(lat / CELL_SIZE), math.floor(lon / CELL_SIZE))
+
+
+def valid_point(lat, lon):
+    return math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+def status_for(score):
+    for threshold, status in STATUS_THRESHOLDS:
+        if score >= threshold:
+            return status
+    return "Use Caution"
+
+
+def parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class DecayedCounter:
+    """An exponentially time-decayed sum that is updated and read in O(1)."""
+
+    __slots__ = ("value", "updated")
+
+    def __init__(self):
+        self.value = 0.0
+        self.updated = 0.0
+
+    def at(self, now):
+        return self.value * math.exp(-DECAY_RATE * max(0.0, now - self.updated))
+
+    def add(self, weight, when):
+        if when >= self.updated:
+            self.value = self.at(when) + weight
+            self.updated = when
+        else:
+            # Older event replayed after newer ones: decay it to our clock.
+            self.value += weight * math.exp(-DECAY_RATE * (self.updated - when))
+
+
+class SafetyScoreEngine:
+    """Scores grid cells from the time-decayed density of SOS alerts and accepted reports."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        # Set for a cell to a new sequence number whenever an event lands in it
+        # or a neighbour, so cached scores are invalidated without rescanning
+        # anything. A cell evicted from here reports the highest sequence
+        # evicted so far, which is never lower than what it last reported.
+        self.sequence = 0
+        self.evicted_version = 0
+        self.versions = OrderedDict()
+        self.cache = OrderedDict()
+
+    def record(self, kind, lat, lon, when=None):
+        """Counts an event at (lat, lon); `when` is the event's own timestamp, defaulting to now."""
+        when = when or time.time()
+        cell = cell_for(lat, lon)
+        with self.lock:
+            self.counters.setdefault(cell, DecayedCounter()).add(EVENT_WEIGHTS[kind], when)
+            self.sequence += 1
+            for d_lat in (-1, 0, 1):
+                for d_lon in (-1, 0, 1):
+                    neighbour = (cell[0] + d_lat, cell[1] + d_lon)
+                    self.versions[neighbour] = self.sequence
+                    self.versions.move_to_end(neighbour)
+                    self.cache.pop(neighbour, None)
+            while len(self.versions) > MAX_VERSIONED_CELLS:
+                self.evicted_version = max(self.evicted_version, self.versions.popitem(last=False)[1])
+
+    def record_location(self, kind, location, when=None):
+        """Records an event from an SOS/report location dict, ignoring bad coordinates."""
+        try:
+            lat = float(location["latitude"])
+            lon = float(location["longitude"])
+        except (KeyError, TypeError, ValueError):
+            return False
+        if not valid_point(lat, lon):
+            return False
+        self.record(kind, lat, lon, when)
+        return True
+
+    def version(self, cell):
+        """Changes whenever an incident lands in or next to `cell`."""
+        with self.lock:
+            return self.versions.get(cell, self.evicted_version)
+
+    def density(self, cell, now):
+        total = 0.0
+        for d_lat in (-1, 0, 1):
+            for d_lon in (-1, 0, 1):
+                counter = self.counters.get((cell[0] + d_lat, cell[1] + d_lon))
+                if counter:
+                    weight = 1.0 if d_lat == 0 and d_lon == 0 else NEIGHBOUR_WEIGHT
+                    total += weight * counter.at(now)
+        return total
+
+    def score(self, lat, lon, now=None):
+        """Returns the cached score dict for the cell containing (lat, lon)."""
+        now = now or time.time()
+        cell = cell_for(lat, lon)
+        with self.lock:
+            cached = self.cache.get(cell)
+            if cached and now - cached["computed"] < CACHE_TTL:
+                self.cache.move_to_end(cell)
+                return cached["result"]
+
+            density = self.density(cell, now)
+            score = round(5.0 * math.exp(-density / SCORE_SCALE), 1)
+            result = {
+                "cell": [round(cell[0] * CELL_SIZE, 4), round(cell[1] * CELL_SIZE, 4)],
+                "cell_size": CELL_SIZE,
+                "score": score,
+                "status": status_for(score),
+                "incident_density": round(density, 2)
+            }
+            self.cache[cell] = {"computed": now, "result": result}
+            self.cache.move_to_end(cell)
+            if len(self.cache) > MAX_CACHED_CELLS:
+                self.cache.popitem(last=False)
+            return result
+
+    def reload(self, alerts, reports):
+        """Replaces every counter with a replay of `alerts` and `reports`, changing every cell's version."""
+        fresh = SafetyScoreEngine()
+        fresh.load_history(alerts, reports)
+        with self.lock:
+            self.counters = fresh.counters
+            self.sequence += 1
+            self.evicted_version = self.sequence
+            self.versions.clear()
+            self.cache.clear()
+
+    def load_history(self, alerts, reports):
+        """Replays stored SOS alerts and accepted reports once at startup."""
+        for alert in alerts:
+            self.record_location("sos", alert.get("location") or {}, parse_timestamp(alert.get("timestamp")))
+        for report in reports:
+            if report.get("status") == "accepted":
+                self.record_location("report", report.get("location") or {},
+                                     parse_timestamp(report.get("timestamp")))
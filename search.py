@@ -0,0 +1,249 @@
+"""In-memory search over anomaly reports and SOS alerts for the dispatcher dashboard.
+
+Report reasons go into an inverted index (token -> {doc: term count}) with
+a sorted vocabulary, so every query word also matches as a prefix. Type,
+status, user mobile, phone number, blockchain id and timestamp are kept as
+NumPy columns indexed by document slot, so facet filters, date ranges,
+BM25 scoring and per-status counts are vectorized. Prefix expansions score
+less than exact words, and ties go to the newest record.
+
+The index is built once from the JSON files at startup and then kept up to
+date one record at a time; a removed record leaves a dead slot until the
+next rebuild.
+"""
+import bisect
+import re
+import threading
+from datetime import datetime
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+# BM25 parameters.
+K1 = 1.2
+B = 0.75
+PREFIX_WEIGHT = 0.6
+MAX_EXPANSIONS = 100
+FACETS = ("type", "status", "user", "phone", "blockchain_id")
+INITIAL_CAPACITY = 1024
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower()) if isinstance(text, str) else []
+
+
+def to_epoch(value):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def report_doc(report):
+    """Returns the stored document (the report itself plus its type) and its facet values."""
+    user = report.get("user") if isinstance(report.get("user"), dict) else {}
+    doc = dict(report, type="report", status=report.get("status", "pending"))
+    return doc, {"type": "report", "status": doc["status"], "user": user.get("mobile"),
+                 "blockchain_id": user.get("blockchain_id")}
+
+
+def alert_doc(alert):
+    doc = dict(alert, type="sos", status="open")
+    return doc, {"type": "sos", "status": "open", "phone": alert.get("phoneNumber"),
+                 "blockchain_id": alert.get("blockchainId")}
+
+
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.docs = []
+            self.slots = {}
+            self.postings = {}
+            self.posting_arrays = {}
+            self.vocabulary = []
+            self.total_length = 0
+            self.codes = {facet: {} for facet in FACETS}
+            self.values = {facet: [] for facet in FACETS}
+            self.alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+            self.timestamps = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+            self.lengths = np.zeros(INITIAL_CAPACITY, dtype=np.float32)
+            self.columns = {facet: np.full(INITIAL_CAPACITY, -1, dtype=np.int32) for facet in FACETS}
+
+    def rebuild(self, alerts, reports):
+        with self.lock:
+            self.clear()
+            for alert in alerts:
+                self.add_alert(alert)
+            for report in reports:
+                self.add_report(report)
+
+    # --- Updates ---
+
+    def _grow(self):
+        capacity = len(self.alive) * 2
+        def grown(array, fill):
+            bigger = np.full(capacity, fill, dtype=array.dtype)
+            bigger[:len(array)] = array
+            return bigger
+        self.alive = grown(self.alive, False)
+        self.timestamps = grown(self.timestamps, 0)
+        self.lengths = grown(self.lengths, 0)
+        self.columns = {facet: grown(column, -1) for facet, column in self.columns.items()}
+
+    def _code(self, facet, value):
+        # Records stored before ingest validation may hold lists or objects here.
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not value or not isinstance(value, str):
+            return -1
+        code = self.codes[facet].get(value)
+        if code is None:
+            code = self.codes[facet][value] = len(self.values[facet])
+            self.values[facet].append(value)
+        return code
+
+    def _add(self, key, doc, facet_values):
+        self._remove(key)
+        slot = len(self.docs)
+        if slot == len(self.alive):
+            self._grow()
+        self.docs.append(doc)
+        self.slots[key] = slot
+        self.alive[slot] = True
+        self.timestamps[slot] = to_epoch(doc.get("timestamp")) or 0
+        for facet in FACETS:
+            self.columns[facet][slot] = self._code(facet, facet_values.get(facet))
+
+        tokens = tokenize(doc.get("reason"))
+        self.lengths[slot] = len(tokens)
+        self.total_length += len(tokens)
+        for token in tokens:
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                bisect.insort(self.vocabulary, token)
+            postings[slot] = postings.get(slot, 0) + 1
+            self.posting_arrays.pop(token, None)
+
+    def _remove(self, key):
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return False
+        doc = self.docs[slot]
+        self.docs[slot] = None
+        self.alive[slot] = False
+        self.total_length -= int(self.lengths[slot])
+        for token in set(tokenize(doc.get("reason"))):
+            postings = self.postings[token]
+            del postings[slot]
+            self.posting_arrays.pop(token, None)
+            if not postings:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+        return True
+
+    def add_report(self, report):
+        with self.lock:
+            self._add(("report", report.get("id")), *report_doc(report))
+
+    def add_alert(self, alert):
+        with self.lock:
+            self._add(("sos", alert.get("id")), *alert_doc(alert))
+
+    def set_report_status(self, report_id, status):
+        with self.lock:
+            slot = self.slots.get(("report", report_id))
+            if slot is not None:
+                self.docs[slot] = dict(self.docs[slot], status=status)
+                self.columns["status"][slot] = self._code("status", status)
+
+    def remove_report(self, report_id):
+        with self.lock:
+            return self._remove(("report", report_id))
+
+    # --- Queries ---
+
+    def expansions(self, term):
+        """Indexed tokens starting with `term` with the weight each contributes, and whether
+        some were left out.
+
+        A short prefix can match thousands of tokens; only the MAX_EXPANSIONS
+        found in the most documents (and the exact word) are used.
+        """
+        start = bisect.bisect_left(self.vocabulary, term)
+        end = bisect.bisect_left(self.vocabulary, term[:-1] + chr(ord(term[-1]) + 1), start)
+        tokens = self.vocabulary[start:end]
+        truncated = len(tokens) > MAX_EXPANSIONS
+        if truncated:
+            tokens = sorted(tokens, key=lambda token: (token != term, -len(self.postings[token])))[:MAX_EXPANSIONS]
+        return [(token, 1.0 if token == term else PREFIX_WEIGHT) for token in tokens], truncated
+
+    def posting_array(self, token):
+        """(slots, term counts) for a token, cached until the token's postings change."""
+        arrays = self.posting_arrays.get(token)
+        if arrays is None:
+            postings = self.postings[token]
+            arrays = self.posting_arrays[token] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings)))
+        return arrays
+
+    def search(self, q=None, start=None, end=None, limit=50, offset=0, **filters):
+        """Ranked matches for the words in `q` (all must match) within the facet `filters`.
+
+        Filters are facet names from FACETS; `start`/`end` bound the record
+        timestamp in epoch seconds. Returns the page of results plus the
+        total and per-status counts over all matches, and the query words
+        whose prefix expansions were capped at MAX_EXPANSIONS.
+        """
+        with self.lock:
+            size = len(self.docs)
+            mask = self.alive[:size].copy()
+            for facet, value in filters.items():
+                if value is not None:
+                    mask &= self.columns[facet][:size] == self.codes[facet].get(value, -2)
+            if start is not None:
+                mask &= self.timestamps[:size] >= start
+            if end is not None:
+                mask &= self.timestamps[:size] < end
+
+            scores = np.zeros(size, dtype=np.float32)
+            truncated = []
+            terms = tokenize(q)
+            if terms:
+                doc_count = max(1, len(self.slots))
+                average_length = self.total_length / doc_count or 1
+                norms = K1 * (1 - B + B * self.lengths[:size] / average_length)
+                for term in terms:
+                    term_scores = np.zeros(size, dtype=np.float32)
+                    expansions, term_truncated = self.expansions(term)
+                    if term_truncated:
+                        truncated.append(term)
+                    for token, weight in expansions:
+                        slots, counts = self.posting_array(token)
+                        idf = np.log(1 + (doc_count - len(slots) + 0.5) / (len(slots) + 0.5))
+                        token_scores = weight * idf * counts * (K1 + 1) / (counts + norms[slots])
+                        term_scores[slots] = np.maximum(term_scores[slots], token_scores)
+                    # Every word has to match.
+                    mask &= term_scores > 0
+                    scores += term_scores
+
+            matches = np.flatnonzero(mask)
+            # Best score first, then newest first.
+            order = np.lexsort((-self.timestamps[matches], -scores[matches]))
+            page = matches[order[offset:offset + limit]]
+            status_counts = np.bincount(self.columns["status"][matches] + 1,
+                                        minlength=len(self.values["status"]) + 1)
+            return {
+                "total": int(len(matches)),
+                # Words whose prefix matches were capped: total is then a lower bound.
+                "truncated_terms": truncated,
+                "facets": {"status": {status: int(status_counts[code + 1])
+                                      for code, status in enumerate(self.values["status"])
+                                      if status_counts[code + 1]}},
+                "results": [dict(self.docs[slot], score=round(float(scores[slot]), 3)) for slot in page],
+            }
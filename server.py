@@ -1,14 +1,70 @@
 from flask import Flask, request, jsonify, send_from_directory
 import logging
-import json
 import hashlib
+import json
+import math
+import mimetypes
 import os
+import queue
+import threading
+import time
+import uuid
 from datetime import datetime
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
 from werkzeug.utils import secure_filename
 
+from admission import AdmissionController
+from archive import Archive, ColumnSet, build_columns
+from broadcasts import BroadcastError, BroadcastStore
+from datastore import SNAPSHOT_INTERVAL, DataStore, removed_keys
+from events import (ALERT_CREATED, ARCHIVE_ROLLED, BROADCASTS_UPDATED, INCIDENT_MESSAGE, LOCATIONS_RECORDED,
+                    REPORT_UPDATED, RESYNC, RISK_ZONES_UPDATED, USER_REGISTERED, create_event_bus)
+from incidents import IncidentHub, encode_message
+from itinerary_risk import ItineraryRiskProfiles
+from ledger import Ledger
+from location_store import LocationStore, accepted_points
+from notifications import NotificationDispatcher
+from risk_zones import GEOFENCE_PATH, RiskZoneStore, ZoneError
+from safety import CACHE_TTL as SCORE_CACHE_TTL, SafetyScoreEngine, parse_timestamp, valid_point
+from search import SearchIndex
+from users import add_users, load_users, make_user
+from uploads import CHUNK_SIZE, MAX_UPLOAD_SIZE, UploadError, UploadStore
+
 logging.basicConfig(filename='server.log', level=logging.DEBUG)
 
 app = Flask(__name__)
+# Bodies beyond this are refused with 413 before they are read: the largest
+# report photo plus room for the multipart form around it.
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE + 1024 * 1024
+# alert.json, website/reports.json and users.json: every change is logged and
+# written atomically, snapshots run in the background (datastore.py), and a
+# damaged file is restored from the last good snapshot before anything reads it.
+datastore = DataStore()
+recovery = datastore.recover()
+app.logger.info("Data recovery took %s ms: %s", recovery['elapsed_ms'], recovery['stores'])
+admission = AdmissionController()
+admission.init_app(app)
+sock = Sock(app)
+# Carries alert, report, user and incident-channel events to every worker, so
+# the per-process state below stays in step however many workers run.
+event_bus = create_event_bus()
+incident_hub = IncidentHub()
+location_store = LocationStore()
+upload_store = UploadStore(os.path.join('website', 'uploads', 'partial'))
+safety_engine = SafetyScoreEngine()
+notifier = NotificationDispatcher()
+archive = Archive()
+ledger = Ledger()
+search_index = SearchIndex()
+risk_zone_store = RiskZoneStore(os.path.join('website', 'risk_zone_store.json'),
+                                legacy_path=os.path.join('website', 'risk_zones.json'), lock=datastore.lock)
+itinerary_risk = ItineraryRiskProfiles(safety_engine, 'itineraries.json', 'itinerary_stops.json', GEOFENCE_PATH)
+broadcast_store = BroadcastStore(os.path.join('website', 'broadcasts.json'), legacy_path='alerts.json',
+                                 lock=datastore.lock)
+# Serializes read-modify-write cycles on alert.json, website/reports.json and
+# users.json across threads and worker processes.
+data_lock = datastore.lock
 
 @app.before_request
 def log_request_info():
@@ -16,54 +72,419 @@ def log_request_info():
     app.logger.debug('Body: %s', request.get_data())
 
 
-def load_users():
-    try:
-        with open("users.json", "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+# --- Static assets ---
+# build_assets.py writes fingerprinted, precompressed copies of the dashboard
+# assets to static_build/. Those never change under the same name, so they
+# are cached for a year; the pages that link to them are revalidated with
+# ETags on every load. Without a build everything is served from the repo.
+ASSET_BUILD_DIR = 'static_build'
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+STATIC_MAX_AGE = 60 * 60
+PAGES = {'MAIN.html', 'admin.html', 'login.html'}
+
+def send_precompressed(directory, filename, max_age):
+    """Serves the smallest encoding of `filename` the client accepts.
+
+    Responses support ETag/If-None-Match, Last-Modified and Range requests
+    through send_from_directory's conditional handling.
+    """
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    variant, encoding = filename, None
+    vary = []
+
+    if mimetype in ('image/png', 'image/jpeg'):
+        vary.append('Accept')
+        webp = os.path.splitext(filename)[0] + '.webp'
+        if 'image/webp' in request.headers.get('Accept', '') and \
+                os.path.isfile(os.path.join(directory, webp)):
+            variant, mimetype = webp, 'image/webp'
+    else:
+        vary.append('Accept-Encoding')
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if candidate in accept_encoding and os.path.isfile(os.path.join(directory, filename + suffix)):
+                variant, encoding = filename + suffix, candidate
+                break
+
+    response = send_from_directory(os.path.abspath(directory), variant, mimetype=mimetype, max_age=max_age)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = ', '.join(vary)
+    return response
 
-def save_users(users):
-    with open("users.json", "w") as f:
-        json.dump(users, f, indent=4)
+def send_page(filename):
+    if os.path.isfile(os.path.join(ASSET_BUILD_DIR, filename)):
+        response = send_precompressed(ASSET_BUILD_DIR, filename, max_age=0)
+    else:
+        response = send_from_directory(os.getcwd(), filename, max_age=0)
+    response.cache_control.no_cache = True
+    return response
 
 @app.route("/")
 def index():
-    return send_from_directory('.', 'MAIN.html')
+    return send_page('MAIN.html')
+
+@app.route("/assets/<path:filename>")
+def assets(filename):
+    response = send_precompressed(ASSET_BUILD_DIR, filename, max_age=ASSET_MAX_AGE)
+    response.cache_control.immutable = True
+    response.cache_control.public = True
+    return response
 
 @app.route("/<path:path>")
 def static_files(path):
-    return send_from_directory('.', path)
+    if path in PAGES:
+        return send_page(path)
+    return send_from_directory(os.getcwd(), path, max_age=STATIC_MAX_AGE)
+
+SOS_STRING_FIELDS = ("phoneNumber", "blockchainId", "kycId", "emergencyContact")
+
+def sos_error(data):
+    """Why an SOS body can't be stored, or None if it can."""
+    if not isinstance(data, dict):
+        return "SOS body must be a JSON object"
+    for field in SOS_STRING_FIELDS:
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f"{field} must be a string"
+    if data.get('location') is not None and not isinstance(data['location'], dict):
+        return "location must be an object"
+    return None
 
 @app.route("/sos", methods=["POST"])
 def sos():
     app.logger.info("SOS ENDPOINT CALLED")
     app.logger.info("Received request at /sos")
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        error = sos_error(data)
+        if error:
+            return jsonify({"status": "error", "message": error}), 400
+        data['id'] = str(uuid.uuid4())
         data['timestamp'] = datetime.now().isoformat()
         app.logger.info("Received SOS data: %s", data)
+        with data_lock:
+            try:
+                with open("alert.json", "r") as f:
+                    alerts = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                alerts = []
+            alerts.append(data)
+            datastore.save("alerts", alerts, "append", record=data)
+        ledger.append("sos.created", data['id'], data)
+        event_bus.publish(ALERT_CREATED, data)
         try:
-            with open("alert.json", "r") as f:
-                alerts = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            alerts = []
-        alerts.append(data)
-        with open("alert.json", "w") as f:
-            json.dump(alerts, f)
-        return jsonify({"status": "success"})
+            # Only queued here; the dispatcher's workers do the sending.
+            notifier.enqueue_sos(data)
+        except Exception as e:
+            app.logger.error("Could not queue notifications for incident %s: %s", data['id'], e)
+        return jsonify({"status": "success", "incident_id": data['id']})
     except Exception as e:
         app.logger.error("Error processing SOS request: %s", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route("/notifications/<incident_id>")
+def incident_notifications(incident_id):
+    return jsonify({"status": "success", "notifications": notifier.queue.jobs_for(incident_id)})
+
+@app.route("/metrics/notifications")
+def notification_metrics():
+    return jsonify({"status": "success", "jobs": notifier.queue.counts()})
+
+def on_alert_created(alert):
+    incident_hub.open_incident(alert['id'], alert.get('blockchainId'))
+    record_sos_location(alert)
+    safety_engine.record_location("sos", alert.get('location') or {}, parse_timestamp(alert.get('timestamp')))
+    search_index.add_alert(alert)
+
+def record_sos_location(data):
+    try:
+        location = data['location']
+        location_store.add(data['blockchainId'], [
+            (float(location['latitude']), float(location['longitude']), time.time())
+        ])
+    except (KeyError, TypeError, ValueError):
+        pass
+
+def read_json_list(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+@app.route("/safety_score")
+def safety_score():
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None:
+        return jsonify({"status": "error", "message": "lat and lon are required"}), 400
+    if not valid_point(lat, lon):
+        return jsonify({"status": "error", "message": "lat and lon must be finite coordinates"}), 400
+
+    result = safety_engine.score(lat, lon)
+    response = jsonify({"status": "success", **result})
+    # The score only changes when an incident lands nearby or it decays past
+    # a rounding step, so clients polling it mostly get a 304. The tag comes
+    # from the body alone, so every worker gives the same one.
+    response.set_etag("ss-" + hashlib.sha1(response.get_data()).hexdigest()[:16])
+    response.cache_control.public = True
+    response.cache_control.max_age = SCORE_CACHE_TTL
+    return response.make_conditional(request)
+
+# --- Risk zones ---
+
+@app.route("/risk_zones", methods=["GET"])
+def list_risk_zones():
+    version, zones = risk_zone_store.list()
+    return jsonify({"status": "success", "version": version, "zones": zones})
+
+@app.route("/risk_zones", methods=["POST"])
+@app.route("/risk_zones/<zone_id>", methods=["PUT"])
+def save_risk_zone(zone_id=None):
+    try:
+        zone, version = risk_zone_store.put(request.get_json(), zone_id)
+        event_bus.publish(RISK_ZONES_UPDATED, {"version": version})
+        return jsonify({"status": "success", "zone": zone, "version": version}), 200 if zone_id else 201
+    except ZoneError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        app.logger.error("Error saving risk zone: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/risk_zones/<zone_id>", methods=["DELETE"])
+def delete_risk_zone(zone_id):
+    version = risk_zone_store.delete(zone_id)
+    if version is None:
+        return jsonify({"status": "error", "message": "Zone not found"}), 404
+    event_bus.publish(RISK_ZONES_UPDATED, {"version": version})
+    return jsonify({"status": "success", "version": version})
+
+def on_risk_zones_updated(event):
+    if event['version'] > risk_zone_store.version:
+        risk_zone_store.load()
+    itinerary_risk.sync(risk_zone_store)
+
+@app.route("/risk_zones/bundle")
+def risk_zone_bundle():
+    """Binary zone bundle; with ?since=<version> only the zones changed since then."""
+    kind, version, data = risk_zone_store.bundle(request.args.get('since', type=int))
+    response = app.response_class(data, mimetype='application/octet-stream')
+    response.headers['X-Bundle-Kind'] = kind
+    response.set_etag(f"rz-{version}")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# --- Itinerary risk ---
+
+@app.route("/itineraries/<city>/risk")
+def itinerary_risk_profile(city):
+    result = itinerary_risk.profile(city)
+    if result is None:
+        return jsonify({"status": "error", "message": "Itinerary not found"}), 404
+    body, etag = result
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = SCORE_CACHE_TTL
+    return response.make_conditional(request)
+
+# --- Broadcast alerts ---
+# Advisories published by admins for a region; devices poll the feed for
+# their location and mostly get a 304 from the per-cell cache.
+FEED_MAX_AGE = 60
+
+@app.route("/alerts/feed")
+def alert_feed():
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None:
+        return jsonify({"status": "error", "message": "lat and lon are required"}), 400
+    if not valid_point(lat, lon):
+        return jsonify({"status": "error", "message": "lat and lon must be finite coordinates"}), 400
+    body, etag = broadcast_store.feed(lat, lon)
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = FEED_MAX_AGE
+    return response.make_conditional(request)
+
+@app.route("/alerts/broadcast", methods=["GET"])
+def list_broadcasts():
+    version, alerts = broadcast_store.list()
+    return jsonify({"status": "success", "version": version, "alerts": alerts})
+
+@app.route("/alerts/broadcast", methods=["POST"])
+def publish_broadcast():
+    try:
+        alert, version = broadcast_store.publish(request.get_json())
+        event_bus.publish(BROADCASTS_UPDATED, {"version": version})
+        return jsonify({"status": "success", "alert": alert, "version": version}), 201
+    except BroadcastError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        app.logger.error("Error publishing broadcast alert: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/alerts/broadcast/<alert_id>", methods=["DELETE"])
+def withdraw_broadcast(alert_id):
+    version = broadcast_store.withdraw(alert_id)
+    if version is None:
+        return jsonify({"status": "error", "message": "Alert not found"}), 404
+    event_bus.publish(BROADCASTS_UPDATED, {"version": version})
+    return jsonify({"status": "success", "version": version})
+
+def on_broadcasts_updated(event):
+    if event['version'] > broadcast_store.version:
+        broadcast_store.load()
+
+def send_json_list(path):
+    """Sends a JSON list file as is, with an ETag so an unchanged list is a 304.
+
+    Paths are relative to the working directory like every other data file;
+    send_from_directory would otherwise resolve them against app.root_path.
+    """
+    if not os.path.isfile(path):
+        return jsonify([])
+    directory, filename = os.path.split(os.path.abspath(path))
+    response = send_from_directory(directory, filename, mimetype='application/json', max_age=0)
+    response.cache_control.no_cache = True
+    return response
+
 @app.route("/sos_alerts")
 def get_sos_alerts():
+    return send_json_list("alert.json")
+
+def publish_incident_message(incident_id, message, sender=None):
+    # Watchers of one incident may be connected to different workers.
+    event_bus.publish(INCIDENT_MESSAGE, {"incident_id": incident_id, "message": message, "sender": sender})
+
+def on_incident_message(event):
+    incident_hub.publish(event['incident_id'], event['message'], sender=event.get('sender'))
+
+def location_update(message):
+    """The {"t":"loc"} update to relay for a tourist's message, or None if it is malformed."""
     try:
-        with open("alert.json", "r") as f:
-            alerts = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        alerts = []
-    return jsonify(alerts)
+        lat, lon = float(message['la']), float(message['lo'])
+        ts = float(message.get('ts') or time.time())
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not valid_point(lat, lon) or not math.isfinite(ts):
+        return None
+    return {"t": "loc", "la": round(lat, 5), "lo": round(lon, 5), "ts": int(ts)}
+
+# Live incident channel. The tourist's app streams compact location updates
+# ({"t":"loc","la":..,"lo":..,"ts":..}) after an SOS; dispatchers watching the
+# incident receive them and can send back {"t":"ack","msg":..}, which is
+# relayed to the tourist and to every other dashboard watching it.
+@sock.route("/ws/incident/<incident_id>")
+def incident_channel(ws, incident_id):
+    if not incident_hub.has_incident(incident_id):
+        ws.close(reason=1008, message="Unknown incident")
+        return
+
+    role = request.args.get('role', 'dispatcher')
+    subscriber = incident_hub.subscribe(incident_id)
+    connected = threading.Event()
+    connected.set()
+
+    def forward_messages():
+        while connected.is_set():
+            try:
+                ws.send(subscriber.get(timeout=1))
+            except queue.Empty:
+                continue
+            except Exception:
+                connected.clear()
+
+    sender = threading.Thread(target=forward_messages, daemon=True)
+    sender.start()
+    app.logger.info("Incident %s: %s connected", incident_id, role)
+    try:
+        last_location = incident_hub.last_location(incident_id)
+        if role == 'dispatcher' and last_location:
+            subscriber.put_nowait(encode_message(last_location))
+
+        while connected.is_set():
+            raw = ws.receive(timeout=1)
+            if raw is None:
+                continue
+            try:
+                message = json.loads(raw)
+            except (TypeError, ValueError):
+                continue
+            if not isinstance(message, dict):
+                continue
+            if role == 'tourist' and message.get('t') == 'loc':
+                update = location_update(message)
+                if update is None:
+                    continue
+                publish_incident_message(incident_id, update, sender=subscriber.token)
+                blockchain_id = incident_hub.blockchain_id(incident_id)
+                if blockchain_id:
+                    publish_locations(blockchain_id, [(update['la'], update['lo'], update['ts'])])
+            elif role == 'dispatcher' and message.get('t') == 'ack':
+                publish_incident_message(incident_id, {
+                    "t": "ack",
+                    "msg": str(message.get('msg', 'Help is on the way.'))[:280],
+                    "ts": int(time.time())
+                })
+    except ConnectionClosed:
+        pass
+    finally:
+        connected.clear()
+        incident_hub.unsubscribe(incident_id, subscriber)
+        app.logger.info("Incident %s: %s disconnected", incident_id, role)
+
+# --- Location tracking ---
+
+# Trails are kept in every worker, so fixes are recorded through the event bus.
+MAX_LOCATION_BATCH = 500
+
+def publish_locations(blockchain_id, points):
+    event_bus.publish(LOCATIONS_RECORDED, {"blockchain_id": blockchain_id, "points": points})
+
+def on_locations_recorded(event):
+    location_store.add(event['blockchain_id'], event['points'])
+
+@app.route("/location", methods=["POST"])
+def ingest_location():
+    try:
+        data = request.get_json()
+        blockchain_id = data.get('blockchainId')
+        if not blockchain_id or not isinstance(blockchain_id, str):
+            return jsonify({"status": "error", "message": "blockchainId is required"}), 400
+
+        # Accepts either a single fix or a batch of buffered fixes.
+        raw_points = data.get('points') or [data]
+        if len(raw_points) > MAX_LOCATION_BATCH:
+            return jsonify({"status": "error", "message": f"At most {MAX_LOCATION_BATCH} points per request"}), 413
+        points = accepted_points([
+            (float(p['lat']), float(p['lon']), float(p.get('ts') or time.time()))
+            for p in raw_points
+        ], time.time())
+        if points:
+            publish_locations(blockchain_id, points)
+        return jsonify({"status": "success", "accepted": len(points)})
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid location data: {e}"}), 400
+    except Exception as e:
+        app.logger.error("Error processing location request: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/location/<blockchain_id>")
+def last_location(blockchain_id):
+    position = location_store.last_position(blockchain_id)
+    if not position:
+        return jsonify({"status": "error", "message": "No location data"}), 404
+    return jsonify({"status": "success", "location": position})
+
+@app.route("/location/<blockchain_id>/trail")
+def location_trail(blockchain_id):
+    now = time.time()
+    start = request.args.get('from', now - 24 * 60 * 60, type=float)
+    end = request.args.get('to', now, type=float)
+    # Points are [lat, lon, ts]; anything older than a few hours is downsampled.
+    return jsonify({"status": "success", "trail": location_store.trail(blockchain_id, start, end)})
 
 @app.route("/register", methods=["POST"])
 def register():
@@ -75,23 +496,50 @@ def register():
     if not all([mobile, kyc, emergency_contact]):
         return jsonify({"status": "error", "message": "Missing required fields"}), 400
 
-    users = load_users()
+    with data_lock:
+        users = load_users()
 
-    if any(user['mobile'] == mobile for user in users):
-        return jsonify({"status": "error", "message": "User already exists"}), 400
+        if any(user['mobile'] == mobile for user in users):
+            return jsonify({"status": "error", "message": "User already exists"}), 400
 
-    blockchain_id = hashlib.sha256(mobile.encode('utf-8')).hexdigest()
-    new_user = {
-        "mobile": mobile,
-        "kyc": kyc,
-        "emergency_contact": emergency_contact,
-        "blockchain_id": blockchain_id
-    }
-    users.append(new_user)
-    save_users(users)
+        new_user = make_user(mobile, kyc, emergency_contact)
+        users.append(new_user)
+        datastore.save("users", users, "append", record=new_user)
+    publish_user_registered(new_user)
 
     return jsonify({"status": "success", "user": new_user}), 201
 
+MAX_BATCH_USERS = 10000
+
+@app.route("/register/batch", methods=["POST"])
+def register_batch():
+    app.logger.info("REGISTER BATCH ENDPOINT CALLED")
+    try:
+        data = request.get_json(silent=True)
+        rows = data.get("users") if isinstance(data, dict) else None
+        if not isinstance(rows, list) or not rows:
+            return jsonify({"status": "error", "message": "A non-empty users list is required"}), 400
+        if len(rows) > MAX_BATCH_USERS:
+            return jsonify({"status": "error", "message": f"At most {MAX_BATCH_USERS} users per batch"}), 413
+
+        with data_lock:
+            created, errors = add_users(rows, save=lambda users, created: datastore.save(
+                "users", users, "extend", records=created))
+        for user in created:
+            publish_user_registered(user)
+        return jsonify({
+            "status": "success" if created else "error",
+            "created": len(created),
+            "users": created,
+            "errors": errors
+        }), 201 if created else 400
+    except Exception as e:
+        app.logger.error("Error processing register batch request: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def publish_user_registered(user):
+    event_bus.publish(USER_REGISTERED, {"mobile": user['mobile'], "blockchain_id": user.get('blockchain_id')})
+
 @app.route("/login", methods=["POST"])
 def login():
     data = request.get_json()
@@ -115,6 +563,64 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def report_fields_error(reason, user_data, location_data):
+    """Why a report's fields can't be stored, or None if they can."""
+    if not isinstance(reason, str):
+        return "reason must be a string"
+    if not isinstance(user_data, dict):
+        return "user must be an object"
+    for field in ("mobile", "blockchain_id"):
+        if user_data.get(field) is not None and not isinstance(user_data[field], str):
+            return f"user.{field} must be a string"
+    if not isinstance(location_data, dict):
+        return "location must be an object"
+    return None
+
+def save_report(unique_filename, reason, user_data, location_data):
+    with data_lock:
+        try:
+            with open("website/reports.json", "r") as f:
+                reports = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            reports = []
+
+        new_report = {
+            "id": unique_filename,
+            "timestamp": datetime.now().isoformat(),
+            "image_path": f"uploads/{unique_filename}",
+            "reason": reason,
+            "user": user_data,
+            "location": location_data,
+            "status": "pending"
+        }
+
+        reports.append(new_report)
+        datastore.save("reports", reports, "append", record=new_report)
+    ledger.append("report.created", new_report['id'], new_report)
+    publish_report_updated(new_report, "created")
+    return new_report
+
+def publish_report_updated(report, change):
+    event = {
+        "id": report['id'],
+        "change": change,
+        "status": report.get('status'),
+        "location": report.get('location'),
+        "timestamp": report.get('timestamp')
+    }
+    if change == 'created':
+        event["report"] = report
+    event_bus.publish(REPORT_UPDATED, event)
+
+def on_report_updated(event):
+    if event['change'] == 'created':
+        search_index.add_report(event['report'])
+    elif event['change'] == 'accepted':
+        safety_engine.record_location("report", event.get('location') or {}, parse_timestamp(event.get('timestamp')))
+        search_index.set_report_status(event['id'], event['status'])
+    elif event['change'] == 'deleted':
+        search_index.remove_report(event['id'])
+
 @app.route("/report", methods=["POST"])
 def report():
     app.logger.info("REPORT ENDPOINT CALLED")
@@ -128,38 +634,22 @@ def report():
             return jsonify({"status": "error", "message": "No selected file"}), 400
 
         if file and allowed_file(file.filename):
+            reason = request.form.get('reason', '')
+            try:
+                user_data = json.loads(request.form.get('user', '{}'))
+                location_data = json.loads(request.form.get('location', '{}'))
+            except json.JSONDecodeError:
+                return jsonify({"status": "error", "message": "user and location must be JSON"}), 400
+            error = report_fields_error(reason, user_data, location_data)
+            if error:
+                return jsonify({"status": "error", "message": error}), 400
+
             filename = secure_filename(file.filename)
             unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
             filepath = os.path.join('website', 'uploads', unique_filename)
             file.save(filepath)
 
-            reason = request.form.get('reason', '')
-            user_json = request.form.get('user', '{}')
-            location_json = request.form.get('location', '{}')
-            
-            user_data = json.loads(user_json)
-            location_data = json.loads(location_json)
-
-            try:
-                with open("website/reports.json", "r") as f:
-                    reports = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                reports = []
-            
-            new_report = {
-                "id": unique_filename,
-                "timestamp": datetime.now().isoformat(),
-                "image_path": f"uploads/{unique_filename}",
-                "reason": reason,
-                "user": user_data,
-                "location": location_data,
-                "status": "pending"
-            }
-            
-            reports.append(new_report)
-            
-            with open("website/reports.json", "w") as f:
-                json.dump(reports, f, indent=4)
+            save_report(unique_filename, reason, user_data, location_data)
                 
             return jsonify({"status": "success", "message": "Report submitted."})
         else:
@@ -169,15 +659,93 @@ def report():
         app.logger.error("Error processing report request: %s", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# --- Resumable report uploads ---
+# init -> PUT chunks at increasing offsets -> complete. A client that loses
+# its connection asks GET /report/upload/<id> for the offset to resume from.
+
+def upload_error_response(e):
+    body = {"status": "error", "message": e.message}
+    if e.offset is not None:
+        body["offset"] = e.offset
+    return jsonify(body), e.status_code
+
+@app.route("/report/upload/init", methods=["POST"])
+def report_upload_init():
+    app.logger.info("REPORT UPLOAD INIT ENDPOINT CALLED")
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"status": "error", "message": "Upload body must be a JSON object"}), 400
+        filename = data.get('filename', '')
+        if not isinstance(filename, str) or not allowed_file(filename):
+            return jsonify({"status": "error", "message": "File type not allowed"}), 400
+
+        fields = {
+            "reason": data.get('reason', ''),
+            "user": data.get('user', {}),
+            "location": data.get('location', {})
+        }
+        error = report_fields_error(fields["reason"], fields["user"], fields["location"])
+        if error:
+            return jsonify({"status": "error", "message": error}), 400
+        meta = upload_store.init(secure_filename(filename), data.get('size'), data.get('sha256'), fields)
+        return jsonify({"status": "success", "upload_id": meta["upload_id"],
+                        "offset": 0, "chunk_size": CHUNK_SIZE}), 201
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        app.logger.error("Error processing report upload init: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/report/upload/<upload_id>", methods=["GET"])
+def report_upload_status(upload_id):
+    try:
+        return jsonify({"status": "success", **upload_store.status(upload_id)})
+    except UploadError as e:
+        return upload_error_response(e)
+
+@app.route("/report/upload/<upload_id>", methods=["PUT"])
+def report_upload_chunk(upload_id):
+    try:
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({"status": "error", "message": "Chunk offset is required"}), 400
+        if request.content_length is not None and request.content_length > CHUNK_SIZE:
+            return jsonify({"status": "error", "message": "Chunk too large"}), 413
+        new_offset = upload_store.write_chunk(
+            upload_id, offset, request.get_data(), request.headers.get('X-Chunk-SHA256'))
+        return jsonify({"status": "success", "offset": new_offset})
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        app.logger.error("Error processing report upload chunk: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/report/upload/<upload_id>/complete", methods=["POST"])
+def report_upload_complete(upload_id):
+    app.logger.info("REPORT UPLOAD COMPLETE ENDPOINT CALLED")
+    try:
+        # A client that lost the response retries; it gets the same report back.
+        with upload_store.lock:
+            meta = upload_store.get(upload_id)
+            if not meta.get("report_id"):
+                unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{meta['filename']}"
+                meta = upload_store.complete(upload_id, os.path.join('website', 'uploads', unique_filename))
+                unique_filename = os.path.basename(meta["destination"])
+                fields = meta["fields"]
+                save_report(unique_filename, fields["reason"], fields["user"], fields["location"])
+                meta = upload_store.finish(upload_id, unique_filename)
+        return jsonify({"status": "success", "message": "Report submitted.", "report_id": meta["report_id"]})
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        app.logger.error("Error processing report upload complete: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route("/get_reports")
 def get_reports():
     app.logger.info("GET REPORTS ENDPOINT CALLED")
-    try:
-        with open("website/reports.json", "r") as f:
-            reports = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        reports = []
-    return jsonify(reports)
+    return send_json_list("website/reports.json")
 
 @app.route("/accept_report", methods=["POST"])
 def accept_report():
@@ -188,22 +756,31 @@ def accept_report():
         if not report_id:
             return jsonify({"status": "error", "message": "Report ID is required"}), 400
 
-        with open("website/reports.json", "r") as f:
-            reports = json.load(f)
+        with data_lock:
+            with open("website/reports.json", "r") as f:
+                reports = json.load(f)
         
-        report_found = False
-        for report in reports:
-            if report.get('id') == report_id:
-                report['status'] = 'accepted'
-                report_found = True
-                break
+            report_found = None
+            newly_accepted = False
+            for report in reports:
+                if report.get('id') == report_id:
+                    if report.get('status') != 'accepted':
+                        report['accepted_at'] = datetime.now().isoformat()
+                        newly_accepted = True
+                    report['status'] = 'accepted'
+                    report_found = report
+                    break
         
-        if not report_found:
-            return jsonify({"status": "error", "message": "Report not found"}), 404
-            
-        with open("website/reports.json", "w") as f:
-            json.dump(reports, f, indent=4)
-            
+            if not report_found:
+                return jsonify({"status": "error", "message": "Report not found"}), 404
+
+            if newly_accepted:
+                datastore.save("reports", reports, "update", key=report_id, fields={
+                    "status": "accepted", "accepted_at": report_found['accepted_at']})
+
+        if newly_accepted:
+            ledger.append("report.accepted", report_id, report_found)
+            publish_report_updated(report_found, "accepted")
         return jsonify({"status": "success", "message": "Report accepted."})
 
     except Exception as e:
@@ -219,18 +796,19 @@ def delete_report():
         if not report_id:
             return jsonify({"status": "error", "message": "Report ID is required"}), 400
 
-        with open("website/reports.json", "r") as f:
-            reports = json.load(f)
+        with data_lock:
+            with open("website/reports.json", "r") as f:
+                reports = json.load(f)
         
-        report_to_delete = next((r for r in reports if r.get('id') == report_id), None)
-        if not report_to_delete:
-            return jsonify({"status": "error", "message": "Report not found"}), 404
+            report_to_delete = next((r for r in reports if r.get('id') == report_id), None)
+            if not report_to_delete:
+                return jsonify({"status": "error", "message": "Report not found"}), 404
             
-        reports = [r for r in reports if r.get('id') != report_id]
-        
-        with open("website/reports.json", "w") as f:
-            json.dump(reports, f, indent=4)
+            reports = [r for r in reports if r.get('id') != report_id]
+            datastore.save("reports", reports, "remove", keys=[report_id])
             
+        ledger.append("report.deleted", report_id, report_to_delete)
+        publish_report_updated(report_to_delete, "deleted")
         image_path = os.path.join('website', report_to_delete['image_path'])
         if os.path.exists(image_path):
             os.remove(image_path)
@@ -241,5 +819,206 @@ def delete_report():
         app.logger.error("Error processing delete_report request: %s", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# --- Search ---
+
+def parse_time_arg(name):
+    """Reads an epoch-seconds or ISO date query argument; raises ValueError if it is neither."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@app.route("/search")
+def search():
+    try:
+        kind = request.args.get('type')
+        if kind not in (None, 'sos', 'report'):
+            return jsonify({"status": "error", "message": "type must be sos or report"}), 400
+        result = search_index.search(
+            q=request.args.get('q'),
+            start=parse_time_arg('from'),
+            end=parse_time_arg('to'),
+            limit=max(1, min(request.args.get('limit', 50, type=int), 500)),
+            offset=max(request.args.get('offset', 0, type=int), 0),
+            type=kind,
+            status=request.args.get('status') or None,
+            user=request.args.get('user') or None,
+            phone=request.args.get('phone') or None,
+            blockchain_id=request.args.get('blockchainId') or None
+        )
+        return jsonify({"status": "success", **result})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid date: {e}"}), 400
+    except Exception as e:
+        app.logger.error("Error processing search request: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+# --- Ledger ---
+# SOS and report events are sealed into signed Merkle batches (ledger.py).
+# An auditor checks a record's proofs against the published batch headers.
+
+@app.route("/ledger/proof/<record_id>")
+def ledger_proof(record_id):
+    proofs = ledger.proofs(record_id)
+    if not proofs:
+        return jsonify({"status": "error", "message": "No sealed events for this record"}), 404
+    return jsonify({"status": "success", "events": proofs})
+
+@app.route("/ledger/batches")
+def ledger_batches():
+    after = request.args.get('after', -1, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    return jsonify({"status": "success", "batches": ledger.batches(after, limit)})
+
+@app.route("/ledger/key")
+def ledger_key():
+    return jsonify({"status": "success", **ledger.signer.describe()})
+
+# --- Archive and analytics ---
+ARCHIVE_AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL = 60 * 60
+live_columns_cache = {"key": None, "columns": None}
+
+def live_columns():
+    """Columns for records still in the JSON files, rebuilt only when they change."""
+    key = tuple(os.path.getmtime(path) if os.path.exists(path) else 0
+                for path in ("alert.json", "website/reports.json"))
+    if live_columns_cache["key"] != key:
+        columns, users = build_columns(read_json_list("alert.json"), read_json_list("website/reports.json"))
+        live_columns_cache.update(key=key, columns=ColumnSet(columns, users))
+    return live_columns_cache["columns"]
+
+def invalidate_live_columns(event):
+    # File mtimes can miss two writes within the same timestamp tick.
+    live_columns_cache["key"] = None
+
+def roll_archive():
+    cutoff = time.time() - ARCHIVE_AFTER_DAYS * 24 * 60 * 60
+    with data_lock:
+        old_alerts, old_reports = read_json_list("alert.json"), read_json_list("website/reports.json")
+        alerts, reports, archived = archive.roll(old_alerts, old_reports, cutoff)
+        if archived:
+            datastore.save("alerts", alerts, "remove", keys=removed_keys(old_alerts, alerts))
+            datastore.save("reports", reports, "remove", keys=removed_keys(old_reports, reports))
+    if archived:
+        app.logger.info("Archived %d alerts and reports", archived)
+        event_bus.publish(ARCHIVE_ROLLED, {"archived": archived})
+
+def on_archive_rolled(event):
+    # Every worker's search index still holds the records that left the live files.
+    invalidate_live_columns(event)
+    alerts = read_json_list("alert.json")
+    incident_hub.load(alerts)
+    search_index.rebuild(alerts, read_json_list("website/reports.json"))
+
+# --- Resync ---
+resync_due = threading.Event()
+
+def on_resync(event):
+    # Rebuilt off the bus's receive thread, once for any number of gaps.
+    resync_due.set()
+
+def resync_when_due():
+    while True:
+        resync_due.wait()
+        resync_due.clear()
+        try:
+            # Reload everything this worker keeps from the files.
+            risk_zone_store.load()
+            itinerary_risk.sync(risk_zone_store)
+            broadcast_store.load()
+            alerts, reports = read_json_list("alert.json"), read_json_list("website/reports.json")
+            incident_hub.load(alerts)
+            safety_engine.reload(alerts, reports)
+            search_index.rebuild(alerts, reports)
+            invalidate_live_columns(None)
+        except Exception as e:
+            app.logger.error("Error resyncing: %s", e)
+
+def archive_periodically():
+    while True:
+        try:
+            roll_archive()
+        except Exception as e:
+            app.logger.error("Error rolling archive: %s", e)
+        time.sleep(ARCHIVE_INTERVAL)
+
+# --- Snapshots ---
+
+def snapshot_periodically():
+    while True:
+        # Woken early when the operation log outgrows SNAPSHOT_LOG_BYTES.
+        datastore.snapshot_due.wait(SNAPSHOT_INTERVAL)
+        datastore.snapshot_due.clear()
+        try:
+            if datastore.snapshot_needed():
+                manifest = datastore.snapshot()
+                app.logger.info("Snapshot %s taken, ingest paused %s ms", manifest['id'], manifest['paused_ms'])
+        except Exception as e:
+            app.logger.error("Error taking snapshot: %s", e)
+
+@app.route("/admin/snapshot", methods=["POST"])
+def take_snapshot():
+    try:
+        return jsonify({"status": "success", "snapshot": datastore.snapshot()}), 201
+    except Exception as e:
+        app.logger.error("Error taking snapshot: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/admin/snapshots")
+def list_snapshots():
+    return jsonify({"status": "success", "snapshots": datastore.snapshots(), "recovery": recovery})
+
+ANALYTICS_BUCKETS = {"hour": 60 * 60, "day": 24 * 60 * 60, "week": 7 * 24 * 60 * 60}
+
+@app.route("/analytics")
+def analytics():
+    try:
+        now = int(time.time())
+        bucket = request.args.get('bucket', 'day')
+        if bucket not in ANALYTICS_BUCKETS:
+            return jsonify({"status": "error", "message": "bucket must be hour, day or week"}), 400
+        kind = request.args.get('kind')
+        if kind not in (None, 'sos', 'report'):
+            return jsonify({"status": "error", "message": "kind must be sos or report"}), 400
+
+        result = archive.analytics(
+            start=request.args.get('from', now - 30 * 24 * 60 * 60, type=int),
+            end=request.args.get('to', now, type=int),
+            bucket_size=ANALYTICS_BUCKETS[bucket],
+            cell_size=request.args.get('cell', 0.5, type=float),
+            kind=kind,
+            user=request.args.get('user'),
+            live=live_columns()
+        )
+        return jsonify({"status": "success", **result})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        app.logger.error("Error processing analytics request: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+safety_engine.load_history(read_json_list("alert.json"), read_json_list("website/reports.json"))
+search_index.rebuild(read_json_list("alert.json"), read_json_list("website/reports.json"))
+incident_hub.load(read_json_list("alert.json"))
+itinerary_risk.load(risk_zone_store)
+event_bus.subscribe(ALERT_CREATED, on_alert_created)
+event_bus.subscribe(ALERT_CREATED, invalidate_live_columns)
+event_bus.subscribe(REPORT_UPDATED, on_report_updated)
+event_bus.subscribe(REPORT_UPDATED, invalidate_live_columns)
+event_bus.subscribe(INCIDENT_MESSAGE, on_incident_message)
+event_bus.subscribe(BROADCASTS_UPDATED, on_broadcasts_updated)
+event_bus.subscribe(RISK_ZONES_UPDATED, on_risk_zones_updated)
+event_bus.subscribe(LOCATIONS_RECORDED, on_locations_recorded)
+event_bus.subscribe(ARCHIVE_ROLLED, on_archive_rolled)
+event_bus.subscribe(RESYNC, on_resync)
+threading.Thread(target=archive_periodically, daemon=True).start()
+threading.Thread(target=snapshot_periodically, daemon=True).start()
+threading.Thread(target=resync_when_due, daemon=True).start()
+notifier.start()
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,20 @@
+import os
+import sys
+
+# The server modules live at the top level of the repository.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """The server module, imported once and run from a scratch directory with the fake notifier."""
+    cwd = os.getcwd()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("NOTIFY_PROVIDER", "fake")
+        mp.setenv("DATA_FSYNC", "0")
+        mp.chdir(tmp_path_factory.mktemp("server"))
+        import server
+        yield server
+    os.chdir(cwd)
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from flask import Flask
+
+from admission import (RESERVED_THREADS, ROUTE_CLASSES, WORKER_THREADS, AdmissionController, PriorityClass,
+                       default_classes)
+
+
+def test_shared_classes_leave_the_reserved_threads_free():
+    classes = default_classes()
+    shared = sum(c.limit + c.queue_size for name, c in classes.items() if name != "critical")
+    assert shared <= WORKER_THREADS - RESERVED_THREADS
+    assert ROUTE_CLASSES["incident_channel"] == "stream"
+    assert ROUTE_CLASSES["sos"] == "critical"
+    assert [route for route, name in ROUTE_CLASSES.items() if name == "critical"] == ["sos"]
+
+
+def test_class_without_queue_sheds_at_its_limit():
+    streams = PriorityClass("stream", 2, 0, 0)
+    assert streams.acquire() and streams.acquire()
+    assert not streams.acquire()
+    streams.release(1.0)
+    assert streams.acquire()
+    assert streams.stats()["shed"] == 1
+
+
+def test_sos_is_admitted_while_location_ingest_is_saturated():
+    app = Flask(__name__)
+    admission = AdmissionController()
+    admission.enabled = True
+    admission.init_app(app)
+    release = threading.Event()
+
+    @app.route("/location", methods=["POST"], endpoint="ingest_location")
+    def ingest_location():
+        release.wait(5)
+        return "ok"
+
+    @app.route("/sos", methods=["POST"], endpoint="sos")
+    def sos():
+        return "ok"
+
+    location = admission.classes["location"]
+    statuses = []
+    pings = [threading.Thread(target=lambda: statuses.append(app.test_client().post("/location").status_code))
+             for _ in range(location.limit + location.queue_size + 4)]
+    for ping in pings:
+        ping.start()
+    try:
+        # Every slot is taken and the extra pings have been shed.
+        deadline = time.time() + 5
+        while statuses.count(503) < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        assert location.active == location.limit
+        assert app.test_client().post("/sos").status_code == 200
+    finally:
+        release.set()
+        for ping in pings:
+            ping.join()
+    assert statuses.count(503) >= 4
@@ -0,0 +1,36 @@
+import pytest
+
+from archive import Archive, build_columns
+
+
+def test_segment_round_trip_and_cell_validation(tmp_path):
+    archive = Archive(str(tmp_path))
+    alerts = [{"id": str(i), "timestamp": f"2025-09-08T19:31:0{i}", "blockchainId": "b",
+               "location": {"latitude": 26.1, "longitude": 91.7}} for i in range(3)]
+    archive.write_segment(*build_columns(alerts, []))
+    [segment] = archive.segments()
+    assert len(segment.column("ts")) == 3 and segment.users() == {"b": 0}
+
+    start = int(segment.column("ts")[0])
+    result = archive.analytics(start, start + 3600, 3600, cell_size=0.5)
+    assert result["regions"]["cells"] == [{"lat": 26.0, "lon": 91.5, "count": 3}]
+    for cell_size in (float("nan"), float("inf"), 0, -1, 1e-9):
+        with pytest.raises(ValueError):
+            archive.analytics(start, start + 3600, 3600, cell_size=cell_size)
+
+
+def test_roll_after_a_crash_does_not_archive_twice(tmp_path):
+    archive = Archive(str(tmp_path))
+    alerts = [{"id": f"a{i}", "timestamp": f"2025-09-08T19:31:0{i}", "blockchainId": "b",
+               "location": {"latitude": 26.1, "longitude": 91.7}} for i in range(3)]
+    reports = [{"id": "r1", "timestamp": "2025-09-08T19:31:00", "status": "accepted"},
+               {"id": "r2", "timestamp": "2025-09-08T19:31:00", "status": "pending"}]
+    kept_alerts, kept_reports, removed = archive.roll(alerts, reports, cutoff=2e9)
+    assert (kept_alerts, [r["id"] for r in kept_reports], removed) == ([], ["r2"], 4)
+
+    # The live files were never rewritten, so the same records come round again.
+    alerts.append({"id": "a9", "timestamp": "2025-09-08T19:31:09"})
+    kept_alerts, kept_reports, removed = archive.roll(alerts, reports, cutoff=2e9)
+    assert (kept_alerts, [r["id"] for r in kept_reports], removed) == ([], ["r2"], 5)
+    assert sum(len(segment.column("ts")) for segment in archive.segments()) == 5
+    assert set().union(*(segment.ids()["sos"] for segment in archive.segments())) == {"a0", "a1", "a2", "a9"}
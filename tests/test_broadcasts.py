@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from broadcasts import BroadcastError, BroadcastStore
+
+
+def test_legacy_alerts_get_the_same_ids_in_every_worker(tmp_path):
+    legacy = tmp_path / "alerts.json"
+    legacy.write_text(json.dumps(["Road closed near Sela Pass", "Heavy rain expected"]))
+    first = BroadcastStore(str(tmp_path / "a.json"), str(legacy))
+    second = BroadcastStore(str(tmp_path / "b.json"), str(legacy))
+    assert [a["id"] for a in first.list()[1]] == [a["id"] for a in second.list()[1]]
+
+
+def test_stores_sharing_a_file_keep_each_others_alerts(tmp_path):
+    path = str(tmp_path / "broadcasts.json")
+    first, second = BroadcastStore(path), BroadcastStore(path)
+    first.publish({"message": "Landslide on NH-10"})
+    alert, version = second.publish({"message": "Flood warning", "severity": "warning"})
+    assert version == 2
+    assert [a["message"] for a in BroadcastStore(path).list()[1]] == ["Landslide on NH-10", "Flood warning"]
+    assert first.withdraw(alert["id"]) == 3
+
+
+def test_feed_cells_are_rebuilt_after_a_change(tmp_path):
+    store = BroadcastStore(str(tmp_path / "broadcasts.json"))
+    empty_body, empty_etag = store.feed(26.1, 91.7)
+    alert, _ = store.publish({"message": "Landslide", "region": {"min_lat": 26, "min_lon": 91.5,
+                                                                "max_lat": 26.5, "max_lon": 92}})
+    assert store.cell_cache == {}
+    body, etag = store.feed(26.1, 91.7)
+    assert etag != empty_etag and b"Landslide" in body
+    assert store.withdraw(alert["id"]) == 2
+    assert store.feed(26.1, 91.7) == (empty_body, empty_etag)
+    assert store.withdraw(alert["id"]) is None
+
+
+@pytest.mark.parametrize("data", [
+    {"message": ""},
+    {"message": "x", "severity": "extreme"},
+    {"message": "x", "geometry": {"type": "Point", "coordinates": [500, 0]}},
+    {"message": "x", "expires_at": "nan"},
+])
+def test_invalid_alerts_raise_broadcast_error(tmp_path, data):
+    with pytest.raises(BroadcastError):
+        BroadcastStore(str(tmp_path / "broadcasts.json")).publish(data)
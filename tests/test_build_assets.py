@@ -0,0 +1,59 @@
+import gzip
+import re
+import struct
+import zlib
+
+import pytest
+
+import build_assets
+
+
+def png(width=2, height=2):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    rows = b"".join(b"\x00" + b"\xff\x00\x00" * width for _ in range(height))
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) + \
+        chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    source, build = tmp_path / "src", tmp_path / "build"
+    source.mkdir()
+    (source / "MAIN.html").write_text(
+        '<link href="style.css" rel="stylesheet"><script src="app.js"></script>'
+        '<img src="logo.png"><a href="https://example.com/x.js">x</a><img src="missing.png">')
+    (source / "style.css").write_text('body { background: url("logo.png"); }')
+    (source / "app.js").write_text("console.log('hi');\n" * 50)
+    (source / "logo.png").write_bytes(png())
+    monkeypatch.setattr(build_assets, "SOURCE_DIR", str(source))
+    monkeypatch.setattr(build_assets, "BUILD_DIR", str(build))
+    monkeypatch.setattr(build_assets, "PAGES", ["MAIN.html"])
+    return source, build
+
+
+def test_pages_point_at_built_fingerprinted_assets(tree):
+    source, build = tree
+    manifest = build_assets.AssetBuilder().build()
+    assert set(manifest) == {"style.css", "app.js", "logo.png"}
+
+    page = (build / "MAIN.html").read_text()
+    urls = re.findall(r'(?:src|href)="/assets/([^"]+)"', page)
+    assert sorted(urls) == sorted(manifest.values())
+    for name in urls:
+        assert re.fullmatch(r"[\w.-]+\.[0-9a-f]{10}\.(css|js|png)", name)
+        assert (build / name).is_file()
+    # External and missing references are left alone.
+    assert 'href="https://example.com/x.js"' in page and 'src="missing.png"' in page
+    assert f'url("/assets/{manifest["logo.png"]}")' in (build / manifest["style.css"]).read_text()
+
+    for name in ("MAIN.html", manifest["app.js"], manifest["style.css"]):
+        assert gzip.decompress((build / (name + ".gz")).read_bytes()) == (build / name).read_bytes()
+    assert (build / manifest["app.js"]).read_bytes() == (source / "app.js").read_bytes()
+
+
+def test_fingerprint_changes_with_content(tree):
+    source, _ = tree
+    first = build_assets.AssetBuilder().build()["app.js"]
+    (source / "app.js").write_text("console.log('changed');\n")
+    assert build_assets.AssetBuilder().build()["app.js"] != first
@@ -0,0 +1,121 @@
+import json
+import os
+
+import pytest
+
+import datastore
+from datastore import DataStore, Store, atomic_write_json, load_records
+
+
+@pytest.fixture
+def store(tmp_path):
+    stores = {"alerts": Store(str(tmp_path / "alert.json"), "id", None)}
+    return DataStore(stores, directory=str(tmp_path / "data"))
+
+
+def append(store, records, record):
+    records.append(record)
+    store.save("alerts", records, "append", record=record)
+
+
+def replace_file(path, content):
+    # Snapshots hard-link the store files, so damage a fresh inode rather than the shared one.
+    with open(path + ".new", "w") as f:
+        f.write(content)
+    os.replace(path + ".new", path)
+
+
+def ids(store):
+    return [r["id"] for r in load_records(store.stores["alerts"].path)]
+
+
+def test_torn_log_tail_replays_up_to_the_tear(store):
+    records = []
+    append(store, records, {"id": "a"})
+    append(store, records, {"id": "b"})
+    with open(store.log_path, "ab") as f:
+        f.write(b'0badc0de {"store":"alerts","op":"append","record":{"id":"corrupt"}}\n')
+        f.write(datastore.encode_op({"store": "alerts", "op": "append", "record": {"id": "after"}}))
+        f.write(b'1234abcd {"store":"alerts","op":"app')
+    os.remove(store.stores["alerts"].path)
+
+    report = store.recover()
+    assert report["stores"]["alerts"]["source"] == "empty"
+    assert ids(store) == ["a", "b"]
+
+
+def test_restores_latest_snapshot_then_replays_the_log(store):
+    records = []
+    append(store, records, {"id": "a"})
+    store.snapshot()
+    append(store, records, {"id": "b"})
+    store.snapshot()
+    append(store, records, {"id": "c"})
+    store.save("alerts", records[1:], "remove", keys=["a"])
+    replace_file(store.stores["alerts"].path, '[{"id": "a"}, {"id": "b"')
+
+    report = store.recover()
+    assert report["stores"]["alerts"]["source"] == f"snapshot {store.snapshots()[0]['id']}"
+    assert ids(store) == ["b", "c"]
+
+
+def test_damaged_snapshot_falls_back_to_the_older_one_and_its_log(store):
+    records = []
+    append(store, records, {"id": "a"})
+    older = store.snapshot()
+    append(store, records, {"id": "b"})
+    newer = store.snapshot()
+    append(store, records, {"id": "c"})
+    replace_file(os.path.join(store.snapshot_dir, newer["id"], "alerts.json"), "[]")
+    os.remove(store.stores["alerts"].path)
+
+    report = store.recover()
+    assert report["stores"]["alerts"]["source"] == f"snapshot {older['id']}"
+    assert ids(store) == ["a", "b", "c"]
+
+
+def test_replay_is_idempotent(store):
+    records = [{"id": "a", "status": "pending"}]
+    store.save("alerts", records, "append", record=records[0])
+    # Logged but the file write never happened.
+    store.log("alerts", "append", record={"id": "b"})
+    store.log("alerts", "update", key="a", fields={"status": "resolved"})
+
+    first = store.recover()
+    assert first["stores"]["alerts"]["replayed"] == 2
+    after_first = load_records(store.stores["alerts"].path)
+    second = store.recover()
+    assert second["stores"]["alerts"]["replayed"] == 0
+    assert load_records(store.stores["alerts"].path) == after_first
+    assert after_first == [{"id": "a", "status": "resolved"}, {"id": "b"}]
+
+
+def test_recover_removes_leftover_temp_files(store):
+    path = store.stores["alerts"].path
+    atomic_write_json(path, [{"id": "a"}])
+    with open(f"{path}.999.tmp", "w") as f:
+        f.write("[")
+    store.recover()
+    assert not os.path.exists(f"{path}.999.tmp")
+    assert ids(store) == ["a"]
+
+
+def test_atomic_write_failure_keeps_the_old_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "alert.json")
+    atomic_write_json(path, [{"id": "old"}])
+
+    def fail(fd):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(datastore, "FSYNC", True)
+    monkeypatch.setattr(datastore.os, "fsync", fail)
+    with pytest.raises(OSError):
+        atomic_write_json(path, [{"id": "new"}])
+    monkeypatch.undo()
+
+    with pytest.raises(TypeError):
+        atomic_write_json(path, [{"id": object()}])
+
+    with open(path) as f:
+        assert json.load(f) == [{"id": "old"}]
+    assert os.listdir(tmp_path) == ["alert.json"]
@@ -0,0 +1,84 @@
+import json
+import socket
+import time
+
+from events import RESYNC, InProcessEventBus, LoopbackTransport, NetworkEventBus, UnixSocketEventBus
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_network_bus_delivers_once_to_every_node():
+    first, second = NetworkEventBus(LoopbackTransport("test")), NetworkEventBus(LoopbackTransport("test"))
+    received = {"first": [], "second": []}
+    first.subscribe("t", received["first"].append)
+    second.subscribe("t", received["second"].append)
+    first.publish("t", {"n": 1})
+    assert received == {"first": [{"n": 1}], "second": [{"n": 1}]}
+
+
+def test_malformed_events_are_ignored():
+    bus = InProcessEventBus()
+    received = []
+    bus.subscribe("t", received.append)
+    for data in (b"not json", b"\xff\xfe", b"[]", b'{"topic": 1, "payload": {}}', b'{"topic": "t"}'):
+        bus.deliver_remote(data)
+    bus.deliver_remote(b'{"topic": "t", "payload": {"n": 2}, "origin": "elsewhere"}')
+    assert received == [{"n": 2}]
+
+
+def test_unix_bus_shares_events_and_counts_oversized_ones(tmp_path):
+    first, second = UnixSocketEventBus(str(tmp_path)), UnixSocketEventBus(str(tmp_path))
+    try:
+        received = []
+        second.subscribe("t", received.append)
+        second.receiver.sendto(b"garbage", second.path)
+        first.publish("t", {"n": 1})
+        assert wait_for(lambda: received == [{"n": 1}])
+
+        first.publish("t", {"blob": "x" * UnixSocketEventBus.MAX_EVENT_SIZE})
+        assert first.dropped == 1
+    finally:
+        first.close()
+        second.close()
+
+
+def test_gap_in_a_publishers_sequence_triggers_resync():
+    bus = InProcessEventBus()
+    received, resyncs = [], []
+    bus.subscribe("t", received.append)
+    bus.subscribe(RESYNC, resyncs.append)
+    for seq in (5, 6, 6, 9, 10):
+        bus.deliver_remote(json.dumps({"topic": "t", "payload": seq, "origin": "a", "seq": seq}).encode())
+    bus.deliver_remote(json.dumps({"topic": "t", "payload": 1, "origin": "b", "seq": 1}).encode())
+    assert received == [5, 6, 6, 9, 10, 1]
+    assert resyncs == [{"origin": "a", "missed": 2}]
+
+
+def test_unix_bus_does_not_wait_on_a_stalled_peer(tmp_path):
+    stalled = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    stalled.bind(str(tmp_path / "stalled.sock"))
+    first, second = UnixSocketEventBus(str(tmp_path)), UnixSocketEventBus(str(tmp_path))
+    try:
+        received, resyncs = [], []
+        second.subscribe("t", received.append)
+        second.subscribe(RESYNC, resyncs.append)
+        started = time.time()
+        for n in range(800):
+            first.publish("t", {"n": n})
+        assert wait_for(first.outbox.empty)
+        assert time.time() - started < 2
+        assert first.dropped > 0
+
+        first.publish("t", {"n": "last"})
+        assert wait_for(lambda: received and received[-1] == {"n": "last"})
+        # Events lost between the live buses show up as a resync, never silently.
+        assert len(received) == 801 or resyncs
+    finally:
+        stalled.close()
+        first.close()
+        second.close()
@@ -0,0 +1,81 @@
+import json
+import threading
+
+import pytest
+import simple_websocket
+from werkzeug.serving import make_server
+
+import incidents
+from incidents import IncidentHub
+
+
+def test_publish_skips_the_sender_and_drops_for_full_queues(monkeypatch):
+    monkeypatch.setattr(incidents, "SUBSCRIBER_QUEUE_SIZE", 1)
+    hub = IncidentHub()
+    hub.open_incident("i1", "bc")
+    tourist, dispatcher = hub.subscribe("i1"), hub.subscribe("i1")
+    location = {"t": "loc", "la": 26.1, "lo": 91.7, "ts": 1}
+    assert hub.publish("i1", location, sender=tourist.token) == 2
+    hub.publish("i1", {"t": "ack", "msg": "on the way"})
+
+    assert tourist.get_nowait() == '{"t":"ack","msg":"on the way"}'
+    assert json.loads(dispatcher.get_nowait()) == location
+    assert dispatcher.empty()
+    assert hub.last_location("i1") == location
+
+    hub.unsubscribe("i1", tourist)
+    hub.unsubscribe("i1", dispatcher)
+    assert hub.watcher_count("i1") == 0 and hub.subscribers == {}
+
+
+def test_idle_incidents_expire_and_reopen_from_known_ids(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(incidents.time, "time", lambda: clock[0])
+    hub = IncidentHub(ttl=100)
+    hub.load([{"id": "old", "blockchainId": "bc-old"}, {"id": 5}, "junk"])
+    hub.open_incident("watched", "bc-w")
+    hub.open_incident("idle", "bc-i")
+    watcher = hub.subscribe("watched")
+
+    clock[0] += 200
+    hub.open_incident("new", "bc-n")
+    assert set(hub.incidents) == {"watched", "new"}
+
+    assert hub.has_incident("idle") and hub.blockchain_id("idle") == "bc-i"
+    assert hub.has_incident("old") and hub.blockchain_id("old") == "bc-old"
+    assert not hub.has_incident("missing") and "missing" not in hub.incidents
+    hub.unsubscribe("watched", watcher)
+
+
+@pytest.fixture(scope="module")
+def base_url(server):
+    httpd = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"ws://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_channel_relays_locations_and_acks(server, base_url):
+    response = server.app.test_client().post("/sos", json={
+        "blockchainId": "bc-ws", "location": {"latitude": 26.1, "longitude": 91.7}})
+    incident_id = response.get_json()["incident_id"]
+
+    dispatcher = simple_websocket.Client(f"{base_url}/ws/incident/{incident_id}")
+    tourist = simple_websocket.Client(f"{base_url}/ws/incident/{incident_id}?role=tourist")
+    try:
+        tourist.send("[1, 2]")
+        tourist.send('{"t":"loc","la":"nan","lo":91.7}')
+        tourist.send('{"t":"loc","la":26.2,"lo":91.8,"ts":1700000000}')
+        assert json.loads(dispatcher.receive(timeout=5)) == {"t": "loc", "la": 26.2, "lo": 91.8, "ts": 1700000000}
+        dispatcher.send('{"t":"ack","msg":"on the way"}')
+        assert json.loads(tourist.receive(timeout=5))["msg"] == "on the way"
+    finally:
+        dispatcher.close()
+        tourist.close()
+
+
+def test_channel_rejects_unknown_incidents(base_url):
+    ws = simple_websocket.Client(f"{base_url}/ws/incident/no-such-incident")
+    with pytest.raises(simple_websocket.ConnectionClosed) as closed:
+        ws.receive(timeout=5)
+    assert closed.value.reason == 1008
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from itinerary_risk import ItineraryRiskProfiles
+from risk_zones import RiskZoneStore
+from safety import SafetyScoreEngine
+
+STOP_A = [26.15, 91.75]
+STOP_B = [26.55, 91.75]
+
+
+def square(min_lat, min_lon, max_lat, max_lon):
+    return {"type": "Polygon", "coordinates": [[[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat],
+                                                [min_lon, max_lat], [min_lon, min_lat]]]}
+
+
+@pytest.fixture
+def setup(tmp_path):
+    itineraries, stops, geofence = tmp_path / "itineraries.json", tmp_path / "stops.json", tmp_path / "fence.geojson"
+    itineraries.write_text(json.dumps([{"city": "Testpur", "state": "Assam", "itinerary": [
+        {"day": 1, "activity": "A"}, {"day": 2, "activity": "B"}, {"day": 2, "activity": "Unmapped"}]}]))
+    stops.write_text(json.dumps({"Testpur": {"center": STOP_A, "stops": {"A": STOP_A, "B": STOP_B}}}))
+    geofence.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "geometry": square(26.0, 91.5, 26.4, 92.0)}]}))
+    engine = SafetyScoreEngine()
+    zone_store = RiskZoneStore(str(tmp_path / "zones.json"))
+    profiles = ItineraryRiskProfiles(engine, str(itineraries), str(stops), str(geofence))
+    profiles.load(zone_store)
+    return profiles, engine, zone_store
+
+
+def profile(profiles):
+    body, etag = profiles.profile("testpur")
+    return json.loads(body), body, etag
+
+
+def test_profile_joins_zones_incidents_and_geofence(setup):
+    profiles, engine, zone_store = setup
+    zone_store.put({"id": "z1", "name": "Slide", "intensity": 0.6, "geometry": square(26.1, 91.7, 26.2, 91.8)})
+    profiles.sync(zone_store)
+    for _ in range(3):
+        engine.record("sos", *STOP_B)
+
+    data, _, _ = profile(profiles)
+    assert profiles.profile("nowhere") is None
+    assert (data["city"], data["risk"], data["level"], data["riskiest_day"]) == ("Testpur", 0.6, "high", 1)
+    [a], [b, unmapped] = data["days"][0]["stops"], data["days"][1]["stops"]
+    assert a["zones"] == [{"id": "z1", "name": "Slide", "intensity": 0.6}] and a["in_geofence"]
+    assert b["zones"] == [] and not b["in_geofence"] and 0 < b["risk"] < 0.6 and b["incident_density"] > 0
+    # An ungeocoded stop falls back to the city centre.
+    assert (unmapped["lat"], unmapped["lon"]) == tuple(STOP_A)
+
+
+def test_profile_is_rebuilt_only_when_its_stops_change(setup):
+    profiles, engine, zone_store = setup
+    _, body, etag = profile(profiles)
+    engine.record("sos", 10.0, 70.0)
+    assert profile(profiles)[1] is body
+
+    zone_store.put({"id": "z1", "intensity": 0.3, "geometry": square(26.5, 91.7, 26.6, 91.8)})
+    profiles.sync(zone_store)
+    data, body, zoned_etag = profile(profiles)
+    assert zoned_etag != etag and data["days"][1]["risk"] == 0.3
+
+    engine.record("sos", *STOP_A)
+    data, body, incident_etag = profile(profiles)
+    assert incident_etag != zoned_etag and data["days"][0]["stops"][0]["incident_density"] > 0
+
+    zone_store.delete("z1")
+    profiles.sync(zone_store)
+    assert profile(profiles)[0]["days"][1]["stops"][0]["risk"] == 0.0
+
+
+def test_route_answers_304_for_a_matching_etag(server, setup, monkeypatch):
+    monkeypatch.setattr(server, "itinerary_risk", setup[0])
+    client = server.app.test_client()
+    response = client.get("/itineraries/Testpur/risk")
+    assert response.status_code == 200 and response.get_json()["city"] == "Testpur"
+    etag = response.headers["ETag"]
+    assert client.get("/itineraries/Testpur/risk", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/itineraries/Testpur/risk", headers={"If-None-Match": '"stale"'}).status_code == 200
+    assert client.get("/itineraries/Nowhere/risk").status_code == 404
@@ -0,0 +1,89 @@
+import json
+
+import ledger as ledger_module
+from ledger import Ledger, canonical, verify_inclusion
+
+
+def sealed(ledger, record_id, record):
+    data = canonical({"kind": "sos.created", "id": record_id, "ts": 0, "record": record})
+    return ledger.seal([(record_id, data)])
+
+
+def test_torn_line_is_truncated_before_next_seal(tmp_path):
+    ledger = Ledger(str(tmp_path), batch_interval=60)
+    sealed(ledger, "a", {"n": 1})
+    with open(ledger.events_path, "ab") as f:
+        f.write(b'{"batch":1,"event":{"kind"')
+    with open(ledger.batches_path, "ab") as f:
+        f.write(b'{"alg":')
+
+    sealed(Ledger(str(tmp_path), batch_interval=60), "b", {"n": 2})
+    reopened = Ledger(str(tmp_path), batch_interval=60)
+    assert reopened.verify() == []
+    assert [p["event"]["record"] for p in reopened.proofs("b")] == [{"n": 2}]
+
+
+def test_events_without_header_are_dropped(tmp_path):
+    ledger = Ledger(str(tmp_path), batch_interval=60)
+    sealed(ledger, "a", {"n": 1})
+    # A seal that crashed after writing its events but before its header.
+    orphan = canonical({"kind": "sos.created", "id": "orphan", "ts": 0, "record": {}})
+    with open(ledger.events_path, "ab") as f:
+        f.write(b'{"batch":1,"event":%s,"index":0}\n' % orphan)
+
+    restarted = Ledger(str(tmp_path), batch_interval=60)
+    assert restarted.proofs("orphan") == []
+    sealed(restarted, "b", {"n": 2})
+    proofs = Ledger(str(tmp_path), batch_interval=60).proofs("b")
+    assert proofs[0]["event"]["id"] == "b"
+    assert verify_inclusion(proofs[0]["event"], proofs[0]["proof"], proofs[0]["batch"]["header"]["root"])
+    assert restarted.verify() == []
+
+
+def test_append_snapshots_and_escapes_records(tmp_path):
+    ledger = Ledger(str(tmp_path), batch_interval=60)
+    record = {"message": "help \ud800"}
+    ledger.append("sos.created", "a", record)
+    record["message"] = "changed"
+    ledger.seal(ledger.pending)
+    assert ledger.proofs("a")[0]["event"]["record"] == {"message": "help \ud800"}
+
+
+def rewrite_headers(ledger, change):
+    with open(ledger.batches_path) as f:
+        headers = [json.loads(line) for line in f]
+    for signed in headers:
+        change(signed)
+    with open(ledger.batches_path, "wb") as f:
+        f.writelines(canonical(signed) + b"\n" for signed in headers)
+
+
+def test_verify_uses_each_batch_algorithm(tmp_path):
+    ledger = Ledger(str(tmp_path), batch_interval=60)
+    sealed(ledger, "a", {"n": 1})
+    sealed(ledger, "b", {"n": 2})
+    assert Ledger(str(tmp_path), batch_interval=60).verify() == []
+
+    # Each batch is checked with the algorithm it names, never with ours.
+    other = "hmac-sha256" if ledger.signer.algorithm == "ed25519" else "ed25519"
+    algorithms = iter([other, "rot13"])
+    rewrite_headers(ledger, lambda signed: signed.update(alg=next(algorithms)))
+    problems = Ledger(str(tmp_path), batch_interval=60).verify()
+    assert problems[0].startswith("batch 0: signature not checked: ")
+    assert problems[1] == "batch 1: signature not checked: unknown signature algorithm 'rot13'"
+
+
+def test_proofs_for_records_evicted_from_the_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(ledger_module, "MAX_INDEXED_EVENTS", 2)
+    ledger = Ledger(str(tmp_path), batch_interval=60)
+    sealed(ledger, "a", {"n": 1})
+    for i in range(3):
+        ledger.seal([(f"r{i}", canonical({"kind": "sos.created", "id": f"r{i}", "ts": 0, "record": {"id": "a"}}))])
+    sealed(ledger, "a", {"n": 2})
+    assert ledger.indexed_events <= 2 and "r0" not in ledger.record_index
+
+    for reader in (ledger, Ledger(str(tmp_path), batch_interval=60)):
+        proofs = reader.proofs("a")
+        assert [p["event"]["record"] for p in proofs] == [{"n": 1}, {"n": 2}]
+        assert all(verify_inclusion(p["event"], p["proof"], p["batch"]["header"]["root"]) for p in proofs)
+        assert [p["event"]["id"] for p in reader.proofs("r0")] == ["r0"]
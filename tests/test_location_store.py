@@ -0,0 +1,18 @@
+from location_store import LocationStore
+
+
+def test_invalid_points_are_skipped():
+    store = LocationStore()
+    points = [(float("nan"), 91.7, 1000), (26.1, float("inf"), 1000), (95, 91.7, 1000),
+              (26.1, 91.7, float("nan")), (26.1, 91.7, 1000)]
+    assert store.add("t1", points, now=1000) == 1
+    assert store.trail("t1", 0, 2000) == [[26.1, 91.7, 1000]]
+
+
+def test_point_budget_evicts_least_recent_tourists():
+    store = LocationStore(max_points=10)
+    store.add("old", [(26.1, 91.7, 1000 + i) for i in range(6)], now=1100)
+    store.add("new", [(26.2, 91.8, 1000 + i) for i in range(6)], now=1100)
+    assert store.last_position("old") is None
+    assert store.last_position("new")["ts"] == 1005
+    assert store.points == 6
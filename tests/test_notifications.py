@@ -0,0 +1,43 @@
+import pytest
+
+from notifications import FakeProvider, JobQueue, NotificationDispatcher, create_providers
+
+
+def test_contacts_without_a_provider_are_recorded_as_failed(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    dispatcher = NotificationDispatcher(queue, providers={"webhook": FakeProvider()}, workers=0,
+                                        webhook_hosts={"hooks.example"})
+    alert = {"id": "i1", "emergencyContact": "9800000000, https://hooks.example/sos"}
+    assert dispatcher.enqueue_sos(alert) == 1
+
+    jobs = {job["channel"]: job for job in queue.jobs_for("i1")}
+    assert jobs["webhook"]["status"] == "queued"
+    assert jobs["sms"]["status"] == "failed"
+    assert jobs["sms"]["last_error"] == "no sms provider configured"
+
+
+def test_live_is_the_default_provider(monkeypatch):
+    for name in ("NOTIFY_PROVIDER", "SMS_GATEWAY_URL", "SMTP_HOST", "WEBHOOK_ALLOWED_HOSTS"):
+        monkeypatch.delenv(name, raising=False)
+    assert create_providers() == {}
+    monkeypatch.setenv("WEBHOOK_ALLOWED_HOSTS", "hooks.example")
+    assert sorted(create_providers()) == ["webhook"]
+
+    monkeypatch.setenv("NOTIFY_PROVIDER", "lve")
+    with pytest.raises(ValueError):
+        create_providers()
+
+
+def test_url_contacts_are_refused_without_an_allowlist(tmp_path, monkeypatch):
+    monkeypatch.delenv("WEBHOOK_ALLOWED_HOSTS", raising=False)
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    provider = FakeProvider()
+    dispatcher = NotificationDispatcher(queue, providers={"webhook": provider}, workers=0)
+    alert = {"id": "i2", "emergencyContact": "http://169.254.169.254/latest/meta-data, http://localhost:8080/admin"}
+    assert dispatcher.enqueue_sos(alert) == 0
+    assert dispatcher.deliver_batch("webhook") is False
+
+    jobs = queue.jobs_for("i2")
+    assert [job["status"] for job in jobs] == ["failed", "failed"]
+    assert {job["last_error"] for job in jobs} == {"webhook host not allowed"}
+    assert provider.sent == []
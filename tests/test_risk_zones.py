@@ -0,0 +1,124 @@
+import json
+import math
+
+import pytest
+
+from risk_zones import (RiskZoneStore, ZoneError, apply_bundle, decode_bundle, encode_delta, encode_full,
+                        normalize_zone, write_signed, write_varint, Reader)
+
+
+def polygon(*points):
+    return {"type": "Polygon", "coordinates": [list(points) + [points[0]]]}
+
+
+def test_varint_round_trip():
+    values = [0, 1, 127, 128, 300, 2 ** 35]
+    buf = bytearray()
+    for value in values:
+        write_varint(buf, value)
+    reader = Reader(bytes(buf))
+    assert [reader.varint() for _ in values] == values
+
+
+def test_signed_round_trip():
+    values = [0, -1, 1, -64, 64, -(2 ** 30), 2 ** 30]
+    buf = bytearray()
+    for value in values:
+        write_signed(buf, value)
+    reader = Reader(bytes(buf))
+    assert [reader.signed() for _ in values] == values
+
+
+def test_varint_rejects_negative():
+    with pytest.raises(ValueError):
+        write_varint(bytearray(), -1)
+
+
+def test_full_and_delta_bundles_round_trip():
+    point = normalize_zone({"id": "p", "name": "Slide", "intensity": 0.5,
+                            "geometry": {"type": "Point", "coordinates": [91.7, 26.1]}, "radius_m": 250})
+    area = normalize_zone({"id": "a", "geometry": polygon([91.0, 26.0], [91.5, 26.0], [91.5, 26.5])})
+
+    zones = apply_bundle({}, decode_bundle(encode_full(3, [point, area])))
+    assert set(zones) == {"p", "a"}
+    assert zones["p"]["radius_m"] == 250
+    assert zones["p"]["geometry"]["coordinates"] == pytest.approx([91.7, 26.1])
+
+    zones = apply_bundle(zones, decode_bundle(encode_delta(3, 4, [], ["a"])))
+    assert set(zones) == {"p"}
+
+
+@pytest.mark.parametrize("radius", [-1, 0, float("nan"), float("inf"), "wide", 10 ** 9])
+def test_rejects_bad_radius(radius):
+    with pytest.raises(ZoneError):
+        normalize_zone({"geometry": {"type": "Point", "coordinates": [91.7, 26.1]}, "radius_m": radius})
+
+
+@pytest.mark.parametrize("coordinates", [
+    [91.7], ["east", 26.1], [float("nan"), 26.1], [91.7, float("inf")], [91.7, 1e400], [200, 26.1], [91.7, -91],
+])
+def test_rejects_bad_point(coordinates):
+    with pytest.raises(ZoneError):
+        normalize_zone({"geometry": {"type": "Point", "coordinates": coordinates}})
+
+
+def test_rejects_bad_polygon():
+    with pytest.raises(ZoneError):
+        normalize_zone({"geometry": polygon([91.0, 26.0], [91.5, math.nan], [91.5, 26.5])})
+    with pytest.raises(ZoneError):
+        normalize_zone({"geometry": {"type": "Polygon", "coordinates": [[[91.0, 26.0], [91.5, 26.0]]]}})
+    with pytest.raises(ZoneError):
+        normalize_zone({"geometry": {"type": "MultiPolygon", "coordinates": "nope"}})
+
+
+def test_legacy_shape_and_string_numbers():
+    zone = normalize_zone({"lat": "26.1", "lng": "91.7", "intensity": "0.3"})
+    assert zone["geometry"] == {"type": "Point", "coordinates": [91.7, 26.1]}
+    assert zone["intensity"] == 0.3
+    with pytest.raises(ZoneError):
+        normalize_zone({"lat": "north", "lng": 91.7})
+
+
+def test_stores_sharing_a_file_keep_each_others_zones(tmp_path):
+    path = str(tmp_path / "zones.json")
+    first, second = RiskZoneStore(path), RiskZoneStore(path)
+    first.put({"lat": 26.1, "lng": 91.7}, "zone-a")
+    version = second.put({"lat": 25.5, "lng": 91.8}, "zone-b")[1]
+    assert version == 2
+    assert sorted(RiskZoneStore(path).zones) == ["zone-a", "zone-b"]
+
+    first.load()
+    assert first.changes_since(0)[1] == {"zone-a": first.zones["zone-a"], "zone-b": first.zones["zone-b"]}
+    first.delete("zone-a")
+    assert second.changes_since(version) == (2, {})
+    second.load()
+    assert second.changes_since(version) == (3, {"zone-a": None})
+
+
+@pytest.mark.parametrize("zone_id", ["bundle", "a" * 65, "has space", "../x"])
+def test_put_rejects_ids_that_could_shadow_routes(tmp_path, zone_id):
+    store = RiskZoneStore(str(tmp_path / "zones.json"))
+    with pytest.raises(ZoneError):
+        store.put({"lat": 26.1, "lng": 91.7, "id": zone_id})
+    assert store.zones == {}
+    assert store.put({"lat": 26.1, "lng": 91.7})[0]["id"].startswith("zone-")
+
+
+def test_legacy_file_keeps_its_fields(tmp_path):
+    legacy = tmp_path / "risk_zones.json"
+    legacy.write_text(json.dumps([
+        {"lat": 26.1, "lng": 91.7, "intensity": 0.4, "label": "Landslide", "source": "survey"},
+        {"lat": 25.5, "lng": 91.8, "intensity": 0.2, "id": "bundle"},
+        {"lat": "north", "lng": 91.7, "note": "kept as is"},
+    ]))
+    store = RiskZoneStore(str(tmp_path / "zones.json"), legacy_path=str(legacy))
+    assert len(store.zones) == 2 and "bundle" not in store.zones
+    zone, _ = store.put({"lat": 27.0, "lng": 92.0, "intensity": 0.9}, "new-1")
+    store.delete(next(zone_id for zone_id, fields in store.legacy.items() if fields.get("id") == "bundle"))
+
+    entries = json.loads(legacy.read_text())
+    assert [(e["lat"], e["lng"], e["intensity"]) for e in entries[:2]] == \
+        [pytest.approx((26.1, 91.7, 0.4)), pytest.approx((27.0, 92.0, 0.9))]
+    assert (entries[0]["label"], entries[0]["source"]) == ("Landslide", "survey")
+    assert entries[2] == {"lat": "north", "lng": 91.7, "note": "kept as is"}
+    assert RiskZoneStore(str(tmp_path / "zones.json"), legacy_path=str(legacy)).legacy == store.legacy
@@ -0,0 +1,59 @@
+import pytest
+
+import safety
+from safety import SafetyScoreEngine
+
+
+@pytest.mark.parametrize("location", [
+    {"latitude": "inf", "longitude": 91.7},
+    {"latitude": 1e400, "longitude": 91.7},
+    {"latitude": "nan", "longitude": 91.7},
+    {"latitude": 26.1, "longitude": 200},
+    {"latitude": 26.1},
+    ["26.1", "91.7"],
+])
+def test_record_location_skips_bad_coordinates(location):
+    engine = SafetyScoreEngine()
+    assert engine.record_location("sos", location) is False
+    assert engine.counters == {}
+
+
+def test_load_history_survives_bad_alerts():
+    engine = SafetyScoreEngine()
+    engine.load_history([{"location": {"latitude": "inf", "longitude": "inf"}},
+                         {"location": {"latitude": 26.1, "longitude": 91.7}, "timestamp": "2026-01-01T00:00:00"}], [])
+    assert len(engine.counters) == 1
+
+
+def test_cache_and_versions_are_bounded(monkeypatch):
+    monkeypatch.setattr(safety, "MAX_CACHED_CELLS", 4)
+    monkeypatch.setattr(safety, "MAX_VERSIONED_CELLS", 18)
+    engine = SafetyScoreEngine()
+    engine.record("sos", 26.15, 91.75)
+    seen = engine.version(safety.cell_for(26.15, 91.75))
+    for i in range(10):
+        engine.record("sos", 20 + i, 80)
+        engine.score(20 + i, 80)
+    assert len(engine.cache) == 4
+    assert len(engine.versions) <= 18
+    # Evicted cells never report a version they already reported.
+    assert engine.version(safety.cell_for(26.15, 91.75)) > seen
+
+
+def test_record_uses_the_event_timestamp():
+    live, replayed = SafetyScoreEngine(), SafetyScoreEngine()
+    alert = {"location": {"latitude": 26.1, "longitude": 91.7}, "timestamp": "2026-01-01T00:00:00"}
+    live.record_location("sos", alert["location"], safety.parse_timestamp(alert["timestamp"]))
+    replayed.load_history([alert], [])
+    assert live.score(26.1, 91.7) == replayed.score(26.1, 91.7)
+    assert "version" not in live.score(26.1, 91.7)
+
+
+def test_reload_replaces_counters_and_changes_every_version():
+    engine = SafetyScoreEngine()
+    engine.record("sos", 26.1, 91.7)
+    untouched = engine.version(safety.cell_for(10.0, 70.0))
+    engine.reload([{"location": {"latitude": 27.1, "longitude": 92.7}}], [])
+    assert list(engine.counters) == [safety.cell_for(27.1, 92.7)]
+    assert engine.version(safety.cell_for(10.0, 70.0)) != untouched
+    assert engine.score(26.1, 91.7)["incident_density"] == 0
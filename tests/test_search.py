@@ -0,0 +1,39 @@
+from search import SearchIndex
+
+
+def alert(i, **fields):
+    return dict({"id": f"a{i}", "phoneNumber": f"98{i}", "timestamp": "2026-10-01T10:00:00"}, **fields)
+
+
+def report(i, reason, **fields):
+    return dict({"id": f"r{i}", "reason": reason, "status": "pending", "user": {"mobile": "98"},
+                 "timestamp": "2026-10-01T10:00:00"}, **fields)
+
+
+def test_rebuild_skips_non_string_values():
+    index = SearchIndex()
+    index.rebuild([alert(1, phoneNumber=["98"]), alert(2, blockchainId={"x": 1}), alert(3, phoneNumber=98)],
+                  [report(1, ["flood"]), report(2, 42, user="98"), report(3, "flood near bridge")])
+    assert index.search(type="sos")["total"] == 3
+    assert index.search(phone="98")["total"] == 1
+    assert [r["id"] for r in index.search(q="flood")["results"]] == ["r3"]
+
+
+def test_words_must_all_match_and_prefixes_expand():
+    index = SearchIndex()
+    index.rebuild([], [report(1, "landslide on the highway"), report(2, "landslide"), report(3, "lantern")])
+    assert index.search(q="landslide highway")["total"] == 1
+    assert index.search(q="lan")["total"] == 3
+
+
+def test_capped_prefix_expansion_is_reported_and_keeps_frequent_words():
+    index = SearchIndex()
+    reports = [report(i, f"landslide{i:03d}") for i in range(150)]
+    reports += [report(1000 + i, "landmark") for i in range(5)]
+    index.rebuild([], reports)
+    result = index.search(q="land")
+    assert result["truncated_terms"] == ["land"]
+    # The word found in the most documents is kept, plus 99 of the others.
+    assert result["total"] == 5 + 99
+    assert index.search(q="landslide149")["truncated_terms"] == []
+    assert index.search(q="landslide149")["total"] == 1
@@ -0,0 +1,46 @@
+import hashlib
+
+import pytest
+
+from uploads import UploadError, UploadStore
+
+
+def test_completion_can_be_repeated(tmp_path):
+    store = UploadStore(str(tmp_path / "partial"))
+    data = b"photo bytes"
+    upload_id = store.init("a.jpg", len(data), hashlib.sha256(data).hexdigest(), {})["upload_id"]
+    store.write_chunk(upload_id, 0, data, None)
+
+    destination = str(tmp_path / "a.jpg")
+    assert store.complete(upload_id, destination)["destination"] == destination
+    assert store.complete(upload_id, str(tmp_path / "other.jpg"))["destination"] == destination
+    store.finish(upload_id, "a.jpg")
+    assert store.status(upload_id)["report_id"] == "a.jpg"
+    with pytest.raises(UploadError) as e:
+        store.write_chunk(upload_id, len(data), b"more", None)
+    assert e.value.status_code == 409
+
+    store.cleanup_expired()
+    assert store.get(upload_id)["report_id"] == "a.jpg"
+
+
+@pytest.mark.parametrize("size, sha256", [
+    (10, None), (10, ""), (10, 12345), (10, ["a" * 64]), (10, "z" * 64), (10, "a" * 63),
+    (True, "a" * 64), ("10", "a" * 64), (0, "a" * 64),
+])
+def test_init_rejects_bad_size_or_checksum(tmp_path, size, sha256):
+    store = UploadStore(str(tmp_path / "partial"))
+    with pytest.raises(UploadError) as e:
+        store.init("a.jpg", size, sha256, {})
+    assert e.value.status_code == 400
+    assert store.init("a.jpg", 10, "A" * 64, {})["sha256"] == "a" * 64
+
+
+def test_init_route_answers_400_for_bad_bodies(server):
+    client = server.app.test_client()
+    for body in (None, [], {"filename": 5}):
+        response = client.post("/report/upload/init", json=body)
+        assert response.status_code == 400 and response.get_json()["status"] == "error"
+    response = client.post("/report/upload/init", json={"filename": "a.jpg", "size": 10, "sha256": 12345})
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "File checksum must be a hex SHA-256 digest"
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from import_users import read_rows
+from users import add_users, load_users
+
+
+@pytest.fixture
+def users_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_add_users_reports_every_rejected_row(users_dir):
+    created, errors = add_users([
+        {"mobile": "1", "kyc": "k1", "emergency_contact": "e1"},
+        {"mobile": "1", "kyc": "k2", "emergency_contact": "e2"},
+        {"mobile": "2", "kyc": " "},
+        {"mobile": "3", "kyc": {"doc": "passport"}, "emergency_contact": ["e3"]},
+        {"mobile": 4, "kyc": "k4", "emergency_contact": "e4"},
+        "not a row",
+    ])
+    assert [user["mobile"] for user in created] == ["1"]
+    assert [(e["row"], e["mobile"], e["message"]) for e in errors] == [
+        (2, "1", "User already exists"),
+        (3, "2", "Missing required fields: kyc, emergency_contact"),
+        (4, "3", "Fields must be strings: kyc, emergency_contact"),
+        (5, None, "Fields must be strings: mobile"),
+        (6, None, "Row is not an object"),
+    ]
+    assert load_users() == created
+
+
+def test_read_rows_numbers_rows_by_file_line(users_dir):
+    (users_dir / "group.ndjson").write_text(
+        '{"mobile": "1", "kyc": "k", "emergency_contact": "e"}\n'
+        '\n'
+        '{"mobile": "2", "kyc": "k"\n'
+        '   \n'
+        '{"mobile": "3", "kyc": "k", "emergency_contact": "e"}\n')
+    rows = read_rows(str(users_dir / "group.ndjson"))
+    assert [number for number, _ in rows] == [1, 3, 5]
+    assert rows[1][1] is None
+
+    created, errors = add_users([row for _, row in rows], row_numbers=[number for number, _ in rows])
+    assert [user["mobile"] for user in created] == ["1", "3"]
+    assert errors == [{"row": 3, "mobile": None, "message": "Row is not an object"}]
+
+    (users_dir / "group.csv").write_text("mobile,kyc,emergency_contact\n4,k,e\n5,,e\n")
+    assert read_rows(str(users_dir / "group.csv")) == [
+        (2, {"mobile": "4", "kyc": "k", "emergency_contact": "e"}),
+        (3, {"mobile": "5", "kyc": "", "emergency_contact": "e"}),
+    ]
+
+
+def test_register_batch(server):
+    client = server.app.test_client()
+    for body in (None, {"users": []}, {"users": "x"}, [{"mobile": "b1"}]):
+        assert client.post("/register/batch", json=body).status_code == 400
+
+    response = client.post("/register/batch", json={"users": [
+        {"mobile": "b1", "kyc": "k", "emergency_contact": "e"},
+        {"mobile": "b2", "kyc": 7, "emergency_contact": "e"},
+    ]})
+    assert response.status_code == 201
+    data = response.get_json()
+    assert data["created"] == 1 and data["users"][0]["mobile"] == "b1"
+    assert data["errors"] == [{"row": 2, "mobile": "b2", "message": "Fields must be strings: kyc"}]
+    with open("users.json") as f:
+        assert "b1" in {user["mobile"] for user in json.load(f)}
+
+    response = client.post("/register/batch", json={"users": [{"mobile": "b1", "kyc": "k", "emergency_contact": "e"}]})
+    assert response.status_code == 400 and response.get_json()["errors"][0]["message"] == "User already exists"
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+from datastore import ProcessLock
+
+CHUNK_SIZE = 256 * 1024
+MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+# Partial uploads that haven't received a chunk in this long are discarded.
+UPLOAD_TTL = 24 * 60 * 60
+SHA256_PATTERN = re.compile(r"[0-9a-fA-F]{64}")
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.offset = offset
+
+
+class UploadStore:
+    """Tracks resumable report-photo uploads on disk.
+
+    Each upload is a `<id>.part` file holding the bytes received so far and a
+    `<id>.json` file with its metadata. The size of the `.part` file is the
+    authoritative offset, so an upload can resume after a server restart.
+    A completed upload keeps its metadata, with the destination and the
+    report id, until it expires, so a retried completion finds the report
+    instead of failing. `lock` is shared by every worker process.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock = ProcessLock(os.path.join(directory, "uploads.lock"))
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.directory, f"{upload_id}.json")
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.directory, f"{upload_id}.part")
+
+    def get(self, upload_id):
+        try:
+            uuid.UUID(upload_id)
+        except ValueError:
+            raise UploadError("Upload not found", 404)
+        try:
+            with open(self._meta_path(upload_id), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            raise UploadError("Upload not found", 404)
+
+    def offset(self, upload_id):
+        try:
+            return os.path.getsize(self._part_path(upload_id))
+        except FileNotFoundError:
+            return 0
+
+    def init(self, filename, size, sha256, fields):
+        if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+            raise UploadError("A positive file size is required")
+        if size > MAX_UPLOAD_SIZE:
+            raise UploadError("File too large", 413)
+        if not sha256:
+            raise UploadError("File checksum is required")
+        if not isinstance(sha256, str) or not SHA256_PATTERN.fullmatch(sha256):
+            raise UploadError("File checksum must be a hex SHA-256 digest")
+
+        self.cleanup_expired()
+        upload_id = str(uuid.uuid4())
+        meta = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "size": size,
+            "sha256": sha256.lower(),
+            "fields": fields,
+            "created": time.time(),
+        }
+        self._write_meta(meta)
+        open(self._part_path(upload_id), "wb").close()
+        return meta
+
+    def _write_meta(self, meta):
+        with open(self._meta_path(meta["upload_id"]), "w") as f:
+            json.dump(meta, f)
+
+    def status(self, upload_id):
+        meta = self.get(upload_id)
+        status = {
+            "upload_id": upload_id,
+            "size": meta["size"],
+            "offset": meta["size"] if meta.get("destination") else self.offset(upload_id),
+            "chunk_size": CHUNK_SIZE,
+        }
+        if meta.get("report_id"):
+            status["report_id"] = meta["report_id"]
+        return status
+
+    def write_chunk(self, upload_id, offset, data, checksum):
+        meta = self.get(upload_id)
+        if meta.get("destination"):
+            raise UploadError("Upload already completed", 409, meta["size"])
+        if checksum and hashlib.sha256(data).hexdigest() != checksum.lower():
+            raise UploadError("Chunk checksum mismatch", 400, self.offset(upload_id))
+        if len(data) > CHUNK_SIZE:
+            raise UploadError("Chunk too large", 413, self.offset(upload_id))
+
+        with self.lock:
+            current = self.offset(upload_id)
+            if offset != current:
+                # The client lost track (e.g. a response was dropped); tell it
+                # where to resume from instead of corrupting the file.
+                raise UploadError("Offset mismatch", 409, current)
+            if current + len(data) > meta["size"]:
+                raise UploadError("Chunk exceeds declared file size", 400, current)
+            with open(self._part_path(upload_id), "ab") as f:
+                f.write(data)
+            return current + len(data)
+
+    def complete(self, upload_id, destination):
+        """Verifies the assembled file and moves it to `destination`.
+
+        Returns the upload's metadata. Once the file has been moved this
+        returns the metadata with its original destination straight away.
+        """
+        part_path = self._part_path(upload_id)
+        with self.lock:
+            meta = self.get(upload_id)
+            if meta.get("destination"):
+                return meta
+            received = self.offset(upload_id)
+            if received != meta["size"]:
+                raise UploadError("Upload incomplete", 409, received)
+
+            digest = hashlib.sha256()
+            with open(part_path, "rb") as f:
+                for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(block)
+            if digest.hexdigest() != meta["sha256"]:
+                self._discard(upload_id)
+                raise UploadError("File checksum mismatch, upload discarded", 422, 0)
+
+            os.replace(part_path, destination)
+            meta["destination"] = destination
+            self._write_meta(meta)
+        return meta
+
+    def finish(self, upload_id, report_id):
+        """Records the report created from a completed upload; returns the metadata."""
+        with self.lock:
+            meta = self.get(upload_id)
+            meta["report_id"] = report_id
+            self._write_meta(meta)
+        return meta
+
+    def _discard(self, upload_id):
+        for path in (self._part_path(upload_id), self._meta_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def cleanup_expired(self):
+        cutoff = time.time() - UPLOAD_TTL
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            upload_id = name[:-len(".json")]
+            paths = [p for p in (self._meta_path(upload_id), self._part_path(upload_id)) if os.path.exists(p)]
+            try:
+                last_activity = max(os.path.getmtime(p) for p in paths)
+            except (FileNotFoundError, ValueError):
+                continue
+            if last_activity < cutoff:
+                self._discard(upload_id)
@@ -0,0 +1,74 @@
+import hashlib
+import itertools
+import json
+
+from datastore import atomic_write_json
+
+USERS_FILE = "users.json"
+REQUIRED_FIELDS = ("mobile", "kyc", "emergency_contact")
+
+
+def load_users():
+    try:
+        with open(USERS_FILE, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+def save_users(users):
+    atomic_write_json(USERS_FILE, users, indent=4)
+
+def make_user(mobile, kyc, emergency_contact):
+    return {
+        "mobile": mobile,
+        "kyc": kyc,
+        "emergency_contact": emergency_contact,
+        "blockchain_id": hashlib.sha256(mobile.encode('utf-8')).hexdigest()
+    }
+
+def add_users(rows, save=None, row_numbers=None):
+    """Validates and registers many users with a single read and write of users.json.
+
+    `rows` is an iterable of dicts with the /register fields. Returns
+    `(created, errors)` where `errors` lists `{"row", "mobile", "message"}`
+    for every row that was skipped; row numbers start at 1 unless
+    `row_numbers` gives one per row (e.g. file line numbers). `save(users,
+    created)` replaces save_users, e.g. to log the change as well.
+    """
+    users = load_users()
+    known_mobiles = {user['mobile'] for user in users}
+    created = []
+    errors = []
+
+    for row_number, row in zip(row_numbers or itertools.count(1), rows):
+        if not isinstance(row, dict):
+            errors.append({"row": row_number, "mobile": None, "message": "Row is not an object"})
+            continue
+        not_strings = [field for field in REQUIRED_FIELDS
+                       if row.get(field) is not None and not isinstance(row[field], str)]
+        if not_strings:
+            mobile = row.get("mobile") if isinstance(row.get("mobile"), str) else None
+            errors.append({"row": row_number, "mobile": mobile,
+                           "message": f"Fields must be strings: {', '.join(not_strings)}"})
+            continue
+        values = {field: (row.get(field) or "").strip() for field in REQUIRED_FIELDS}
+        mobile = values["mobile"]
+        missing = [field for field in REQUIRED_FIELDS if not values[field]]
+        if missing:
+            errors.append({"row": row_number, "mobile": mobile or None,
+                           "message": f"Missing required fields: {', '.join(missing)}"})
+            continue
+        if mobile in known_mobiles:
+            errors.append({"row": row_number, "mobile": mobile, "message": "User already exists"})
+            continue
+
+        known_mobiles.add(mobile)
+        created.append(make_user(mobile, values["kyc"], values["emergency_contact"]))
+
+    if created:
+        users.extend(created)
+        if save:
+            save(users, created)
+        else:
+            save_users(users)
+    return created, errors
@@ -1,11 +1,54 @@
+"""Browser checks for the admin dashboard.
+
+Usage:
+    python verify_alert_modal.py                 # modal check against a server on :5000
+    python verify_alert_modal.py --perf [--sizes 10000 100000]
+
+--perf starts server:app under gunicorn in a scratch directory seeded with N
+alerts and N reports for each size, then measures and asserts budgets for:
+  - first render: navigation until the first alert and report rows are shown
+  - rows in the DOM: the lists must stay virtualized
+  - refresh: the longest main-thread task while a changed alert list is applied
+  - idle refresh: an unchanged list must cost no long tasks (304 responses)
+  - scroll: jumping to the end of the alert list until its last row renders
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
 from playwright.sync_api import sync_playwright, expect
 
-def run(playwright):
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DASHBOARD_FILES = ["admin.html", "admin.js", "admin.css", "home.png"]
+# size -> (first render ms, refresh long task ms, scroll ms)
+BUDGETS = {
+    10000: (1500, 150, 200),
+    100000: (4000, 600, 200),
+}
+MAX_DOM_ROWS = 100
+
+MODAL_ALERT = {
+    "blockchainId": "abcdef123456",
+    "phoneNumber": "111-222-3333",
+    "kycId": "kyc123",
+    "emergencyContact": "444-555-6666",
+    "location": {"latitude": 34.0522, "longitude": -118.2437},
+}
+
+def run(playwright, base_url="http://127.0.0.1:5000"):
     browser = playwright.chromium.launch(headless=True)
     page = browser.new_page()
 
     # Go to the admin page
-    page.goto("http://127.0.0.1:5000/admin.html")
+    page.goto(f"{base_url}/admin.html")
 
     # Click on the first alert
     alert_item = page.locator("#alertList li").first
@@ -23,9 +66,177 @@ def run(playwright):
     expect(modal).to_contain_text("Location: 34.0522, -118.2437")
 
     # Take a screenshot
+    os.makedirs("jules-scratch/verification", exist_ok=True)
     page.screenshot(path="jules-scratch/verification/verification.png")
 
     browser.close()
 
-with sync_playwright() as playwright:
-    run(playwright)
+
+# --- Performance test ---
+
+def seed(scratch, size):
+    start = datetime.now() - timedelta(days=7)
+    alerts = [dict(MODAL_ALERT, id="seed-0", timestamp=start.isoformat())]
+    for i in range(1, size):
+        alerts.append({
+            "id": f"seed-{i}",
+            "blockchainId": f"{i:064x}",
+            "phoneNumber": f"98{i:08d}",
+            "kycId": f"kyc{i}",
+            "emergencyContact": f"97{i:08d}",
+            "location": {"latitude": 26 + (i % 500) / 100, "longitude": 91 + (i % 700) / 100},
+            "timestamp": (start + timedelta(seconds=i * 5)).isoformat(),
+        })
+    reports = [{
+        "id": f"report-{i}.jpg",
+        "timestamp": (start + timedelta(seconds=i * 5)).isoformat(),
+        "image_path": "uploads/seed.png",
+        "reason": f"Seeded report {i}",
+        "user": {"mobile": f"98{i:08d}"},
+        "location": {"latitude": 26.1, "longitude": 91.7},
+        "status": "pending",
+    } for i in range(size)]
+
+    os.makedirs(os.path.join(scratch, "website", "uploads"))
+    os.makedirs(os.path.join(scratch, "uploads"))
+    with open(os.path.join(scratch, "alert.json"), "w") as f:
+        json.dump(alerts, f)
+    with open(os.path.join(scratch, "website", "reports.json"), "w") as f:
+        json.dump(reports, f)
+    shutil.copy(os.path.join(REPO_DIR, "placeholder.png"), os.path.join(scratch, "uploads", "seed.png"))
+    for name in DASHBOARD_FILES:
+        os.symlink(os.path.join(REPO_DIR, name), os.path.join(scratch, name))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(scratch, port):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-k", "gthread", "-w", "1", "--threads", "8",
+         "-b", f"127.0.0.1:{port}", "--chdir", scratch, "server:app"],
+        env=dict(os.environ, PYTHONPATH=REPO_DIR), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics/admission", timeout=2).read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start; is it installed?")
+
+
+def post_sos(base_url):
+    request = urllib.request.Request(
+        f"{base_url}/sos", data=json.dumps(dict(MODAL_ALERT, phoneNumber="000-perf-test")).encode(),
+        headers={"Content-Type": "application/json"})
+    urllib.request.urlopen(request, timeout=10).read()
+
+
+# Records main-thread tasks longer than 50 ms from page load on.
+LONG_TASK_OBSERVER = """
+window.__longTasks = [];
+new PerformanceObserver(list => {
+    for (const entry of list.getEntries()) {
+        window.__longTasks.push({ start: entry.startTime, duration: entry.duration });
+    }
+}).observe({ entryTypes: ['longtask'] });
+"""
+
+def longest_task_since(page, since):
+    return page.evaluate(
+        "since => Math.max(0, ...window.__longTasks.filter(t => t.start >= since).map(t => t.duration))", since)
+
+
+def measure(playwright, base_url, size):
+    browser = playwright.chromium.launch(headless=True)
+    page = browser.new_page(viewport={"width": 1400, "height": 900})
+    page.add_init_script(LONG_TASK_OBSERVER)
+    results = {}
+
+    page.goto(f"{base_url}/admin.html")
+    page.wait_for_function(
+        "document.querySelector('#alertList li[data-key]') && document.querySelector('#reportList [data-key]')",
+        polling="raf", timeout=60000)
+    results["first_render_ms"] = page.evaluate("performance.now()")
+    results["alert_rows"] = page.locator("#alertList li").count()
+    results["report_rows"] = page.locator("#reportList .report-item").count()
+
+    # A changed list: a new SOS arrives and the 5 s poll picks it up.
+    list_height = page.evaluate("document.getElementById('alertList').style.height")
+    since = page.evaluate("performance.now()")
+    post_sos(base_url)
+    page.wait_for_function(
+        "height => document.getElementById('alertList').style.height !== height", arg=list_height, timeout=15000)
+    results["refresh_task_ms"] = longest_task_since(page, since)
+
+    # An unchanged list: the next poll should be a 304.
+    since = page.evaluate("performance.now()")
+    page.wait_for_timeout(5500)
+    results["idle_refresh_task_ms"] = longest_task_since(page, since)
+
+    start = page.evaluate("performance.now()")
+    page.evaluate("const box = document.querySelector('.alert-box'); box.scrollTop = box.scrollHeight")
+    page.wait_for_function(
+        "document.querySelector('#alertList li[data-key=\"seed-%d\"]')" % (size - 1), polling="raf")
+    results["scroll_ms"] = page.evaluate("performance.now()") - start
+    results["alert_rows_after_scroll"] = page.locator("#alertList li").count()
+
+    browser.close()
+    return results
+
+
+def check_budgets(size, results):
+    first_render, refresh, scroll = BUDGETS.get(size, BUDGETS[max(BUDGETS)])
+    failures = []
+    for name, value, budget in (
+        ("first_render_ms", results["first_render_ms"], first_render),
+        ("refresh_task_ms", results["refresh_task_ms"], refresh),
+        ("idle_refresh_task_ms", results["idle_refresh_task_ms"], 50),
+        ("scroll_ms", results["scroll_ms"], scroll),
+        ("alert_rows", results["alert_rows"], MAX_DOM_ROWS),
+        ("report_rows", results["report_rows"], MAX_DOM_ROWS),
+        ("alert_rows_after_scroll", results["alert_rows_after_scroll"], MAX_DOM_ROWS),
+    ):
+        if value > budget:
+            failures.append(f"{name} = {value:.0f} exceeds budget {budget}")
+    return failures
+
+
+def run_perf(playwright, sizes):
+    failures = []
+    for size in sizes:
+        scratch = tempfile.mkdtemp(prefix="admin_perf_")
+        seed(scratch, size)
+        port = free_port()
+        server = start_server(scratch, port)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            run(playwright, base_url)
+            results = measure(playwright, base_url, size)
+        finally:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(scratch, ignore_errors=True)
+        print(f"{size} alerts + {size} reports: " + ", ".join(f"{k}={v:.0f}" for k, v in results.items()))
+        failures += [f"{size}: {failure}" for failure in check_budgets(size, results)]
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return not failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--perf", action="store_true", help="run the large-dataset performance test")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    with sync_playwright() as playwright:
+        if args.perf:
+            sys.exit(0 if run_perf(playwright, args.sizes) else 1)
+        run(playwright)